@@ -1,8 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+import atexit
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 
+from db_pool import create_connection
+import inventory
+from migrations import STOCK_LEDGER_TABLE, migrate, normalize_text
+from pagination import DEFAULT_PAGE_SIZE, decode_cursor, keyset_condition, order_by_clause, split_page
+from product_search import build_match_query
+from reference_data import ReferenceCache
+from thumbnails import generate_thumbnails
+from write_coordinator import WriteCoordinator
+
 # --- 1. КОНСТАНТЫ И СТИЛИ (Прил_3_ОЗ...) ---
 DB_NAME = 'demodb.db'
 FONT_FAMILY = "Times New Roman"
@@ -12,66 +23,351 @@ COLOR_SECONDARY = "#7FFF00" # Дополнительный фон (Лайм)
 COLOR_ACCENT = "#00FA9A"    # Акцентирование (Бледно-зеленый)
 COLOR_DISCOUNT_HIGH = "#2E8B57" # Скидка > 15% (Темно-зеленый)
 
+# Список товаров каталога: число строк-виджетов (создаются один раз и
+# переиспользуются при прокрутке) и общие стили строк
+PRODUCT_LIST_VISIBLE_ROWS = 6
+PRODUCT_ROW_STYLE = 'ProductRow'               # -> ProductRow.TFrame / ProductRow.TLabel
+PRODUCT_ROW_HIGH_STYLE = 'ProductRowDiscount'  # Скидка > 15%
+
+# Запросы справочников: {имя: (таблица, sql)}. Читаются через кэш
+# справочников (reference_data.ReferenceCache)
+REFERENCE_QUERIES = {
+    'suppliers': ('Provider', "SELECT ProviderID, ProviderName FROM Provider"),
+    'manufacturers': ('Manufacturer', "SELECT ManufacturerID, ManufacturerName FROM Manufacturer"),
+    'categories': ('Category', "SELECT CategoryID, CategoryName FROM Category"),
+    'statuses': ('OrderStatus', "SELECT StatusID, StatusName FROM OrderStatus"),
+    'pickup_points': ('PickupPoint', "SELECT PointID, Address FROM PickupPoint"),
+}
+
 # --- 2. ФУНКЦИИ РАБОТЫ С БД ---
 
+_connection = None
+
+def get_connection():
+    """Возвращает общее для процесса соединение с БД (открывается один раз)."""
+    global _connection
+    if _connection is None:
+        _connection = create_connection(DB_NAME)
+        atexit.register(_connection.close)
+        migrate(_connection)
+    return _connection
+
+_reference_cache = None
+
+def get_reference_cache():
+    """Кэш справочников со своим соединением: видит и собственные правки приложения."""
+    global _reference_cache
+    if _reference_cache is None:
+        get_connection()  # Миграции (счётчики версий таблиц) применяются здесь
+        _reference_cache = ReferenceCache(DB_NAME, REFERENCE_QUERIES)
+        atexit.register(_reference_cache.close)
+    return _reference_cache
+
+_writer = None
+
+def get_writer():
+    """
+    Очередь записи процесса (write_coordinator.py): все изменения базы идут
+    через неё - по одной, с групповой фиксацией и повтором при занятой базе.
+    """
+    global _writer
+    if _writer is None:
+        get_connection()  # Миграции применяются до первой записи
+        _writer = WriteCoordinator(DB_NAME)
+        atexit.register(_writer.close)
+    return _writer
+
+def _execute_write(conn, query, params):
+    """Операция очереди записи для execute_query: один запрос, возвращает lastrowid."""
+    return conn.execute(query, params).lastrowid
+
+@contextmanager
+def transaction():
+    """Выполняет блок в одной транзакции: commit при успехе, rollback при ошибке."""
+    conn = get_connection()
+    with conn:
+        yield conn
+
 def execute_query(query, params=(), fetch_one=False):
     """Общая функция для выполнения запросов к БД."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
-        cursor.execute(query, params)
         if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
-            conn.commit()
-            return True, cursor.lastrowid
-        if fetch_one:
-            return cursor.fetchone()
-        return cursor.fetchall()
+            return True, get_writer().execute(_execute_write, query, params)
+        cursor = conn.execute(query, params)
+        try:
+            if fetch_one:
+                return cursor.fetchone()
+            return cursor.fetchall()
+        finally:
+            cursor.close()
     except sqlite3.Error as e:
         # В реальном приложении: print(f"DB Error: {e}")
         return False, None
-    finally:
-        conn.close()
 
+def fetch_many(queries):
+    """
+    Выполняет несколько SELECT за одно обращение и в одном снимке данных.
+    queries: {имя: sql} или {имя: (sql, params)}; возвращает {имя: строки}.
+    Ошибочный запрос даёт пустой список, остальные выполняются.
+    """
+    conn = get_connection()
+    results = {}
+    with transaction():
+        conn.execute("BEGIN")
+        for name, query in queries.items():
+            sql, params = query if isinstance(query, tuple) else (query, ())
+            try:
+                results[name] = conn.execute(sql, params).fetchall()
+            except sqlite3.Error:
+                results[name] = []
+    return results
+
+AUTH_QUERY = """
+SELECT T1.RoleName
+FROM Role AS T1
+INNER JOIN User AS T2
+  ON T1.RoleID = T2.RoleID
+WHERE T2.Login = ? AND T2.Password = ?
+"""
 def authenticate_user(login, password):
     """Проверяет учетные данные и возвращает имя роли."""
-    query = """
-    SELECT T1.RoleName
-    FROM Role AS T1
-    INNER JOIN User AS T2
-      ON T1.RoleID = T2.RoleID
-    WHERE T2.Login = ? AND T2.Password = ?
-    """
-    result = execute_query(query, (login, password), fetch_one=True)
+    result = execute_query(AUTH_QUERY, (normalize_text(login), normalize_text(password)), fetch_one=True)
     return result[0] if result else None
 
 # Вспомогательные функции для получения справочников
+def get_reference(name):
+    """Справочник из кэша. Ошибка БД даёт пустой список (как в fetch_many)."""
+    try:
+        return get_reference_cache().get(name)
+    except sqlite3.Error:
+        return []
 def get_all_suppliers():
-    return execute_query("SELECT ProviderID, ProviderName FROM Provider")
+    return get_reference('suppliers')
 def get_all_manufacturers():
-    return execute_query("SELECT ManufacturerID, ManufacturerName FROM Manufacturer")
+    return get_reference('manufacturers')
 def get_all_categories():
-    return execute_query("SELECT CategoryID, CategoryName FROM Category")
+    return get_reference('categories')
 def get_all_statuses():
-    return execute_query("SELECT StatusID, StatusName FROM OrderStatus")
+    return get_reference('statuses')
 def get_all_pickup_points():
-    return execute_query("SELECT PointID, Address FROM PickupPoint")
+    return get_reference('pickup_points')
+def get_reference_lists(*names, **extra_queries):
+    """Справочники (из кэша) и доп. запросы (одним пакетом через fetch_many)."""
+    result = fetch_many(extra_queries) if extra_queries else {}
+    result.update({name: get_reference(name) for name in names})
+    return result
+PRODUCT_BY_ARTICLE_QUERY = """
+SELECT T1.*, T2.CategoryName, T3.ProviderName, T4.ManufacturerName
+FROM Product AS T1
+INNER JOIN Category AS T2 ON T1.CategoryID = T2.CategoryID
+INNER JOIN Provider AS T3 ON T1.ProviderID = T3.ProviderID
+INNER JOIN Manufacturer AS T4 ON T1.ManufacturerID = T4.ManufacturerID
+WHERE T1.ProductArticle = ?
+"""
 def get_product_by_article(article):
-    query = """
-    SELECT T1.*, T2.CategoryName, T3.ProviderName, T4.ManufacturerName
+    return execute_query(PRODUCT_BY_ARTICLE_QUERY, (article,), fetch_one=True)
+ALL_PRODUCTS_QUERY = "SELECT ProductArticle, Name FROM Product"
+ORDER_QUERY = 'SELECT * FROM "Order" WHERE OrderID = ?'
+ORDER_PRODUCTS_QUERY = 'SELECT T1.ProductArticle, T1.Quantity, T2.Name FROM OrderProduct AS T1 INNER JOIN Product AS T2 ON T1.ProductArticle = T2.ProductArticle WHERE T1.OrderID = ?'
+def get_order_details(order_id):
+    result = fetch_many({
+        'order': (ORDER_QUERY, (order_id,)),
+        'products': (ORDER_PRODUCTS_QUERY, (order_id,)),
+    })
+    order = result['order'][0] if result['order'] else None
+    return order, result['products']
+
+# Операции очереди записи (get_writer): каждая - одна транзакция,
+# заказ и его состав применяются или откатываются вместе.
+# Оптимистическая блокировка: окно заказа запоминает "Order".RowVersion при
+# открытии, запись проходит только при той же версии и увеличивает её.
+# Иначе заказ успели изменить или удалить - OrderConflictError.
+
+ORDER_VERSION_QUERY = 'SELECT RowVersion FROM "Order" WHERE OrderID = ?'
+# Номер нового заказа больше всех, что были в "Order" и в журнале остатков:
+# без AUTOINCREMENT SQLite отдал бы номер удалённого последнего заказа, и
+# новый заказ унаследовал бы его резерв в StockLedger
+NEXT_ORDER_ID_QUERY = f"""
+SELECT MAX(IFNULL((SELECT MAX(OrderID) FROM "Order"), 0),
+           IFNULL((SELECT MAX(OrderID) FROM {STOCK_LEDGER_TABLE}), 0)) + 1
+"""
+ORDER_INSERT_SQL = """
+INSERT INTO "Order" (OrderID, ClientFIO, Code, OrderDate, DeliveryDate, StatusID, PointID)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+ORDER_UPDATE_SQL = """
+UPDATE "Order" SET ClientFIO=?, Code=?, OrderDate=?, DeliveryDate=?, StatusID=?, PointID=?,
+                   RowVersion = RowVersion + 1
+WHERE OrderID = ? AND RowVersion = ?
+"""
+ORDER_LINE_INSERT_SQL = 'INSERT INTO OrderProduct (OrderID, ProductArticle, Quantity) VALUES (?, ?, ?)'
+ORDER_LINE_UPDATE_SQL = 'UPDATE OrderProduct SET Quantity = ? WHERE OrderID = ? AND ProductArticle = ?'
+ORDER_LINE_DELETE_SQL = 'DELETE FROM OrderProduct WHERE OrderID = ? AND ProductArticle = ?'
+
+
+class OrderConflictError(sqlite3.DatabaseError):
+    """Заказ изменён или удалён другим пользователем после открытия окна."""
+
+
+def order_changeset(old_lines, new_lines):
+    """
+    Минимальный набор изменений состава: (добавить [(артикул, количество)],
+    изменить [(артикул, количество)], удалить [артикул]). Неизменённые строки не трогаются.
+    """
+    old, new = inventory.line_totals(old_lines), inventory.line_totals(new_lines)
+    inserts = [(article, quantity) for article, quantity in new.items() if article not in old]
+    updates = [(article, quantity) for article, quantity in new.items()
+               if article in old and old[article] != quantity]
+    deletes = [article for article in old if article not in new]
+    return inserts, updates, deletes
+
+def _claim_order(conn, order_id, header, row_version):
+    """Записывает шапку, если версия заказа не изменилась. Возвращает новую версию."""
+    if row_version is None:  # Без проверки версии (вызов не из окна заказа)
+        row = conn.execute(ORDER_VERSION_QUERY, (order_id,)).fetchone()
+        row_version = row[0] if row else None
+    if conn.execute(ORDER_UPDATE_SQL, (*header, order_id, row_version)).rowcount != 1:
+        raise OrderConflictError(f"Заказ {order_id} изменён или удалён другим пользователем.")
+    return row_version + 1
+
+def save_order(conn, order_id, header, lines, row_version=None, loaded_lines=None):
+    """
+    Записывает шапку заказа (новый заказ, если order_id пуст) и его состав.
+    header - (ФИО, код, дата заказа, дата доставки, статус, пункт выдачи),
+    lines - [(артикул, количество)]. В базу пишется только разница с
+    loaded_lines - составом при открытии заказа с версией row_version (None -
+    текущий состав в базе, без проверки версии). Разница списывается со склада
+    или возвращается (inventory.py); нехватка товара - OversellError.
+    Возвращает (номер заказа, новая версия).
+    """
+    if order_id:
+        row_version = _claim_order(conn, order_id, header, row_version)
+        if loaded_lines is None:
+            loaded_lines = inventory.order_lines(conn, order_id)
+    else:
+        order_id = conn.execute(NEXT_ORDER_ID_QUERY).fetchone()[0]
+        conn.execute(ORDER_INSERT_SQL, (order_id, *header))
+        row_version, loaded_lines = 0, []
+    inventory.reserve_order(conn, order_id, loaded_lines, lines)
+
+    inserts, updates, deletes = order_changeset(loaded_lines, lines)
+    changed = conn.executemany(ORDER_LINE_DELETE_SQL, [(order_id, article) for article in deletes]).rowcount
+    changed += conn.executemany(ORDER_LINE_UPDATE_SQL,
+                                [(quantity, order_id, article) for article, quantity in updates]).rowcount
+    if changed != len(deletes) + len(updates):
+        # Состав в базе не совпал с прочитанным (изменён в обход версии заказа)
+        raise OrderConflictError(f"Состав заказа {order_id} изменён другим пользователем.")
+    conn.executemany(ORDER_LINE_INSERT_SQL, [(order_id, article, quantity) for article, quantity in inserts])
+    return order_id, row_version
+
+def delete_order(conn, order_id, row_version=None):
+    """
+    Удаляет заказ вместе с составом (внешние ключи в SQLite по умолчанию не
+    каскадируют); зарезервированный товар возвращается на склад. При
+    row_version - только если заказ не менялся с открытия.
+    """
+    if row_version is not None:
+        row = conn.execute(ORDER_VERSION_QUERY, (order_id,)).fetchone()
+        if row is None or row[0] != row_version:
+            raise OrderConflictError(f"Заказ {order_id} изменён или удалён другим пользователем.")
+    inventory.release_order(conn, order_id)
+    conn.execute('DELETE FROM OrderProduct WHERE OrderID = ?', (order_id,))
+    conn.execute('DELETE FROM "Order" WHERE OrderID = ?', (order_id,))
+
+# Карточка товара пишется без остатка: остаток меняется только разницей
+# через inventory.adjust_stock, чтобы не затереть резервы заказов
+PRODUCT_INSERT_SQL = """
+INSERT INTO Product (ProductArticle, Name, Unit, Price, Discount, Quantity, Description, Photo, ProviderID, ManufacturerID, CategoryID)
+VALUES (?, ?, 'шт.', ?, ?, 0, ?, ?, ?, ?, ?)
+"""
+PRODUCT_UPDATE_SQL = """
+UPDATE Product SET Name=?, Unit='шт.', Price=?, Discount=?, Description=?, Photo=?, ProviderID=?, ManufacturerID=?, CategoryID=?
+WHERE ProductArticle=?
+"""
+
+def save_product(conn, article, fields, quantity, loaded_quantity=None):
+    """
+    Записывает карточку товара article (новый товар, если loaded_quantity
+    None). fields - (название, цена, скидка, описание, фото, поставщик,
+    производитель, категория). Остаток не перезаписывается: к нему
+    прибавляется quantity - loaded_quantity (остаток при открытии карточки),
+    так что резервы заказов, сделанные пока карточка открыта, сохраняются.
+    Остаток ушёл бы в минус - OversellError.
+    """
+    if loaded_quantity is None:
+        conn.execute(PRODUCT_INSERT_SQL, (article, *fields))
+        loaded_quantity = 0
+    elif conn.execute(PRODUCT_UPDATE_SQL, (*fields, article)).rowcount != 1:
+        raise sqlite3.DatabaseError(f"Товар {article} удалён другим пользователем.")
+    inventory.adjust_stock(conn, article, quantity - loaded_quantity)
+
+PRODUCTS_TIEBREAKER = 'T1.ProductArticle'
+PAGE_SIZE_OPTIONS = (10, 20, 50, 100)  # Варианты "товаров на странице" в CatalogWindow
+
+def build_products_query(role_name, category_filter=None, sort_order='ASC', search_query=None,
+                         after=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Собирает запрос одной страницы товаров для CatalogWindow: page_size + 1
+    строк после курсора after = (ключ сортировки, артикул). Возвращает (sql, params).
+    """
+    # Гостю - каталог по названию, менеджеру - по скидке (+ артикул для однозначного порядка)
+    sort_expression, descending = 'T1.Name COLLATE NOCASE', False
+    if role_name in ['Менеджер', 'Администратор']:
+        sort_expression, descending = 'T1.Discount', sort_order == 'DESC'
+
+    base_query = f"""
+    SELECT 
+        T1.ProductArticle, T1.Name, T1.Price, T1.Discount, T1.Quantity, T1.Description, T1.Photo, 
+        T3.CategoryName,
+        {sort_expression} AS SortKey
     FROM Product AS T1
-    INNER JOIN Category AS T2 ON T1.CategoryID = T2.CategoryID
-    INNER JOIN Provider AS T3 ON T1.ProviderID = T3.ProviderID
-    INNER JOIN Manufacturer AS T4 ON T1.ManufacturerID = T4.ManufacturerID
-    WHERE T1.ProductArticle = ?
+    INNER JOIN Category AS T3 ON T1.CategoryID = T3.CategoryID
     """
-    return execute_query(query, (article,), fetch_one=True)
-def get_order_details(order_id):
-    order_query = 'SELECT * FROM "Order" WHERE OrderID = ?'
-    products_query = 'SELECT T1.ProductArticle, T1.Quantity, T2.Name FROM OrderProduct AS T1 INNER JOIN Product AS T2 ON T1.ProductArticle = T2.ProductArticle WHERE T1.OrderID = ?'
-    order = execute_query(order_query, (order_id,), fetch_one=True)
-    products = execute_query(products_query, (order_id,))
-    return order, products
+    conditions, params = [], []
+    
+    if role_name in ['Менеджер', 'Администратор']:
+        if category_filter:
+            conditions.append("T3.CategoryName = ?")
+            params.append(category_filter)
+            
+        # Поиск по полнотекстовому индексу ProductSearch (FTS5)
+        match_query = build_match_query(search_query)
+        if match_query:
+            base_query += " INNER JOIN ProductSearch AS S ON S.ProductArticle = T1.ProductArticle"
+            conditions.append("S.ProductSearch MATCH ?")
+            params.append(match_query)
+
+    if after is not None:
+        condition, condition_params = keyset_condition(sort_expression, PRODUCTS_TIEBREAKER, descending, after)
+        conditions.append(f"({condition})")
+        params.extend(condition_params)
+    
+    if conditions:
+        base_query += " WHERE " + " AND ".join(conditions)
+
+    order_by = order_by_clause(sort_expression, PRODUCTS_TIEBREAKER, descending)
+    params.append(page_size + 1)
+    return base_query + " " + order_by + " LIMIT ?", params
+
+ORDERS_PAGE_SIZE = 100  # Заказов на странице OrdersWindow
+
+def build_orders_query(after=None, page_size=ORDERS_PAGE_SIZE):
+    """
+    Страница списка заказов из сводки OrderSummary (ведётся триггерами, см.
+    migrations.py): page_size + 1 заказов с номером меньше after, новые первыми.
+    Стоимость страницы не зависит от числа заказов. Возвращает (sql, params).
+    """
+    query = """
+    SELECT OrderID, StatusName, Address, OrderDate, DeliveryDate, ArticlesList, ItemCount, TotalAmount
+    FROM OrderSummary
+    """
+    params = []
+    if after is not None:
+        query += " WHERE OrderID < ?"
+        params.append(after)
+    params.append(page_size + 1)
+    return query + " ORDER BY OrderID DESC LIMIT ?", params
 
 # --- 3. ОКНА CRUD (АДМИНИСТРАТОР) ---
 
@@ -85,6 +381,7 @@ class ProductCRUDWindow(tk.Toplevel):
         self.catalog_ref = catalog_ref
 
         self.data = get_product_by_article(article) if article else None
+        self.references = get_reference_lists('suppliers', 'manufacturers', 'categories')
         self._setup_style()
         self._setup_widgets()
         if self.data:
@@ -109,9 +406,9 @@ class ProductCRUDWindow(tk.Toplevel):
             ("Кол-во на складе:", "Quantity", 'entry'),
             ("Описание:", "Description", 'entry'),
             ("Фото (путь):", "Photo", 'entry'),
-            ("Поставщик:", "ProviderName", 'combo', get_all_suppliers()),
-            ("Производитель:", "ManufacturerName", 'combo', get_all_manufacturers()),
-            ("Категория:", "CategoryName", 'combo', get_all_categories()),
+            ("Поставщик:", "ProviderName", 'combo', self.references['suppliers']),
+            ("Производитель:", "ManufacturerName", 'combo', self.references['manufacturers']),
+            ("Категория:", "CategoryName", 'combo', self.references['categories']),
         ]
 
         self.entries = {}
@@ -155,7 +452,7 @@ class ProductCRUDWindow(tk.Toplevel):
         data = {}
         for key, widget in self.entries.items():
             if isinstance(widget, ttk.Entry):
-                data[key] = widget.get()
+                data[key] = normalize_text(widget.get())
             elif isinstance(widget, ttk.Combobox):
                 selected_name = widget.get()
                 data[key.replace('Name', 'ID')] = widget.data_map.get(selected_name)
@@ -168,28 +465,23 @@ class ProductCRUDWindow(tk.Toplevel):
         except ValueError:
             return messagebox.showerror("Ошибка", "Цена, Скидка и Количество должны быть числами.")
 
-        if self.article:
-            query = """
-            UPDATE Product SET Name=?, Unit='шт.', Price=?, Discount=?, Quantity=?, Description=?, Photo=?, ProviderID=?, ManufacturerID=?, CategoryID=? 
-            WHERE ProductArticle=?
-            """
-            params = (data['Name'], float(data['Price']), int(data['Discount']), int(data['Quantity']), data['Description'], data['Photo'], data['ProviderID'], data['ManufacturerID'], data['CategoryID'], self.article)
-        else:
-            query = """
-            INSERT INTO Product (ProductArticle, Name, Unit, Price, Discount, Quantity, Description, Photo, ProviderID, ManufacturerID, CategoryID)
-            VALUES (?, ?, 'шт.', ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            params = (data['Article'], data['Name'], float(data['Price']), int(data['Discount']), int(data['Quantity']), data['Description'], data['Photo'], data['ProviderID'], data['ManufacturerID'], data['CategoryID'])
-        
-        success, _ = execute_query(query, params)
-        
-        if success:
-            messagebox.showinfo("Успех", "Данные товара успешно сохранены.")
-            if self.catalog_ref:
-                self.catalog_ref.load_products()
-            self.destroy()
-        else:
-            messagebox.showerror("Ошибка", "Ошибка сохранения данных в БД. Проверьте Артикул на уникальность (при добавлении).")
+        # Карточка и изменение остатка (разница с открытым значением) - одной операцией очереди записи
+        article = self.article or data['Article']
+        fields = (data['Name'], float(data['Price']), int(data['Discount']), data['Description'], data['Photo'], data['ProviderID'], data['ManufacturerID'], data['CategoryID'])
+        loaded_quantity = (self.data['Quantity'] or 0) if self.article else None
+        try:
+            get_writer().execute(save_product, article, fields, int(data['Quantity']), loaded_quantity)
+        except inventory.OversellError as e:
+            return messagebox.showerror("Ошибка", f"Остаток товара изменился после открытия карточки (на складе {e.available}). Закройте окно и откройте товар заново.")
+        except sqlite3.Error:
+            return messagebox.showerror("Ошибка", "Ошибка сохранения данных в БД. Проверьте Артикул на уникальность (при добавлении).")
+        
+        # Миниатюры для каталога (если фото уже есть - файлы не пересоздаются)
+        generate_thumbnails(data['Photo'])
+        messagebox.showinfo("Успех", "Данные товара успешно сохранены.")
+        if self.catalog_ref:
+            self.catalog_ref.load_products()
+        self.destroy()
 
 
 class OrderCRUDWindow(tk.Toplevel):
@@ -201,9 +493,20 @@ class OrderCRUDWindow(tk.Toplevel):
         self.order_id = order_id
         self.orders_ref = orders_ref
         
-        self.order_data, self.product_list = get_order_details(order_id) if order_id else (None, [])
-        self.product_list = [dict(item) for item in self.product_list]
-        self.all_products_raw = execute_query("SELECT ProductArticle, Name FROM Product")
+        # Все данные окна (заказ, его состав, справочники, товары) - одним пакетом
+        extra_queries = {'all_products': ALL_PRODUCTS_QUERY}
+        if order_id:
+            extra_queries['order'] = (ORDER_QUERY, (order_id,))
+            extra_queries['order_products'] = (ORDER_PRODUCTS_QUERY, (order_id,))
+        self.references = get_reference_lists('statuses', 'pickup_points', **extra_queries)
+        
+        order_rows = self.references.get('order')
+        self.order_data = dict(order_rows[0]) if order_rows else None
+        self.product_list = [dict(item) for item in self.references.get('order_products', [])]
+        # Состояние при открытии: при сохранении в базу пишется только разница с ним
+        self.row_version = self.order_data.get('RowVersion') if self.order_data else None
+        self.loaded_lines = [(item['ProductArticle'], item['Quantity']) for item in self.product_list]
+        self.all_products_raw = self.references['all_products']
         self.product_map = {row['Name']: row['ProductArticle'] for row in self.all_products_raw}
         
         self._setup_style()
@@ -225,8 +528,8 @@ class OrderCRUDWindow(tk.Toplevel):
             ("Код получения:", "Code", 'entry'),
             ("Дата заказа (ГГГГ-ММ-ДД):", "OrderDate", 'entry'),
             ("Дата доставки (ГГГГ-ММ-ДД):", "DeliveryDate", 'entry'),
-            ("Статус:", "StatusID", 'combo', get_all_statuses()),
-            ("Пункт выдачи:", "PointID", 'combo', get_all_pickup_points()),
+            ("Статус:", "StatusID", 'combo', self.references['statuses']),
+            ("Пункт выдачи:", "PointID", 'combo', self.references['pickup_points']),
         ]
 
         self.entries = {}
@@ -347,61 +650,40 @@ class OrderCRUDWindow(tk.Toplevel):
         data = {}
         for key, widget in self.entries.items():
             if isinstance(widget, ttk.Entry):
-                data[key] = widget.get()
+                data[key] = normalize_text(widget.get())
             elif isinstance(widget, ttk.Combobox):
                 data[key] = widget.data_map.get(widget.get())
         
         if not all([data['ClientFIO'], data['OrderDate'], data['DeliveryDate'], data['StatusID'], data['PointID']]) or not self.product_list:
             return messagebox.showerror("Ошибка", "Заполните все основные поля и добавьте хотя бы один товар.")
 
-        # Сохранение/Обновление основной таблицы Order
-        if self.order_id:
-            query = """
-            UPDATE "Order" SET ClientFIO=?, Code=?, OrderDate=?, DeliveryDate=?, StatusID=?, PointID=? 
-            WHERE OrderID=?
-            """
-            params = (data['ClientFIO'], data['Code'], data['OrderDate'], data['DeliveryDate'], data['StatusID'], data['PointID'], self.order_id)
-            success, _ = execute_query(query, params)
-            new_order_id = self.order_id
-        else:
-            query = """
-            INSERT INTO "Order" (ClientFIO, Code, OrderDate, DeliveryDate, StatusID, PointID)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """
-            params = (data['ClientFIO'], data['Code'], data['OrderDate'], data['DeliveryDate'], data['StatusID'], data['PointID'])
-            success, new_order_id = execute_query(query, params)
-        
-        if success:
-            # Обновление состава заказа (OrderProduct)
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            try:
-                cursor.execute('DELETE FROM OrderProduct WHERE OrderID = ?', (new_order_id,))
-                insert_data = [(new_order_id, item['ProductArticle'], item['Quantity']) for item in self.product_list]
-                cursor.executemany('INSERT INTO OrderProduct (OrderID, ProductArticle, Quantity) VALUES (?, ?, ?)', insert_data)
-                conn.commit()
-                
-                messagebox.showinfo("Успех", "Данные заказа успешно сохранены.")
-                if self.orders_ref:
-                    self.orders_ref.load_orders()
-                self.destroy()
-            except sqlite3.Error as e:
-                conn.rollback()
-                messagebox.showerror("Ошибка", f"Ошибка сохранения состава заказа: {e}")
-            finally:
-                conn.close()
-        else:
-            messagebox.showerror("Ошибка", "Ошибка сохранения основных данных заказа.")
+        # Заказ и его состав сохраняются атомарно - одной операцией очереди записи
+        header = (data['ClientFIO'], data['Code'], data['OrderDate'], data['DeliveryDate'], data['StatusID'], data['PointID'])
+        lines = [(item['ProductArticle'], item['Quantity']) for item in self.product_list]
+        try:
+            get_writer().execute(save_order, self.order_id, header, lines, self.row_version, self.loaded_lines)
+        except OrderConflictError as e:
+            return messagebox.showerror("Ошибка", f"{e} Закройте окно и откройте заказ заново.")
+        except sqlite3.Error as e:
+            return messagebox.showerror("Ошибка", f"Ошибка сохранения заказа: {e}")
+        
+        messagebox.showinfo("Успех", "Данные заказа успешно сохранены.")
+        if self.orders_ref:
+            self.orders_ref.load_orders()
+        self.destroy()
 
     def _delete_order(self):
         if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить заказ ID: {self.order_id}?"):
-            if execute_query("DELETE FROM \"Order\" WHERE OrderID = ?", (self.order_id,)):
-                messagebox.showinfo("Успех", "Заказ удален.")
-                if self.orders_ref:
-                    self.orders_ref.load_orders()
-                self.destroy()
-            else:
-                messagebox.showerror("Ошибка", "Не удалось удалить заказ.")
+            try:
+                get_writer().execute(delete_order, self.order_id, self.row_version)
+            except OrderConflictError as e:
+                return messagebox.showerror("Ошибка", f"{e} Закройте окно и откройте заказ заново.")
+            except sqlite3.Error:
+                return messagebox.showerror("Ошибка", "Не удалось удалить заказ.")
+            messagebox.showinfo("Успех", "Заказ удален.")
+            if self.orders_ref:
+                self.orders_ref.load_orders()
+            self.destroy()
                 
 # --- 4. ОСНОВНЫЕ ОКНА ПРИЛОЖЕНИЯ ---
 
@@ -456,6 +738,117 @@ class AuthWindow(tk.Toplevel):
         CatalogWindow(self.master, "Гость")
 
 
+class ProductRow:
+    """Строка списка товаров. Создаётся один раз и привязывается к разным товарам."""
+
+    def __init__(self, master, with_crud, on_edit, on_delete):
+        self.product = None
+        self._shown = None  # Что сейчас отображено: повторная привязка того же товара ничего не меняет
+        self.frame = ttk.Frame(master, relief=tk.SOLID, borderwidth=1, padding=5, style=f'{PRODUCT_ROW_STYLE}.TFrame')
+        self.photo_label = ttk.Label(self.frame, text="[Фото]", width=10, style=f'{PRODUCT_ROW_STYLE}.TLabel')
+        self.photo_label.pack(side='left', padx=10)
+        self.info_label = ttk.Label(self.frame, text="", justify='left', style=f'{PRODUCT_ROW_STYLE}.TLabel')
+        self.info_label.pack(side='left', fill='x', expand=True)
+        self.crud_frame = None
+        if with_crud:
+            self.crud_frame = ttk.Frame(self.frame, style=f'{PRODUCT_ROW_STYLE}.TFrame')
+            self.crud_frame.pack(side='right')
+            ttk.Button(self.crud_frame, text="Ред.", command=lambda: on_edit(self.product['ProductArticle']), style='TButton', width=5).pack(pady=2)
+            ttk.Button(self.crud_frame, text="Удал.", command=lambda: on_delete(self.product['ProductArticle']), style='TButton', width=5).pack(pady=2)
+
+    def bind(self, product):
+        """Показывает в строке товар product (обновляются только текст и стиль)."""
+        self.product = product
+        info_text = (
+            f"Название: {product['Name']} | Артикул: {product['ProductArticle']}\n"
+            f"Описание: {(product['Description'] or '')[:50]}...\n"
+            f"Категория: {product['CategoryName']}\n"
+            f"Цена: {product['Price'] * (1 - product['Discount'] / 100):.2f} руб. (Скидка: {product['Discount']}%)"
+        )
+        style = PRODUCT_ROW_HIGH_STYLE if product['Discount'] > 15 else PRODUCT_ROW_STYLE
+        if self._shown == (info_text, style):
+            return
+        if self._shown is None or self._shown[1] != style:
+            self.frame.configure(style=f'{style}.TFrame')
+            self.photo_label.configure(style=f'{style}.TLabel')
+            self.info_label.configure(style=f'{style}.TLabel')
+            if self.crud_frame is not None:
+                self.crud_frame.configure(style=f'{style}.TFrame')
+        self.info_label.configure(text=info_text)
+        self._shown = (info_text, style)
+
+
+class ProductListView(ttk.Frame):
+    """
+    Виртуализированный список товаров: постоянный набор строк (visible_rows)
+    показывает окно из self.items, прокрутка лишь перепривязывает строки к
+    другим товарам. Виджеты и стили не создаются заново при смене данных.
+    """
+
+    def __init__(self, master, with_crud=False, on_edit=None, on_delete=None, visible_rows=PRODUCT_LIST_VISIBLE_ROWS):
+        super().__init__(master)
+        style = ttk.Style(self)
+        for style_name, background in ((PRODUCT_ROW_STYLE, COLOR_PRIMARY), (PRODUCT_ROW_HIGH_STYLE, COLOR_DISCOUNT_HIGH)):
+            style.configure(f'{style_name}.TFrame', background=background)
+            style.configure(f'{style_name}.TLabel', background=background)
+
+        self.items = []
+        self.offset = 0  # Индекс товара в первой видимой строке
+
+        rows_frame = ttk.Frame(self)
+        rows_frame.pack(side='left', expand=True, fill='both')
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.rows = [ProductRow(rows_frame, with_crud, on_edit, on_delete) for _ in range(visible_rows)]
+        for i, row in enumerate(self.rows):
+            row.frame.grid(row=i, column=0, sticky='ew', padx=5, pady=5)
+        rows_frame.grid_columnconfigure(0, weight=1)
+        self._bind_wheel(rows_frame)  # Строки созданы заранее: привязка проходит и по ним
+
+    def _bind_wheel(self, widget):
+        """Прокрутка колесом мыши над виджетом и всеми вложенными (кнопки строки тоже)."""
+        widget.bind('<MouseWheel>', lambda e: self.scroll_by(-1 if e.delta > 0 else 1))
+        widget.bind('<Button-4>', lambda e: self.scroll_by(-1))  # X11
+        widget.bind('<Button-5>', lambda e: self.scroll_by(1))
+        for child in widget.winfo_children():
+            self._bind_wheel(child)
+
+    def set_items(self, items, keep_position=False):
+        """Новые данные списка; строки перепривязываются, а не пересоздаются."""
+        self.items = list(items)
+        self._scroll_to(self.offset if keep_position else 0)
+
+    def scroll_by(self, delta):
+        self._scroll_to(self.offset + delta)
+
+    def _max_offset(self):
+        return max(0, len(self.items) - len(self.rows))
+
+    def _scroll_to(self, offset):
+        self.offset = max(0, min(offset, self._max_offset()))
+        for i, row in enumerate(self.rows):
+            index = self.offset + i
+            if index < len(self.items):
+                row.bind(self.items[index])
+                row.frame.grid()
+            else:
+                row.frame.grid_remove()
+        if self.items:
+            visible = min(len(self.rows), len(self.items))
+            self.scrollbar.set(self.offset / len(self.items), (self.offset + visible) / len(self.items))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        """Команда полосы прокрутки: ('moveto', доля) или ('scroll', n, 'units'|'pages')."""
+        if action == 'moveto':
+            self._scroll_to(round(float(amount) * len(self.items)))
+        elif action == 'scroll':
+            step = len(self.rows) if unit == 'pages' else 1
+            self.scroll_by(int(amount) * step)
+
+
 class CatalogWindow(tk.Toplevel):
     def __init__(self, master, role):
         super().__init__(master)
@@ -472,6 +865,10 @@ class CatalogWindow(tk.Toplevel):
         self.search_entry = None
         self.category_var = tk.StringVar(self)
         self.sort_var = tk.StringVar(self)
+        self.page_size_var = tk.StringVar(self, value=str(DEFAULT_PAGE_SIZE))
+        # Курсоры начала просмотренных страниц (None - первая страница)
+        self.page_cursors = [None]
+        self.next_cursor = None
 
         self.create_widgets()
         self.load_products()
@@ -484,16 +881,16 @@ class CatalogWindow(tk.Toplevel):
             ttk.Label(top_frame, text="Поиск:").pack(side='left', padx=(0, 5))
             self.search_entry = ttk.Entry(top_frame, width=20, font=(FONT_FAMILY, 10))
             self.search_entry.pack(side='left', padx=5)
-            self.search_entry.bind('<Return>', lambda e: self.load_products())
+            self.search_entry.bind('<Return>', lambda e: self.reload_first_page())
             
             categories = ["Все категории"] + [row[1] for row in get_all_categories()]
             self.category_var.set("Все категории")
-            category_menu = ttk.OptionMenu(top_frame, self.category_var, self.category_var.get(), *categories, command=lambda e: self.load_products())
+            category_menu = ttk.OptionMenu(top_frame, self.category_var, self.category_var.get(), *categories, command=lambda e: self.reload_first_page())
             category_menu.pack(side='left', padx=5)
             
             self.sort_var.set("По возрастанию скидки")
             sort_options = ["По возрастанию скидки", "По убыванию скидки"]
-            sort_menu = ttk.OptionMenu(top_frame, self.sort_var, self.sort_var.get(), *sort_options, command=lambda e: self.load_products())
+            sort_menu = ttk.OptionMenu(top_frame, self.sort_var, self.sort_var.get(), *sort_options, command=lambda e: self.reload_first_page())
             sort_menu.pack(side='left', padx=5)
 
             if self.role == 'Администратор':
@@ -501,75 +898,63 @@ class CatalogWindow(tk.Toplevel):
                 
             ttk.Button(top_frame, text="ЗАКАЗЫ", command=self.open_orders_window, style='TButton').pack(side='right', padx=15)
         
-        self.products_frame = ttk.Frame(self, padding="10")
-        self.products_frame.pack(expand=True, fill='both')
-        
-    def load_products(self):
-        for widget in self.products_frame.winfo_children():
-            widget.destroy()
+        # Переключение страниц
+        pager_frame = ttk.Frame(self, padding="10")
+        pager_frame.pack(side='bottom', fill='x')
+        self.prev_button = ttk.Button(pager_frame, text="< НАЗАД", command=self.prev_page, style='TButton')
+        self.prev_button.pack(side='left', padx=5)
+        self.page_label = ttk.Label(pager_frame, text="")
+        self.page_label.pack(side='left', padx=5)
+        self.next_button = ttk.Button(pager_frame, text="ВПЕРЁД >", command=self.next_page, style='TButton')
+        self.next_button.pack(side='left', padx=5)
+        page_size_menu = ttk.OptionMenu(pager_frame, self.page_size_var, self.page_size_var.get(),
+                                        *[str(size) for size in PAGE_SIZE_OPTIONS], command=lambda e: self.reload_first_page())
+        page_size_menu.pack(side='right', padx=5)
+        ttk.Label(pager_frame, text="Товаров на странице:").pack(side='right')
+
+        self.product_list = ProductListView(self, with_crud=self.role == 'Администратор',
+                                            on_edit=self.open_product_crud, on_delete=self.delete_product)
+        self.product_list.pack(expand=True, fill='both', padx=10, pady=10)
+
+    def reload_first_page(self):
+        """Фильтры, сортировка или размер страницы изменились - показываем с начала."""
+        self.page_cursors = [None]
+        self.load_products(keep_position=False)
+
+    def next_page(self):
+        if self.next_cursor is not None:
+            self.page_cursors.append(self.next_cursor)
+            self.load_products(keep_position=False)
 
+    def prev_page(self):
+        if len(self.page_cursors) > 1:
+            self.page_cursors.pop()
+            self.load_products(keep_position=False)
+        
+    def load_products(self, keep_position=True):
+        """
+        Загружает текущую страницу (курсор - последний в self.page_cursors).
+        keep_position: после правки/удаления товара список остаётся на месте.
+        """
         category_filter = self.category_var.get() if self.role in ['Менеджер', 'Администратор'] and self.category_var.get() != "Все категории" else None
         search_query = self.search_entry.get() if self.role in ['Менеджер', 'Администратор'] and self.search_entry else None
         sort_order = 'DESC' if self.role in ['Менеджер', 'Администратор'] and self.sort_var.get() == "По убыванию скидки" else 'ASC'
         
-        products = self._get_products_from_db(self.role, category_filter, sort_order, search_query)
-        
-        for i, product in enumerate(products):
-            item_frame = ttk.Frame(self.products_frame, relief=tk.SOLID, borderwidth=1, padding=5)
-            item_frame.grid(row=i, column=0, sticky='ew', padx=5, pady=5)
-            
-            background_color = COLOR_PRIMARY
-            if product['Discount'] > 15:
-                background_color = COLOR_DISCOUNT_HIGH
-                style_name = f'Discount{i}.TFrame'
-                style = ttk.Style(self)
-                style.configure(style_name, background=background_color)
-                item_frame.configure(style=style_name)
-
-            ttk.Label(item_frame, text="[Фото]", width=10, background=background_color).pack(side='left', padx=10)
-
-            info_text = (
-                f"Название: {product['Name']} | Артикул: {product['ProductArticle']}\n"
-                f"Описание: {product['Description'][:50]}...\n"
-                f"Категория: {product['CategoryName']}\n"
-                f"Цена: {product['Price'] * (1 - product['Discount'] / 100):.2f} руб. (Скидка: {product['Discount']}%)"
-            )
-            ttk.Label(item_frame, text=info_text, justify='left', background=background_color).pack(side='left', fill='x', expand=True)
-            
-            if self.role == 'Администратор':
-                crud_frame = ttk.Frame(item_frame, background=background_color)
-                crud_frame.pack(side='right')
-                ttk.Button(crud_frame, text="Ред.", command=lambda art=product['ProductArticle']: self.open_product_crud(art), style='TButton', width=5).pack(pady=2)
-                ttk.Button(crud_frame, text="Удал.", command=lambda art=product['ProductArticle']: self.delete_product(art), style='TButton', width=5).pack(pady=2)
-
-        self.products_frame.grid_columnconfigure(0, weight=1)
-
-    def _get_products_from_db(self, role_name, category_filter=None, sort_order='ASC', search_query=None):
-        base_query = """
-        SELECT 
-            T1.ProductArticle, T1.Name, T1.Price, T1.Discount, T1.Quantity, T1.Description, T1.Photo, 
-            T3.CategoryName
-        FROM Product AS T1
-        INNER JOIN Category AS T3 ON T1.CategoryID = T3.CategoryID
-        """
-        conditions, params, order_by = [], [], ""
-        
-        if role_name in ['Менеджер', 'Администратор']:
-            if category_filter:
-                conditions.append("T3.CategoryName = ?")
-                params.append(category_filter)
-                
-            if search_query:
-                conditions.append("(T1.Name LIKE ? OR T1.Description LIKE ?)")
-                params.extend([f'%{search_query}%', f'%{search_query}%'])
-                
-            order_by = f"ORDER BY T1.Discount {sort_order}"
-        
-        if conditions:
-            base_query += " WHERE " + " AND ".join(conditions)
-            
-        final_query = base_query + " " + order_by
+        page_size = int(self.page_size_var.get())
+        rows = self._get_products_from_db(self.role, category_filter, sort_order, search_query,
+                                          decode_cursor(self.page_cursors[-1]), page_size)
+        products, self.next_cursor = split_page(rows, page_size)
+
+        self.page_label.configure(text=f"Страница {len(self.page_cursors)}")
+        self.prev_button.state(['!disabled'] if len(self.page_cursors) > 1 else ['disabled'])
+        self.next_button.state(['!disabled'] if self.next_cursor else ['disabled'])
         
+        self.product_list.set_items(products, keep_position)
+
+    def _get_products_from_db(self, role_name, category_filter=None, sort_order='ASC', search_query=None,
+                              after=None, page_size=DEFAULT_PAGE_SIZE):
+        final_query, params = build_products_query(role_name, category_filter, sort_order, search_query,
+                                                   after, page_size)
         return execute_query(final_query, params)
 
     def open_product_crud(self, product_article=None):
@@ -577,7 +962,8 @@ class CatalogWindow(tk.Toplevel):
 
     def delete_product(self, article):
         if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить товар {article}?"):
-            if execute_query("DELETE FROM Product WHERE ProductArticle=?", (article,)):
+            success, _ = execute_query("DELETE FROM Product WHERE ProductArticle=?", (article,))
+            if success:
                  messagebox.showinfo("Успех", "Товар удален.")
             else:
                  messagebox.showerror("Ошибка", "Не удалось удалить товар. Проверьте, не связан ли он с заказами.")
@@ -606,18 +992,35 @@ class OrdersWindow(tk.Toplevel):
             
         ttk.Button(top_frame, text="ОБНОВИТЬ", command=self.load_orders, style='TButton').pack(side='left', padx=5)
 
-        self.tree = ttk.Treeview(self, columns=('status', 'point', 'date_order', 'date_delivery', 'articles'), show='headings')
+        # Переключение страниц: курсоры начала просмотренных страниц (None - первая)
+        self.page_cursors = [None]
+        self.next_cursor = None
+        pager_frame = ttk.Frame(self, padding=10)
+        pager_frame.pack(side='bottom', fill='x')
+        self.prev_button = ttk.Button(pager_frame, text="< НАЗАД", command=self.prev_page, style='TButton')
+        self.prev_button.pack(side='left', padx=5)
+        self.page_label = ttk.Label(pager_frame, text="")
+        self.page_label.pack(side='left', padx=5)
+        self.next_button = ttk.Button(pager_frame, text="ВПЕРЁД >", command=self.next_page, style='TButton')
+        self.next_button.pack(side='left', padx=5)
+
+        self.tree = ttk.Treeview(self, columns=('status', 'point', 'date_order', 'date_delivery', 'articles',
+                                                'items', 'total'), show='headings')
         self.tree.heading('status', text='Статус заказа')
         self.tree.heading('point', text='Адрес пункта выдачи')
         self.tree.heading('date_order', text='Дата заказа')
         self.tree.heading('date_delivery', text='Дата доставки')
         self.tree.heading('articles', text='Состав заказа')
+        self.tree.heading('items', text='Позиций')
+        self.tree.heading('total', text='Сумма')
         
         self.tree.column('status', width=100)
         self.tree.column('point', width=150)
         self.tree.column('date_order', width=120)
         self.tree.column('date_delivery', width=120)
-        self.tree.column('articles', width=450)
+        self.tree.column('articles', width=350)
+        self.tree.column('items', width=60, anchor='e')
+        self.tree.column('total', width=90, anchor='e')
         
         self.tree.pack(expand=True, fill='both', padx=10, pady=5)
         
@@ -626,38 +1029,43 @@ class OrdersWindow(tk.Toplevel):
         
         self.load_orders()
 
+    def next_page(self):
+        if self.next_cursor is not None:
+            self.page_cursors.append(self.next_cursor)
+            self.load_orders()
+
+    def prev_page(self):
+        if len(self.page_cursors) > 1:
+            self.page_cursors.pop()
+            self.load_orders()
+
     def load_orders(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-            
-        query = """
-        SELECT 
-            T1.OrderID,
-            T4.StatusName,
-            T3.Address,
-            T1.OrderDate,
-            T1.DeliveryDate,
-            GROUP_CONCAT(T2.ProductArticle || ' (' || T2.Quantity || ' шт.)', ' / ') AS ArticlesList
-        FROM "Order" AS T1
-        INNER JOIN OrderProduct AS T2 ON T1.OrderID = T2.OrderID
-        INNER JOIN PickupPoint AS T3 ON T1.PointID = T3.PointID
-        INNER JOIN OrderStatus AS T4 ON T1.StatusID = T4.StatusID
-        GROUP BY T1.OrderID
-        ORDER BY T1.OrderID DESC;
-        """
-        orders = execute_query(query)
-        
-        if orders:
-            for order in orders:
-                self.tree.insert('', 'end', 
-                                 iid=order['OrderID'], 
-                                 values=(
-                                     order['StatusName'],
-                                     order['Address'],
-                                     order['OrderDate'],
-                                     order['DeliveryDate'],
-                                     order['ArticlesList']
-                                 ))
+        """Загружает текущую страницу заказов (курсор - последний в self.page_cursors)."""
+        self.tree.delete(*self.tree.get_children())
+
+        sql, params = build_orders_query(self.page_cursors[-1])
+        orders = execute_query(sql, params)
+        if not isinstance(orders, list):
+            orders = []  # Ошибка БД: execute_query вернул (False, None)
+        orders, extra = orders[:ORDERS_PAGE_SIZE], orders[ORDERS_PAGE_SIZE:]
+        self.next_cursor = orders[-1]['OrderID'] if extra else None
+
+        for order in orders:
+            self.tree.insert('', 'end', 
+                             iid=order['OrderID'], 
+                             values=(
+                                 order['StatusName'],
+                                 order['Address'],
+                                 order['OrderDate'],
+                                 order['DeliveryDate'],
+                                 order['ArticlesList'],
+                                 order['ItemCount'],
+                                 f"{order['TotalAmount']:.2f}"
+                             ))
+
+        self.page_label.configure(text=f"Страница {len(self.page_cursors)}")
+        self.prev_button.state(['!disabled'] if len(self.page_cursors) > 1 else ['disabled'])
+        self.next_button.state(['!disabled'] if self.next_cursor is not None else ['disabled'])
                                  
     def on_order_select(self, event):
         selected_item = self.tree.focus()
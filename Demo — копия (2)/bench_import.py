@@ -0,0 +1,387 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import data_import
+import db_config
+from migrations import migrate
+
+try:
+    import resource
+except ImportError:  # Windows - пиковая память не измеряется
+    resource = None
+
+# Замер скорости импорта (data_import) на синтетических данных.
+# Для каждого масштаба и формата генерируются четыре файла импорта
+# (товары, пользователи, пункты выдачи, заказы) с теми же заголовками,
+# что у настоящих, затем импорт запускается в отдельном процессе -
+# так пиковая память (peak RSS) относится только к одному прогону.
+# Результаты дописываются в JSON-файл, чтобы сравнивать версии.
+#
+# Запуск: python bench_import.py --scale 1000 --scale 100000 --format csv-utf8 --format xlsx
+
+DEFAULT_RESULTS_FILE = 'bench_results.json'
+DEFAULT_SCALES = (1000,)
+# Формат: (кодировка CSV, разделитель CSV); у xlsx - (None, None)
+FORMATS = {
+    'csv-utf8': ('utf-8', ','),
+    'csv-cp1251': ('cp1251', ';'),
+    'xlsx': (None, None),
+}
+GENERATE_CHUNK_ROWS = 100000  # Файлы пишутся блоками: память генератора не растёт с масштабом
+SEED = 2025
+
+# --- 1. ГЕНЕРАТОР ДАННЫХ ---
+# Масштаб N: N товаров и N заказов (1-4 позиции), N/100 пользователей, N/1000 пунктов выдачи.
+
+ROLES = ('Администратор', 'Менеджер', 'Авторизированный клиент')
+SURNAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+            'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров')
+FIRST_NAMES = ('Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артём', 'Илья',
+               'Кирилл', 'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Арсений', 'Иван')
+PATRONYMICS = ('Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Алексеевич', 'Иванович',
+               'Михайлович', 'Николаевич', 'Павлович', 'Петрович', 'Юрьевич', 'Германович')
+CITIES = ('Лесной', 'Нижний Тагил', 'Екатеринбург', 'Каменск-Уральский', 'Первоуральск')
+STREETS = ('Вишневая', 'Подгорная', 'Шоссейная', 'Садовая', 'Полевая', 'Зелёная', 'Чехова',
+           'Степная', 'Коммунистическая', 'Солнечная', 'Маяковского', 'Некрасова', 'Октябрьская')
+PRODUCT_NAMES = ('Ботинки', 'Туфли', 'Кроссовки', 'Кеды', 'Сапоги', 'Полусапоги', 'Тапочки', 'Сандалии')
+CATEGORIES = ('Женская обувь', 'Мужская обувь', 'Детская обувь')
+SUPPLIERS = ('Kari', 'Обувь для вас', 'Башмачок', 'Ральф Рингер')
+MANUFACTURERS = ('Kari', 'Marco Tozzi', 'Рос', 'Rieker', 'Alessio Nesca', 'CROSBY', 'Salamander', 'ECCO')
+STATUSES = ('Новый', 'Завершен')
+ARTICLE_LETTERS = tuple('АБВГДЕЖКЛМНПРСТ')
+PHOTOS = tuple(f'{number}.jpg' for number in range(1, 11)) + ('',)
+
+def _choice(rng, values, size):
+    return pd.Series(np.asarray(values, dtype=object)[rng.integers(0, len(values), size)])
+
+def article_codes(indices):
+    """Артикул товара по номеру: буква + 7 цифр (уникален до 10 млн товаров)."""
+    indices = pd.Series(np.asarray(indices))
+    letters = pd.Series(np.asarray(ARTICLE_LETTERS, dtype=object)[indices.to_numpy() % len(ARTICLE_LETTERS)])
+    return letters + indices.astype(str).str.zfill(7)
+
+def person_names(indices):
+    """ФИО по номеру пользователя: разные номера дают разные ФИО."""
+    indices = pd.Series(np.asarray(indices))
+    surnames = pd.Series(np.asarray(SURNAMES, dtype=object)[indices.to_numpy() % len(SURNAMES)])
+    first = pd.Series(np.asarray(FIRST_NAMES, dtype=object)[indices.to_numpy() // len(SURNAMES) % len(FIRST_NAMES)])
+    patronymic = pd.Series(np.asarray(PATRONYMICS, dtype=object)[indices.to_numpy() // 256 % len(PATRONYMICS)])
+    # Номер в фамилии делает ФИО уникальным и при масштабе больше числа сочетаний
+    return surnames + indices.astype(str).radd('-').where(indices >= 3072, '') + ' ' + first + ' ' + patronymic
+
+def dataset_sizes(scale):
+    return {
+        'users': max(10, scale // 100),
+        'points': max(36, scale // 1000),
+        'products': scale,
+        'orders': scale,
+    }
+
+def generate_users(count, rng):
+    indices = np.arange(count)
+    return pd.DataFrame({
+        'Роль сотрудника': _choice(rng, ROLES, count),
+        'ФИО': person_names(indices),
+        'Логин': pd.Series(indices).astype(str).radd('user') + '@example.com',
+        'Пароль': pd.Series(rng.integers(16 ** 5, 16 ** 6, count)).map('{:x}'.format),
+    })
+
+def generate_points(count, rng):
+    return pd.DataFrame({0: (pd.Series(rng.integers(100000, 700000, count)).astype(str)
+                             + ', г. ' + _choice(rng, CITIES, count)
+                             + ', ул. ' + _choice(rng, STREETS, count)
+                             + ', ' + pd.Series(np.arange(count) + 1).astype(str))})
+
+def generate_products(start, count, rng):
+    names = _choice(rng, PRODUCT_NAMES, count)
+    manufacturers = _choice(rng, MANUFACTURERS, count)
+    return pd.DataFrame({
+        'Артикул': article_codes(np.arange(start, start + count)),
+        'Наименование товара': names,
+        'Единица измерения': 'шт.',
+        'Цена': rng.integers(500, 15000, count),
+        'Поставщик': _choice(rng, SUPPLIERS, count),
+        'Производитель': manufacturers,
+        'Категория товара': _choice(rng, CATEGORIES, count),
+        'Действующая скидка': rng.integers(0, 31, count),
+        'Кол-во на складе': rng.integers(0, 50, count),
+        'Описание товара': names + ' ' + manufacturers + ', размер ' + pd.Series(rng.integers(35, 46, count)).astype(str),
+        'Фото': _choice(rng, PHOTOS, count),
+    })
+
+def generate_orders(start, count, rng, sizes, as_datetime=False):
+    pairs = rng.integers(1, 5, count)
+    articles = article_codes(rng.integers(0, sizes['products'], count)) + ', ' + pd.Series(rng.integers(1, 10, count)).astype(str)
+    for extra in range(2, 5):
+        more = article_codes(rng.integers(0, sizes['products'], count)) + ', ' + pd.Series(rng.integers(1, 10, count)).astype(str)
+        articles = articles.where(pairs < extra, articles + ', ' + more)
+    order_dates = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 1200, count), unit='D')
+    delivery_dates = order_dates + pd.to_timedelta(rng.integers(2, 60, count), unit='D')
+    if not as_datetime:
+        order_dates = order_dates.strftime('%Y-%m-%d')
+        delivery_dates = delivery_dates.strftime('%Y-%m-%d')
+    return pd.DataFrame({
+        'Номер заказа': np.arange(start, start + count) + 1,
+        'Артикул заказа': articles,
+        'Дата заказа': order_dates,
+        'Дата доставки': delivery_dates,
+        'Адрес пункта выдачи': rng.integers(1, sizes['points'] + 1, count),
+        'ФИО авторизированного клиента': person_names(rng.integers(0, sizes['users'], count)),
+        'Код для получения': rng.integers(100, 1000, count),
+        'Статус заказа': _choice(rng, STATUSES, count),
+    })
+
+def _chunks(total, make_chunk):
+    for start in range(0, total, GENERATE_CHUNK_ROWS):
+        yield make_chunk(start, min(GENERATE_CHUNK_ROWS, total - start))
+
+def write_file(path, chunks, file_format, header=True):
+    """
+    Пишет блоки DataFrame в CSV (кодировка и разделитель по формату) или XLSX.
+    В CSV все поля в кавычках: иначе адреса с запятыми в файле с разделителем ';'
+    определитель формата (sniff_file) делит по запятой.
+    """
+    encoding, separator = FORMATS[file_format]
+    if encoding is not None:
+        with open(path, 'w', encoding=encoding, newline='') as f:
+            for number, chunk in enumerate(chunks):
+                chunk.to_csv(f, sep=separator, index=False, header=header and number == 0, quoting=csv.QUOTE_ALL)
+        return
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Лист1')
+    for number, chunk in enumerate(chunks):
+        if header and number == 0:
+            sheet.append(list(chunk.columns))
+        for row in chunk.astype(object).itertuples(index=False, name=None):
+            sheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+    workbook.save(path)
+
+def generate_dataset(directory, scale, file_format, seed=SEED):
+    """Создаёт в directory четыре файла под именами data_import.IMPORT_FILES. Возвращает число строк."""
+    rng = np.random.default_rng(seed)
+    sizes = dataset_sizes(scale)
+    as_datetime = file_format == 'xlsx'
+    makers = {
+        'users': lambda start, count: generate_users(count, rng),
+        'points': lambda start, count: generate_points(count, rng),
+        'products': lambda start, count: generate_products(start, count, rng),
+        'orders': lambda start, count: generate_orders(start, count, rng, sizes, as_datetime),
+    }
+    for key, (filename, _) in data_import.IMPORT_FILES.items():
+        if key in ('users', 'points'):
+            chunks = [makers[key](0, sizes[key])]  # Небольшие файлы - одним блоком
+        else:
+            chunks = _chunks(sizes[key], makers[key])
+        write_file(os.path.join(directory, filename), chunks, file_format, header=key != 'points')
+    return sizes
+
+# --- 2. ЗАМЕР ОДНОГО ИМПОРТА (в отдельном процессе) ---
+
+def peak_rss_mb():
+    """Пиковая память процесса и его дочерних процессов (пул разбора), МБ."""
+    if resource is None:
+        return None
+    # Linux отдаёт килобайты, macOS - байты
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return round(max(own, children) / (1024 * 1024), 1)
+
+def run_import(chunksize, workers):
+    """Импорт файлов текущей папки в новую базу по фазам. Возвращает замеры."""
+    phases = {}
+    db_config.remove_database(data_import.DATABASE)
+    started = time.perf_counter()
+    conn = db_config.configure(sqlite3.connect(data_import.DATABASE), 'bulk')
+    try:
+        phase_started = time.perf_counter()
+        data_import.create_tables(conn)
+        phases['schema'] = time.perf_counter() - phase_started
+
+        files = data_import.IMPORT_FILES
+        sources = {key: filename for key, (filename, _) in files.items()}
+        steps = {
+            'users': lambda parsed: data_import.import_roles_and_users(conn, files['users'][0], df=parsed.get('users')),
+            'points': lambda parsed: data_import.import_pickup_points(conn, files['points'][0], df=parsed.get('points')),
+            'products': lambda parsed: data_import.import_products(conn, files['products'][0], chunksize=chunksize,
+                                                                   blocks=parsed.get('products')),
+            'orders': lambda parsed: data_import.import_orders(conn, files['orders'][0], df=parsed.get('orders')),
+        }
+        succeeded = True
+        with data_import.ParsedSources(sources, workers=workers) as parsed:
+            for key in data_import.IMPORT_ORDER:
+                phase_started = time.perf_counter()
+                succeeded = steps[key](parsed) and succeeded
+                phases[key] = time.perf_counter() - phase_started
+        # Как в data_import.main: миграции после импорта
+        phase_started = time.perf_counter()
+        migrate(conn)
+        db_config.checkpoint(conn, 'TRUNCATE')
+        phases['migrate'] = time.perf_counter() - phase_started
+        total = time.perf_counter() - started
+        tables = {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                  for table in ('User', 'PickupPoint', 'Product', 'Order', 'OrderProduct')}
+    finally:
+        conn.close()
+    return {
+        'succeeded': succeeded,
+        'phases': {name: round(seconds, 4) for name, seconds in phases.items()},
+        'total_seconds': round(total, 4),
+        'table_rows': tables,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def run_worker(args):
+    """Режим --worker: замер в папке с файлами, результат - JSON в --output."""
+    output = os.path.abspath(args.output)  # Относительный путь - от папки запуска, а не от --worker
+    os.chdir(args.worker)
+    result = run_import(args.chunk_size or None, args.workers)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    return 0 if result['succeeded'] else 1
+
+# --- 3. СЕРИЯ ЗАМЕРОВ И ФАЙЛ РЕЗУЛЬТАТОВ ---
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'git_commit': commit or None,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def import_in_subprocess(directory, chunksize=data_import.CHUNK_SIZE, workers=data_import.DEFAULT_PARSE_WORKERS,
+                         verbose=False):
+    """
+    Импорт файлов папки directory в directory/demodb.db отдельным процессом
+    (используется и load_test.py для подготовки базы). Возвращает замеры run_import.
+    """
+    directory = os.path.abspath(directory)  # Процесс запускается из папки скрипта
+    output = os.path.join(directory, 'result.json')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', directory, '--output', output,
+               '--chunk-size', str(chunksize or 0), '--workers', str(workers)]
+    process = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                             stdout=None if verbose else subprocess.DEVNULL)
+    if not os.path.exists(output):
+        raise RuntimeError(f"импорт в {directory} завершился с кодом {process.returncode}")
+    with open(output, encoding='utf-8') as f:
+        return json.load(f)
+
+def bench_one(scale, file_format, chunksize, workers, work_dir=None, verbose=False):
+    """Генерация данных и импорт в отдельном процессе. Возвращает запись результата."""
+    with tempfile.TemporaryDirectory(prefix='bench_import_', dir=work_dir) as directory:
+        started = time.perf_counter()
+        sizes = generate_dataset(directory, scale, file_format)
+        generate_seconds = time.perf_counter() - started
+        result = import_in_subprocess(directory, chunksize, workers, verbose)
+
+    source_rows = sum(sizes.values())
+    phase_rows = {'users': sizes['users'], 'points': sizes['points'],
+                  'products': sizes['products'], 'orders': sizes['orders']}
+    result.update({
+        'scale': scale,
+        'format': file_format,
+        'chunk_size': chunksize,
+        'workers': workers,
+        'source_rows': sizes,
+        'generate_seconds': round(generate_seconds, 4),
+        'rows_per_second': round(source_rows / result['total_seconds']) if result['total_seconds'] else None,
+        'phase_rows_per_second': {name: round(phase_rows[name] / seconds) if seconds else None
+                                  for name, seconds in result['phases'].items() if name in phase_rows},
+    })
+    return result
+
+def table_rows_mismatches(runs):
+    """
+    Прогоны одного масштаба, у которых число строк в таблицах отличается от
+    других форматов: [(масштаб, {формат: table_rows})]. Такие замеры несравнимы.
+    """
+    by_scale = {}
+    for run in runs:
+        if run['succeeded']:
+            by_scale.setdefault(run['scale'], {})[run['format']] = run['table_rows']
+    return [(scale, formats) for scale, formats in by_scale.items()
+            if len({json.dumps(rows, sort_keys=True) for rows in formats.values()}) > 1]
+
+def append_results(results_file, runs):
+    """Дописывает прогоны в файл результатов ({"runs": [...]})."""
+    try:
+        with open(results_file, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {'runs': []}
+    data.setdefault('runs', []).extend(runs)
+    tmp_file = results_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, results_file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Замер скорости data_import на синтетических файлах.")
+    parser.add_argument('--scale', type=int, action='append',
+                        help=f"число товаров и заказов (можно несколько раз), по умолчанию {DEFAULT_SCALES[0]}")
+    parser.add_argument('--format', action='append', choices=tuple(FORMATS),
+                        help="формат файлов (можно несколько раз), по умолчанию все")
+    parser.add_argument('--chunk-size', type=int, default=data_import.CHUNK_SIZE,
+                        help="строк в блоке импорта товаров (0 - файл целиком)")
+    parser.add_argument('--workers', type=int, default=data_import.DEFAULT_PARSE_WORKERS,
+                        help="процессов для разбора файлов (1 - без пула)")
+    parser.add_argument('--results', default=DEFAULT_RESULTS_FILE, help="файл результатов JSON")
+    parser.add_argument('--work-dir', help="папка для временных файлов (по умолчанию системная)")
+    parser.add_argument('--label', default='', help="метка серии (например, номер версии)")
+    parser.add_argument('--verbose', action='store_true', help="показывать вывод data_import")
+    # Внутренний режим: один замер в подготовленной папке
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.worker:
+        return run_worker(args)
+
+    environment = environment_info()
+    started_at = datetime.datetime.now().isoformat(timespec='seconds')
+    runs = []
+    print(f"{'формат':<11} {'масштаб':>9} {'строк/с':>9} {'всего, с':>9} {'RSS, МБ':>8}  фазы, с")
+    for scale in args.scale or DEFAULT_SCALES:
+        for file_format in args.format or tuple(FORMATS):
+            result = bench_one(scale, file_format, args.chunk_size, args.workers, args.work_dir, args.verbose)
+            result.update(environment, started_at=started_at, label=args.label)
+            runs.append(result)
+            phases = ' '.join(f"{name}={seconds:.2f}" for name, seconds in result['phases'].items())
+            print(f"{file_format:<11} {scale:>9} {result['rows_per_second']:>9} {result['total_seconds']:>9.2f} "
+                  f"{result['peak_rss_mb'] or '-':>8}  {phases}")
+            if not result['succeeded']:
+                print("  ВНИМАНИЕ: импорт завершился с ошибкой, см. --verbose")
+    append_results(args.results, runs)
+    print(f"Результаты добавлены в {args.results}")
+    mismatches = table_rows_mismatches(runs)
+    for scale, formats in mismatches:
+        print(f"ОШИБКА: при масштабе {scale} форматы импортировали разное число строк:")
+        for file_format, rows in formats.items():
+            print(f"  {file_format}: {rows}")
+    return 0 if all(run['succeeded'] for run in runs) and not mismatches else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -1,10 +1,13 @@
-import sqlite3
+import db_config
 DATABASE = 'demodb.db'
 
-conn = sqlite3.connect(DATABASE)
+# Проверка читает снимок базы (реплику), а не рабочий файл: запросы
+# не мешают витрине. Снимок старше 5 минут обновляется перед проверкой.
+conn = db_config.open_replica(DATABASE)
 cursor = conn.cursor()
 
 print("=== ПРОВЕРКА БАЗЫ ДАННЫХ ===")
+print(f"Снимок: {db_config.replica_path(DATABASE)}")
 
 # Проверяем таблицы
 tables = ['User', 'Role', 'Product', 'Category', 'Supplier', 'Manufacturer', 'PickupPoint', 'Order', 'OrderStatus', 'OrderProduct']
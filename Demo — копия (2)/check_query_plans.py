@@ -0,0 +1,144 @@
+import itertools
+import sqlite3
+import sys
+
+import app
+import data_import
+import inventory
+import main_web
+from migrations import migrate
+
+# Проверка планов выполнения рабочих запросов (EXPLAIN QUERY PLAN).
+# Скрипт завершается с кодом 1, если запрос читает таблицу полным
+# сканированием (SCAN без индекса) и это не разрешено явно.
+#
+# Запуск: python check_query_plans.py
+
+SCHEMA_FILE = 'schema.sql'
+
+# --- 1. ТЕСТОВЫЕ БАЗЫ (пустые, только схема + миграции) ---
+
+def create_schema_sql_db():
+    """Схема из schema.sql (под неё написан app.py)."""
+    conn = sqlite3.connect(':memory:')
+    with open(SCHEMA_FILE, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    migrate(conn)
+    return conn
+
+def create_import_db():
+    """Схема, которую создаёт data_import.py (рабочая demodb.db)."""
+    conn = sqlite3.connect(':memory:')
+    data_import.create_tables(conn)
+    migrate(conn)
+    return conn
+
+SCHEMAS = {
+    'schema.sql': create_schema_sql_db,
+    'data_import': create_import_db,
+}
+ALL_SCHEMAS = tuple(SCHEMAS)
+
+# --- 2. РАБОЧИЕ ЗАПРОСЫ ---
+
+def production_queries():
+    """
+    Список (имя, sql, params, схемы, причина) всех рабочих запросов.
+    Причина (не None) разрешает полное сканирование - только для запросов,
+    которые по смыслу читают таблицу целиком.
+    """
+    queries = [
+        ('main_web: вход', main_web.LOGIN_QUERY, ('login', 'password'), ALL_SCHEMAS, None),
+        ('main_web: список категорий', main_web.CATEGORIES_QUERY, (), ALL_SCHEMAS, None),
+        ('app: вход', app.AUTH_QUERY, ('login', 'password'), ('schema.sql',), None),
+        ('app: товар по артикулу', app.PRODUCT_BY_ARTICLE_QUERY, ('A000',), ('schema.sql',), None),
+        ('app: заказ', app.ORDER_QUERY, (1,), ('schema.sql',), None),
+        ('app: состав заказа', app.ORDER_PRODUCTS_QUERY, (1,), ('schema.sql',), None),
+        ('app: список товаров для заказа', app.ALL_PRODUCTS_QUERY, (), ('schema.sql',),
+         'выпадающий список всех товаров'),
+        ('app: список заказов', *app.build_orders_query(), ('schema.sql',),
+         'первая страница: чтение сводки с конца по ключу, останавливается по LIMIT'),
+        ('app: список заказов, следующая страница', *app.build_orders_query(after=100), ('schema.sql',), None),
+        ('app: номер нового заказа', app.NEXT_ORDER_ID_QUERY, (), ALL_SCHEMAS, None),
+        ('app: версия заказа', app.ORDER_VERSION_QUERY, (1,), ALL_SCHEMAS, None),
+        ('app: запись шапки заказа', app.ORDER_UPDATE_SQL, ('ФИО', 1, '', '', 1, 1, 1, 0), ('schema.sql',), None),
+        ('app: изменение строки заказа', app.ORDER_LINE_UPDATE_SQL, (1, 1, 'A000'), ALL_SCHEMAS, None),
+        ('app: удаление строки заказа', app.ORDER_LINE_DELETE_SQL, (1, 'A000'), ALL_SCHEMAS, None),
+        ('app: запись карточки товара', app.PRODUCT_UPDATE_SQL, ('Товар', 1.0, 0, '', '', 1, 1, 1, 'A000'),
+         ('schema.sql',), None),
+        ('inventory: состав заказа', inventory.ORDER_LINES_QUERY, (1,), ALL_SCHEMAS, None),
+        ('inventory: списание остатка', inventory.RESERVE_SQL, (1, 'A000', 1), ALL_SCHEMAS, None),
+        ('inventory: возврат остатка', inventory.RELEASE_SQL, (1, 'A000'), ALL_SCHEMAS, None),
+        ('inventory: резерв заказа', inventory.RESERVED_QUERY, (1,), ALL_SCHEMAS, None),
+        ('inventory: статус заказа', inventory.ORDER_STATUS_QUERY, (1,), ALL_SCHEMAS, None),
+        ('inventory: журнал товара', inventory.LEDGER_BY_ARTICLE_QUERY, ('A000', 100), ALL_SCHEMAS, None),
+        ('inventory: журнал заказа', inventory.LEDGER_BY_ORDER_QUERY, (1,), ALL_SCHEMAS, None),
+    ]
+    for name, (table, sql) in app.REFERENCE_QUERIES.items():
+        queries.append((f'app: справочник {name}', sql, (), ('schema.sql',), 'справочник читается целиком'))
+
+    # Каталог main_web: все сочетания фильтров и сортировок, первая страница и переход по курсору
+    for role, search, category, discount, sort_by, after in itertools.product(
+            ('Гость', 'Администратор'), ('', 'ботинки'), ('all', 'Женская обувь'),
+            ('all', 'high', 'present'), ('Name', 'Price_asc', 'Price_desc', 'Discount', 'Relevance'),
+            (None, ('Ботинки', 'A000'))):
+        sql, params = main_web.build_catalog_query(role, search, category, discount, sort_by, after)
+        name = (f'main_web: каталог [{role}, search={search!r}, category={category}, discount={discount}, '
+                f'sort={sort_by}, after={after}]')
+        queries.append((name, sql, params, ALL_SCHEMAS, None))
+
+    # Каталог app.py
+    for role, category, sort_order, search, after in itertools.product(
+            ('Гость', 'Менеджер'), (None, 'Женская обувь'), ('ASC', 'DESC'), (None, 'ботинки'),
+            (None, ('Ботинки', 'A000'))):
+        sql, params = app.build_products_query(role, category, sort_order, search, after)
+        name = f'app: каталог [{role}, category={category}, sort={sort_order}, search={search!r}, after={after}]'
+        queries.append((name, sql, params, ('schema.sql',), None))
+
+    return queries
+
+# --- 3. ПРОВЕРКА ---
+
+def find_full_scans(plan):
+    """Строки плана с полным сканированием таблицы (без индекса). SCAN CONSTANT ROW - SELECT без FROM."""
+    return [detail for detail in plan
+            if detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail
+            and detail != 'SCAN CONSTANT ROW']
+
+def check_query_plans(verbose=False):
+    """Возвращает список найденных проблем (пустой - всё в порядке)."""
+    problems = []
+    connections = {name: factory() for name, factory in SCHEMAS.items()}
+    try:
+        for name, sql, params, schemas, scan_reason in production_queries():
+            for schema in schemas:
+                try:
+                    plan = [row[3] for row in connections[schema].execute('EXPLAIN QUERY PLAN ' + sql, params)]
+                except sqlite3.Error as e:
+                    problems.append(f'[{schema}] {name}: запрос не компилируется - {e}')
+                    continue
+                if verbose:
+                    print(f'[{schema}] {name}')
+                    for detail in plan:
+                        print(f'    {detail}')
+                scans = find_full_scans(plan)
+                if scans and scan_reason is None:
+                    problems.append(f'[{schema}] {name}: полное сканирование - {"; ".join(scans)}')
+    finally:
+        for conn in connections.values():
+            conn.close()
+    return problems
+
+def main():
+    print("=== ПРОВЕРКА ПЛАНОВ ЗАПРОСОВ ===")
+    problems = check_query_plans(verbose='-v' in sys.argv)
+    if problems:
+        print(f"\nНайдено проблем: {len(problems)}")
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+    print("Все рабочие запросы используют индексы.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,144 @@
+import functools
+from collections import namedtuple
+
+import pandas as pd
+
+# Описание столбцов файлов импорта: какой столбец таблицы ищется,
+# под какими заголовками он может прийти и как приводится его тип.
+# Заголовки файла сопоставляются один раз на файл (кэш по набору
+# заголовков), значения приводятся векторно - целым столбцом, без
+# обработки по ячейкам.
+
+# target - имя столбца после сопоставления, aliases - возможные заголовки
+# в порядке приоритета, converter - ключ CONVERTERS
+ColumnSpec = namedtuple('ColumnSpec', 'target aliases converter')
+# columns - пары (заголовок файла, ColumnSpec), missing - ненайденные столбцы
+ColumnMapping = namedtuple('ColumnMapping', 'columns missing')
+
+# --- 1. ПРЕОБРАЗОВАТЕЛИ СТОЛБЦОВ ---
+
+THOUSANDS_SEPARATORS = '[ \u00a0\u202f]'
+
+def clean_text(series):
+    """Векторный аналог normalize_text(str(value)): пропуски -> '', пробелы по краям убираются."""
+    return series.fillna('').astype(str).str.strip()
+
+def to_float(series):
+    """Векторный safe_float: '1 234,5' -> 1234.5, нечисловое -> 0.0."""
+    # Разделители тысяч: пробел, неразрывный и узкий неразрывный пробел
+    text = clean_text(series).str.replace(THOUSANDS_SEPARATORS, '', regex=True).str.replace(',', '.', regex=False)
+    return pd.to_numeric(text, errors='coerce').fillna(0.0).astype(float)
+
+def to_int(series):
+    """Векторный safe_int: дробная часть отбрасывается, нечисловое -> 0."""
+    return to_float(series).astype('int64')
+
+def to_int_or_na(series):
+    """Целые числа (Int64); нечисловое и дробное -> <NA>, чтобы отбраковать строку."""
+    numbers = pd.to_numeric(clean_text(series), errors='coerce')
+    return numbers.where(numbers % 1 == 0).astype('Int64')
+
+def clean_date(series):
+    """Даты как в str(значение): из XLSX приходят datetime, из CSV - строки."""
+    if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ('datetime', 'datetime64'):
+        series = pd.to_datetime(series)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+    if series.dtype == object:
+        # Смесь дат и строк - редкий случай, только он обрабатывается по ячейкам
+        return series.map(lambda value: '' if pd.isna(value) else str(value).strip())
+    return clean_text(series)
+
+def clean_address(series):
+    """Адрес пункта выдачи: как clean_text, плюс кавычки по краям."""
+    return clean_text(series).str.strip('"\'')
+
+CONVERTERS = {
+    'text': clean_text,
+    'float': to_float,
+    'int': to_int,
+    'int_or_na': to_int_or_na,
+    'date': clean_date,
+    'address': clean_address,
+}
+
+# --- 2. СТОЛБЦЫ ФАЙЛОВ ИМПОРТА ---
+
+IMPORT_MAPPINGS = {
+    'users': (
+        ColumnSpec('RoleName', ('Роль сотрудника', 'Роль', 'Role'), 'text'),
+        ColumnSpec('FullName', ('ФИО', 'ФИО сотрудника', 'FullName', 'Name'), 'text'),
+        ColumnSpec('Login', ('Логин', 'Login', 'UserLogin'), 'text'),
+        ColumnSpec('Password', ('Пароль', 'Password', 'UserPassword'), 'text'),
+    ),
+    # Столбцы таблицы Product и названия справочников
+    'products': (
+        ColumnSpec('ProductArticle', ('Артикул', 'ProductArticle'), 'text'),
+        ColumnSpec('Name', ('Наименование товара', 'Наименование', 'ProductName'), 'text'),
+        ColumnSpec('Unit', ('Единица измерения', 'Unit'), 'text'),
+        ColumnSpec('Price', ('Цена', 'Price'), 'float'),
+        ColumnSpec('Discount', ('Действующая скидка', 'Скидка', 'Discount'), 'int'),
+        ColumnSpec('Quantity', ('Кол-во на складе', 'Количество на складе', 'Quantity'), 'int'),
+        ColumnSpec('Description', ('Описание товара', 'Описание', 'Description'), 'text'),
+        ColumnSpec('Photo', ('Фото', 'Photo'), 'text'),
+        ColumnSpec('CategoryName', ('Категория товара', 'Категория', 'Category'), 'text'),
+        ColumnSpec('SupplierName', ('Поставщик', 'Supplier'), 'text'),
+        ColumnSpec('ManufacturerName', ('Производитель', 'Manufacturer'), 'text'),
+    ),
+    # Номер заказа и пункт выдачи остаются текстом: для файла отбраковки
+    # нужно исходное значение, в числа их переводит prepare_orders
+    'orders': (
+        ColumnSpec('OrderID', ('Номер заказа', 'OrderID'), 'text'),
+        ColumnSpec('Articles', ('Артикул заказа', 'Состав заказа'), 'text'),
+        ColumnSpec('OrderDate', ('Дата заказа', 'OrderDate'), 'date'),
+        ColumnSpec('DeliveryDate', ('Дата доставки', 'DeliveryDate'), 'date'),
+        ColumnSpec('PointID', ('Адрес пункта выдачи', 'Пункт выдачи', 'PointID'), 'text'),  # В файле это уже PointID
+        ColumnSpec('FullName', ('ФИО авторизированного клиента', 'ФИО клиента', 'ФИО'), 'text'),
+        ColumnSpec('PickupCode', ('Код для получения', 'PickupCode'), 'text'),
+        ColumnSpec('StatusName', ('Статус заказа', 'Статус', 'Status'), 'text'),
+    ),
+    # Файл пунктов выдачи без заголовка (header=None): столбцы называются
+    # номерами, адреса собираются в столбец 0 (см. import_pickup_points)
+    'points': (
+        ColumnSpec('Address', ('0', 'Адрес пункта выдачи', 'Адрес', 'Address'), 'address'),
+    ),
+}
+
+# --- 3. СОПОСТАВЛЕНИЕ ЗАГОЛОВКОВ ---
+
+def normalize_header(name):
+    """Заголовки сравниваются без учёта регистра и лишних пробелов."""
+    return ' '.join(str(name).split()).casefold()
+
+@functools.lru_cache(maxsize=64)
+def resolve_columns(source, header):
+    """
+    Сопоставляет заголовки файла (кортеж) со столбцами IMPORT_MAPPINGS[source].
+    Кэшируется по набору заголовков: блоки одного файла и повторные
+    импорты файлов той же структуры не сопоставляются заново.
+    """
+    by_name = {}
+    for column in header:
+        by_name.setdefault(normalize_header(column), column)
+    columns = []
+    missing = []
+    for spec in IMPORT_MAPPINGS[source]:
+        found = next((by_name[normalize_header(alias)] for alias in spec.aliases
+                      if normalize_header(alias) in by_name), None)
+        if found is None:
+            missing.append(spec.aliases[0])
+        else:
+            columns.append((found, spec))
+    return ColumnMapping(tuple(columns), tuple(missing))
+
+def map_columns(source, df):
+    """
+    Столбцы df под именами IMPORT_MAPPINGS[source] с приведёнными типами.
+    Возвращает (DataFrame с тем же индексом, список ненайденных столбцов).
+    """
+    mapping = resolve_columns(source, tuple(df.columns))
+    if mapping.missing:
+        return None, list(mapping.missing)
+    frame = pd.DataFrame({spec.target: CONVERTERS[spec.converter](df[column])
+                          for column, spec in mapping.columns}, index=df.index)
+    return frame, []
\ No newline at end of file
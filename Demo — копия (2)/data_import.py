@@ -1,6 +1,20 @@
+import argparse
+import csv
+import hashlib
+import os
 import sqlite3
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import openpyxl
 import pandas as pd
-import os
+
+import db_config
+from column_mapping import IMPORT_MAPPINGS, map_columns, to_int_or_na
+from migrations import migrate
+from thumbnails import generate_for_photos
 
 # --- 1. КОНСТАНТЫ И ФАЙЛЫ ---
 DATABASE = 'demodb.db'
@@ -34,353 +48,646 @@ def create_tables(db):
     cursor.execute("CREATE TABLE IF NOT EXISTS \"Order\" (OrderID INTEGER PRIMARY KEY, OrderDate DATE, DeliveryDate DATE, PickupCode TEXT, UserID INTEGER, PointID INTEGER, StatusID INTEGER, FOREIGN KEY (UserID) REFERENCES User(UserID), FOREIGN KEY (PointID) REFERENCES PickupPoint(PointID), FOREIGN KEY (StatusID) REFERENCES OrderStatus(StatusID))")
     cursor.execute("CREATE TABLE IF NOT EXISTS OrderProduct (OrderProductID INTEGER PRIMARY KEY AUTOINCREMENT, OrderID INTEGER, ProductArticle TEXT, Quantity INTEGER, FOREIGN KEY (OrderID) REFERENCES \"Order\"(OrderID), FOREIGN KEY (ProductArticle) REFERENCES Product(ProductArticle))")
     
+    # Служебные таблицы инкрементальной синхронизации (sync):
+    # отпечатки импортированных файлов и хэши содержимого строк
+    cursor.execute("CREATE TABLE IF NOT EXISTS ImportFile (FileName TEXT PRIMARY KEY, Fingerprint TEXT NOT NULL, ImportedAt TEXT NOT NULL)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS ImportRow (Source TEXT NOT NULL, RowKey TEXT NOT NULL, RowHash INTEGER NOT NULL, PRIMARY KEY (Source, RowKey)) WITHOUT ROWID")
+    
     db.commit()
 
+@contextmanager
+def import_transaction(db):
+    """
+    Транзакция одного шага импорта. Внутри уже открытой транзакции (sync)
+    шаг выполняется в точке сохранения: ошибка откатывает только его,
+    а фиксирует всё вызывающий код.
+    """
+    if not db.in_transaction:
+        with db:
+            yield db
+        return
+    db.execute("SAVEPOINT import_step")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK TO import_step")
+        db.execute("RELEASE import_step")
+        raise
+    db.execute("RELEASE import_step")
+
+FINGERPRINT_BLOCK_SIZE = 1024 * 1024
+
+def file_fingerprint(file_path):
+    """Хэш содержимого файла (читается блоками) - по нему sync пропускает неизменённые файлы."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(FINGERPRINT_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stored_fingerprint(db, file_path):
+    row = db.execute("SELECT Fingerprint FROM ImportFile WHERE FileName=?", (file_path,)).fetchone()
+    return row[0] if row else None
+
+def record_fingerprint(db, file_path, fingerprint):
+    db.execute("""
+        INSERT INTO ImportFile (FileName, Fingerprint, ImportedAt) VALUES (?, ?, datetime('now'))
+        ON CONFLICT(FileName) DO UPDATE SET Fingerprint=excluded.Fingerprint, ImportedAt=excluded.ImportedAt
+    """, (file_path, fingerprint))
+
 # --- 3. ФУНКЦИИ ИМПОРТА ДАННЫХ ---
 
-def read_file_safe(file_path, header=0):
+CHUNK_SIZE = 50000           # Строк в одном блоке при потоковом импорте
+SNIFF_SAMPLE_SIZE = 64 * 1024  # Сколько байт начала файла смотреть для определения формата
+CSV_ENCODINGS = ('utf-8-sig', 'cp1251')
+CSV_SEPARATORS = ',;\t'
+XLSX_SIGNATURE = b'PK\x03\x04'  # Файлы *.xlsx - CSV-имена у них условные
+
+def sniff_file(file_path):
     """
-    Умная функция для чтения файлов - пробует разные форматы
+    Определяет формат по началу файла (один раз, без разбора всего файла).
+    Возвращает ('xlsx', None, None) или ('csv', кодировка, разделитель).
     """
-    # Сначала пробуем как Excel
+    with open(file_path, 'rb') as f:
+        sample = f.read(SNIFF_SAMPLE_SIZE)
+    if sample.startswith(XLSX_SIGNATURE):
+        return 'xlsx', None, None
+
+    # Образец обрезается по последнему переводу строки, чтобы не разрезать символ
+    if len(sample) == SNIFF_SAMPLE_SIZE and b'\n' in sample:
+        sample = sample[:sample.rindex(b'\n')]
+    for encoding in CSV_ENCODINGS:
+        try:
+            text = sample.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError(f"неизвестная кодировка (пробовали {', '.join(CSV_ENCODINGS)})")
     try:
-        print(f"Попытка чтения {file_path} как Excel...")
-        df = pd.read_excel(file_path, header=header, engine='openpyxl')
-        if not df.empty:
-            print(f"Успешно прочитано как Excel. Колонок: {len(df.columns)}")
-            return df
-    except Exception as e:
-        print(f"Не удалось прочитать как Excel: {e}")
-    
-    # Если не получилось, пробуем как CSV с разными кодировками и разделителями
-    encodings = ['utf-8-sig', 'cp1251', 'utf-8']
-    separators = [',', ';', '\t']
-    
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                print(f"Попытка чтения {file_path} как CSV (enc={encoding}, sep={repr(sep)})...")
-                df = pd.read_csv(file_path, encoding=encoding, sep=sep, header=header, engine='python')
-                if not df.empty and len(df.columns) > 1:
-                    print(f"Успешно прочитано как CSV. Колонок: {len(df.columns)}")
-                    return df
-            except Exception as e:
-                continue
-    
-    print(f"Не удалось прочитать файл {file_path} ни одним способом")
-    return None
+        separator = csv.Sniffer().sniff(text, delimiters=CSV_SEPARATORS).delimiter
+    except csv.Error:
+        separator = ','
+    return 'csv', encoding, separator
+
+def _iter_xlsx_chunks(file_path, header, chunksize):
+    """Блоки DataFrame из первого листа XLSX (openpyxl read_only - лист не грузится целиком)."""
+    # Открываем как файловый объект: openpyxl отказывается от имён с расширением .csv
+    stream = open(file_path, 'rb')
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        columns = None
+        if header is not None:
+            columns = [str(value).strip() if value is not None else f'Unnamed: {i}'
+                       for i, value in enumerate(next(rows, ()))]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue  # Пустые строки в конце листа
+            batch.append(row)
+            if chunksize and len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch or columns:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+        stream.close()
+
+def iter_file_chunks(file_path, header=0, chunksize=CHUNK_SIZE):
+    """
+    Читает файл блоками по chunksize строк (None - одним блоком).
+    Память ограничена размером блока, а не файла. Все значения CSV - строки.
+    """
+    file_format, encoding, separator = sniff_file(file_path)
+    print(f"Чтение {file_path}: {file_format}" + (f" (enc={encoding}, sep={separator!r})" if encoding else ""))
+    if file_format == 'xlsx':
+        yield from _iter_xlsx_chunks(file_path, header, chunksize)
+        return
+    reader = pd.read_csv(file_path, encoding=encoding, sep=separator, header=header, dtype=str,
+                         engine='c', chunksize=chunksize)
+    if chunksize is None:
+        yield reader
+        return
+    with reader:
+        yield from reader
 
-def import_roles_and_users(db, file_path):
-    """Импортирует роли и пользователей."""
-    df = read_file_safe(file_path)
+def read_file_safe(file_path, header=0):
+    """Читает файл целиком (формат определяется по началу файла). None при ошибке."""
+    try:
+        chunks = list(iter_file_chunks(file_path, header=header, chunksize=None))
+    except (OSError, ValueError, csv.Error, zipfile.BadZipFile, pd.errors.ParserError) as e:
+        print(f"Не удалось прочитать файл {file_path}: {e}")
+        return None
+    return chunks[0] if chunks else None
+
+def import_roles_and_users(db, file_path, incremental=False, df=None):
+    """
+    Импортирует роли и пользователей. incremental - существующие логины
+    обновляются (ФИО, пароль, роль), а не пропускаются. df - уже прочитанный
+    файл (parse_source). Возвращает True при успехе.
+    """
+    if df is None:
+        df = read_file_safe(file_path)
     if df is None or df.empty:
         print(f"Не удалось загрузить данные из {file_path}")
-        return
-    
-    # Пробуем разные варианты названий столбцов
-    possible_role_columns = ['Роль сотрудника', 'Роль', 'Role']
-    possible_name_columns = ['ФИО', 'ФИО сотрудника', 'FullName', 'Name']
-    possible_login_columns = ['Логин', 'Login', 'UserLogin']
-    possible_password_columns = ['Пароль', 'Password', 'UserPassword']
-    
-    # Находим правильные названия столбцов
-    role_col = None
-    name_col = None
-    login_col = None
-    password_col = None
-    
-    for col in possible_role_columns:
-        if col in df.columns:
-            role_col = col
-            break
+        return False
     
-    for col in possible_name_columns:
-        if col in df.columns:
-            name_col = col
-            break
-            
-    for col in possible_login_columns:
-        if col in df.columns:
-            login_col = col
-            break
-            
-    for col in possible_password_columns:
-        if col in df.columns:
-            password_col = col
-            break
-    
-    if not all([role_col, name_col, login_col, password_col]):
-        print(f"Не все необходимые колонки найдены в файле {file_path}")
+    # Столбцы ищутся по описанию column_mapping.IMPORT_MAPPINGS['users']
+    users, missing = map_columns('users', df)
+    if missing:
+        print(f"Не все необходимые колонки найдены в файле {file_path}: {missing}")
         print(f"Доступные колонки: {list(df.columns)}")
-        return
+        return False
     
-    cursor = db.cursor()
+    insert_user = """
+        INSERT OR IGNORE INTO User (FullName, Login, Password, RoleID) 
+        VALUES (?, ?, ?, ?)
+    """
+    if incremental:
+        insert_user = """
+            INSERT INTO User (FullName, Login, Password, RoleID) VALUES (?, ?, ?, ?)
+            ON CONFLICT(Login) DO UPDATE SET FullName=excluded.FullName, Password=excluded.Password,
+                RoleID=excluded.RoleID
+            WHERE (FullName, Password, RoleID) IS NOT (excluded.FullName, excluded.Password, excluded.RoleID)
+        """
     
     try:
-        # 1. Заполнение таблицы Role
-        roles = df[role_col].astype(str).str.strip().unique()
-        for role in roles:
-            if role and role != 'nan': 
-                cursor.execute("INSERT OR IGNORE INTO Role (RoleName) VALUES (?)", (role,))
-        db.commit()
-        
-        # Кэширование RoleID
-        role_map = {}
-        for name in roles:
-            if name and name != 'nan':
-                result = cursor.execute("SELECT RoleID FROM Role WHERE RoleName=?", (name,)).fetchone()
-                if result:
-                    role_map[name] = result[0]
+        with import_transaction(db):
+            # 1. Заполнение таблицы Role и подстановка RoleID
+            users = users[users['RoleName'] != '']
+            users = resolve_lookup_ids(db, users, 'Role', 'RoleName', 'RoleID')
         
-        # 2. Заполнение таблицы User
-        inserted_count = 0
-        for index, row in df.iterrows():
-            role_name = str(row[role_col]).strip()
-            if not role_name or role_name == 'nan':
-                continue
-                
-            user_data = (
-                str(row[name_col]).strip(),
-                str(row[login_col]).strip(),
-                str(row[password_col]).strip(),
-                role_map.get(role_name)
-            )
-            
-            # Проверяем, что все данные есть
-            if all(user_data[:3]):  # Проверяем ФИО, Логин, Пароль
-                cursor.execute("""
-                    INSERT OR IGNORE INTO User (FullName, Login, Password, RoleID) 
-                    VALUES (?, ?, ?, ?)
-                """, user_data)
-                inserted_count += cursor.rowcount
-            
-        db.commit()
+            # 2. Заполнение таблицы User: только строки с ФИО, логином и паролем
+            complete = (users[['FullName', 'Login', 'Password']] != '').all(axis=1)
+            rows = users.loc[complete, ['FullName', 'Login', 'Password', 'RoleID']].astype(object)
+            cursor = db.executemany(insert_user, rows.itertuples(index=False, name=None))
+            inserted_count = cursor.rowcount
         print(f"Импорт пользователей из {file_path} успешен. Вставлено {inserted_count} записей.")
+        return True
     except Exception as e:
         print(f"Ошибка при импорте пользователей: {e}")
-        db.rollback()
+        return False
 
-def import_pickup_points(db, file_path):
-    """Импортирует пункты выдачи."""
-    df = read_file_safe(file_path, header=None)
+def import_pickup_points(db, file_path, df=None):
+    """Импортирует пункты выдачи (df - уже прочитанный файл). Возвращает True при успехе."""
+    if df is None:
+        df = read_file_safe(file_path, header=None)
     if df is None or df.empty:
         print(f"Не удалось загрузить данные из {file_path}")
-        return
+        return False
 
-    cursor = db.cursor()
-    inserted_count = 0
+    # Адрес может быть в любом из первых трёх столбцов: они идут подряд
+    # одним столбцом и приводятся по column_mapping.IMPORT_MAPPINGS['points']
+    addresses = pd.concat([df[column] for column in df.columns[:3]], ignore_index=True)
+    points, missing = map_columns('points', pd.DataFrame({'0': addresses}))
+    if missing:
+        print(f"Не все необходимые колонки найдены в файле {file_path}: {missing}")
+        return False
+    addresses = points['Address']
+    addresses = addresses[(addresses.str.len() > 3) & (addresses != 'nan')].drop_duplicates()
     
     try:
-        # Пробуем разные столбцы для адреса
-        for col_index in range(min(3, len(df.columns))):
-            for index, row in df.iterrows():
-                address = str(row[col_index]).strip().strip('"').strip("'")
-                if address and address != 'nan' and len(address) > 3:
-                    cursor.execute("INSERT OR IGNORE INTO PickupPoint (Address) VALUES (?)", (address,))
-                    inserted_count += cursor.rowcount
-        
-        db.commit()
+        with import_transaction(db):
+            cursor = db.executemany("INSERT OR IGNORE INTO PickupPoint (Address) VALUES (?)",
+                                    ((address,) for address in addresses))
+            inserted_count = cursor.rowcount
         print(f"Импорт пунктов выдачи из {file_path} успешен. Вставлено {inserted_count} записей.")
+        return True
     except Exception as e:
         print(f"Ошибка при импорте пунктов выдачи: {e}")
-        db.rollback()
+        return False
 
-def import_products(db, file_path):
-    """Импортирует товары, категории, поставщиков и производителей."""
-    df = read_file_safe(file_path)
-    if df is None or df.empty:
-        print(f"Не удалось загрузить данные из {file_path}")
-        return
-    
-    inserted_rows = 0
-    total_rows = 0
-    
-    # --- Вспомогательные функции для безопасного импорта ---
-    def get_or_create_id(table_name, name_column, name_value, cache_map, cursor, db):
-        if not name_value: return None
-        name_value = name_value.strip()
-        if not name_value: return None
-        if name_value not in cache_map:
-            cursor.execute(f"INSERT OR IGNORE INTO {table_name} ({name_column}) VALUES (?)", (name_value,))
-            db.commit() 
-            id_val = cursor.execute(f"SELECT {table_name}ID FROM {table_name} WHERE {name_column}=?", (name_value,)).fetchone()
-            if id_val:
-                cache_map[name_value] = id_val[0]
-                return id_val[0]
-            return None
-        return cache_map[name_value]
+# Справочники товара: (таблица, столбец названия, столбец ID)
+PRODUCT_LOOKUPS = (
+    ('Category', 'CategoryName', 'CategoryID'),
+    ('Supplier', 'SupplierName', 'SupplierID'),
+    ('Manufacturer', 'ManufacturerName', 'ManufacturerID'),
+)
+PRODUCT_INSERT_COLUMNS = ('ProductArticle', 'Name', 'Unit', 'Price', 'Discount', 'Quantity',
+                          'Description', 'Photo', 'CategoryID', 'SupplierID', 'ManufacturerID')
 
-    def safe_float(val):
-        try:
-            return float(str(val).replace(',', '.').strip())
-        except ValueError:
-            return 0.0
+def prepare_products(df):
+    """
+    Приводит таблицу товаров из файла к столбцам Product (без обращения к БД).
+    Возвращает (DataFrame, список отсутствующих в файле столбцов).
+    """
+    products, missing = map_columns('products', df)
+    if missing:
+        return None, missing
+    # Без артикула или связи со справочником товар не вставляется
+    required = ['ProductArticle', 'CategoryName', 'SupplierName', 'ManufacturerName']
+    return products[(products[required] != '').all(axis=1)], []
 
-    def safe_int(val):
-        try:
-            return int(safe_float(val))
-        except (ValueError, TypeError):
-            return 0
-    # --- Конец вспомогательных функций ---
-
-    # Подготовка словарей для кэширования ID
-    category_map = {}
-    supplier_map = {}
-    manufacturer_map = {}
-    
-    try:
-        cursor = db.cursor()
-        
-        for index, row in df.iterrows():
-            total_rows += 1
-            
-            # 1. Получение связанных ID 
-            try:
-                category_name = str(row['Категория товара']).strip()
-                supplier_name = str(row['Поставщик']).strip()
-                manufacturer_name = str(row['Производитель']).strip()
-                
-                category_id = get_or_create_id('Category', 'CategoryName', category_name, category_map, cursor, db)
-                supplier_id = get_or_create_id('Supplier', 'SupplierName', supplier_name, supplier_map, cursor, db)
-                manufacturer_id = get_or_create_id('Manufacturer', 'ManufacturerName', manufacturer_name, manufacturer_map, cursor, db)
-            except KeyError as e:
-                print(f"Ошибка ключа: {e}. Пропускаем строку {index}.")
-                continue
-            
-            # Пропускаем, если не удалось установить связь
-            if not all([category_id, supplier_id, manufacturer_id]):
-                print(f"Не удалось получить ID для категории, поставщика или производителя в строке {index}. Пропускаем.")
-                continue
+def resolve_lookup_ids(db, frame, table, name_column, id_column):
+    """
+    Добавляет в frame столбец id_column: недостающие названия справочника
+    вставляются одним executemany, ID подтягиваются слиянием (merge).
+    """
+    names = frame[name_column].drop_duplicates()
+    db.executemany(f"INSERT OR IGNORE INTO {table} ({name_column}) VALUES (?)",
+                   ((name,) for name in names))
+    ids = pd.DataFrame(db.execute(f"SELECT {name_column}, {id_column} FROM {table}").fetchall(),
+                       columns=[name_column, id_column])
+    return frame.merge(ids, on=name_column, how='left')
 
-            # 2. Очистка и преобразование данных товара
-            try:
-                article = str(row['Артикул']).strip()
-                
-                price = safe_float(row['Цена'])
-                discount = safe_int(row['Действующая скидка'])
-                quantity = safe_int(row['Кол-во на складе'])
-
-                product_data = (
-                    article, 
-                    str(row['Наименование товара']).strip(), 
-                    str(row['Единица измерения']).strip(), 
-                    price, 
-                    discount, 
-                    quantity, 
-                    str(row['Описание товара']).strip(), 
-                    str(row['Фото']).strip(),
-                    category_id, supplier_id, manufacturer_id
-                )
-            except KeyError as e:
-                print(f"Ошибка ключа в данных товара: {e}. Пропускаем строку {index}.")
-                continue
+PRODUCT_SOURCE = 'products'  # Source в ImportRow
+
+# Подготовленный блок файла товаров: rows - строк в блоке файла, products - результат
+# prepare_products, missing/columns - отсутствующие и имеющиеся колонки
+ProductBlock = namedtuple('ProductBlock', 'rows products missing columns')
+
+def parse_products(file_path, chunksize=CHUNK_SIZE):
+    """Читает и подготавливает файл товаров блоками, без обращения к БД."""
+    for chunk in iter_file_chunks(file_path, chunksize=chunksize):
+        products, missing = prepare_products(chunk)
+        yield ProductBlock(len(chunk), products, missing, list(chunk.columns))
+        if missing:
+            return
 
-            # 3. Вставка товара
-            cursor.execute("""
-                INSERT OR IGNORE INTO Product (
-                    ProductArticle, Name, Unit, Price, Discount, Quantity, 
-                    Description, Photo, CategoryID, SupplierID, ManufacturerID
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, product_data)
-            
-            inserted_rows += 1
-            
-        db.commit()
-        print(f"Импорт товаров из {file_path} успешен. Вставлено {inserted_rows}/{total_rows} строк.")
+def row_hashes(frame):
+    """Хэш содержимого каждой строки (int64) - для поиска изменённых строк при sync."""
+    hashes = pd.util.hash_pandas_object(frame, index=False)
+    return pd.Series(hashes.to_numpy().view('int64'), index=frame.index)
+
+def load_row_hashes(db, source):
+    return dict(db.execute("SELECT RowKey, RowHash FROM ImportRow WHERE Source=?", (source,)).fetchall())
+
+def save_row_hashes(db, source, keys, hashes):
+    db.executemany("""
+        INSERT INTO ImportRow (Source, RowKey, RowHash) VALUES (?, ?, ?)
+        ON CONFLICT(Source, RowKey) DO UPDATE SET RowHash=excluded.RowHash
+    """, ((source, key, int(value)) for key, value in zip(keys, hashes)))
+
+def delete_row_hashes(db, source, keys):
+    db.executemany("DELETE FROM ImportRow WHERE Source=? AND RowKey=?", ((source, key) for key in keys))
+
+def retire_products(db, articles):
+    """
+    Убирает исчезнувшие из файла импортированные товары. Товар, на который
+    ссылаются строки заказов, не удаляется (история заказов сохраняется):
+    его остаток обнуляется, а хэш удаляется - при следующих синхронизациях он
+    считается добавленным не импортом. Возвращает (удалённые, оставленные).
+    """
+    removed, retired = [], []
+    for article in articles:
+        referenced = db.execute("SELECT 1 FROM OrderProduct WHERE ProductArticle=? LIMIT 1", (article,)).fetchone()
+        (retired if referenced else removed).append(article)
+    db.executemany("DELETE FROM Product WHERE ProductArticle=?", ((article,) for article in removed))
+    db.executemany("UPDATE Product SET Quantity=0 WHERE ProductArticle=?", ((article,) for article in retired))
+    delete_row_hashes(db, PRODUCT_SOURCE, removed + retired)
+    return removed, retired
+
+def write_products(db, products, upsert=False):
+    """
+    Записывает подготовленные товары (prepare_products). Возвращает число записанных строк.
+    upsert - существующие артикулы обновляются (ON CONFLICT DO UPDATE), иначе пропускаются.
+    """
+    for table, name_column, id_column in PRODUCT_LOOKUPS:
+        products = resolve_lookup_ids(db, products, table, name_column, id_column)
+    rows = products[list(PRODUCT_INSERT_COLUMNS)].astype(object).itertuples(index=False, name=None)
+    if upsert:
+        updates = ', '.join(f"{column}=excluded.{column}" for column in PRODUCT_INSERT_COLUMNS[1:])
+        conflict = f"ON CONFLICT(ProductArticle) DO UPDATE SET {updates}"
+        verb = "INSERT"
+    else:
+        conflict = ""
+        verb = "INSERT OR IGNORE"
+    cursor = db.executemany(f"""
+        {verb} INTO Product ({', '.join(PRODUCT_INSERT_COLUMNS)})
+        VALUES ({', '.join('?' * len(PRODUCT_INSERT_COLUMNS))})
+        {conflict}
+    """, rows)
+    return cursor.rowcount
+
+def import_products(db, file_path, chunksize=CHUNK_SIZE, incremental=False, blocks=None):
+    """
+    Импортирует товары, категории, поставщиков и производителей.
+    Файл читается и записывается блоками по chunksize строк в одной транзакции.
+    incremental - записываются только новые и изменённые строки (по хэшу
+    содержимого); импортированные ранее товары, которых больше нет в файле,
+    удаляются (см. retire_products). Товары, добавленные не импортом, не трогаются.
+    blocks - уже подготовленные блоки (parse_products). Возвращает True при успехе.
+    """
+    if blocks is None:
+        blocks = parse_products(file_path, chunksize=chunksize)
+    total_rows = written_rows = skipped = 0
+    removed, retired = [], []
+    try:
+        # Справочники и товары - одна транзакция (одна запись на диск вместо тысяч)
+        with import_transaction(db):
+            stored = {}
+            if incremental:
+                # Кандидаты на удаление - только импортированные товары (есть хэш в ImportRow).
+                # Товар без хэша (добавлен в app.py) при совпадении артикула с файлом
+                # считается изменённым и обновляется
+                stored = load_row_hashes(db, PRODUCT_SOURCE)
+            seen = set()
+            for block in blocks:
+                if block.missing:
+                    print(f"В файле {file_path} нет колонок: {block.missing}. Доступные колонки: {block.columns}")
+                    return False
+                products = block.products
+                total_rows += block.rows
+                skipped += block.rows - len(products)
+                # Повтор артикула (в том числе из прошлых блоков) игнорируется, как в INSERT OR IGNORE
+                products = products.drop_duplicates('ProductArticle')
+                products = products[~products['ProductArticle'].isin(seen)]
+                seen.update(products['ProductArticle'])
+                hashes = row_hashes(products)
+                if incremental:
+                    # Сравнение в Python: map() со значениями None привёл бы хэши к float
+                    changed = [stored.get(article) != value
+                               for article, value in zip(products['ProductArticle'], hashes.tolist())]
+                    products, hashes = products[changed], hashes[changed]
+                written_rows += write_products(db, products, upsert=incremental)
+                save_row_hashes(db, PRODUCT_SOURCE, products['ProductArticle'], hashes)
+            if incremental and total_rows:
+                removed, retired = retire_products(db, [article for article in stored if article not in seen])
+        if total_rows == 0:
+            print(f"Не удалось загрузить данные из {file_path}")
+            return False
+        if skipped:
+            print(f"Пропущено строк без артикула, категории, поставщика или производителя: {skipped}")
+        if incremental:
+            print(f"Синхронизация товаров из {file_path}: изменено {written_rows}, удалено {len(removed)} из {total_rows} строк.")
+            if retired:
+                print(f"Товары есть в заказах и оставлены, сняты с продажи (остаток 0): {len(retired)} "
+                      f"({', '.join(retired[:10])}{'...' if len(retired) > 10 else ''})")
+        else:
+            print(f"Импорт товаров из {file_path} успешен. Вставлено {written_rows}/{total_rows} строк.")
+
+        # Миниатюры фото для каталога (уже созданные не пересоздаются)
+        photos = [row[0] for row in db.execute("SELECT DISTINCT Photo FROM Product")]
+        print(f"Миниатюры фото: {generate_for_photos(photos)} изображений.")
+        return True
         
     except Exception as e:
         print(f"Ошибка при импорте товаров: {e}")
-        db.rollback()
+        return False
+
+# Столбцы файла заказов (column_mapping) - по ним считается хэш строки для sync
+ORDER_COLUMNS = tuple(spec.target for spec in IMPORT_MAPPINGS['orders'])
+ORDER_INSERT_COLUMNS = ('OrderID', 'OrderDate', 'DeliveryDate', 'PickupCode', 'UserID', 'PointID', 'StatusID')
+ORDER_SOURCE = 'orders'  # Source в ImportRow
+REJECTS_SUFFIX = '.rejects.csv'  # Отбракованные строки: <файл заказов>.rejects.csv
+REJECT_COLUMNS = ['Строка файла', 'Номер заказа', 'Причина', 'Значение']
+QUANTITY_PATTERN = r'^[+-]?\d+$'
+
+def make_rejects(frame, reason, value_column):
+    rejects = pd.DataFrame({
+        'Строка файла': frame['Row'] + 2,  # 1 - заголовок
+        'Номер заказа': frame['OrderText'],
+        'Причина': reason,
+        'Значение': frame[value_column].astype(str),
+    })
+    return rejects
+
+def prepare_orders(df):
+    """
+    Приводит файл заказов к рабочим столбцам (без обращения к БД).
+    Возвращает (заказы, отбракованные строки, отсутствующие колонки).
+    Строка файла: Row - номер строки, OrderText - номер заказа как в файле.
+    """
+    orders, missing = map_columns('orders', df)
+    if missing:
+        return None, None, missing
+    orders = orders.reset_index(drop=True)
+    orders.insert(0, 'Row', orders.index)
+    orders['OrderText'] = orders['OrderID']
+    orders['OrderID'] = to_int_or_na(orders['OrderText'])
+    orders['PointText'] = orders['PointID']
+    orders['PointID'] = to_int_or_na(orders['PointText'])
 
-def import_orders(db, file_path):
-    """Импортирует заказы и детали заказов."""
-    df = read_file_safe(file_path)
+    rejects = []
+    bad_number = orders['OrderID'].isna()
+    rejects.append(make_rejects(orders[bad_number], 'номер заказа не число', 'OrderText'))
+    orders = orders[~bad_number]
+    duplicated = orders['OrderID'].duplicated()
+    rejects.append(make_rejects(orders[duplicated], 'повтор номера заказа', 'OrderText'))
+    orders = orders[~duplicated]
+    bad_point = orders['PointID'].isna()
+    rejects.append(make_rejects(orders[bad_point], 'пункт выдачи не число', 'PointText'))
+    return orders[~bad_point], rejects, []
+
+def explode_order_lines(orders):
+    """
+    "Артикул1, Количество1, Артикул2, Количество2, ..." -> по строке на пару
+    (OrderID, ProductArticle, Quantity) в порядке файла. Возвращает (строки, отбракованные пары).
+    """
+    # Пробелы вокруг запятых отрезаются самим split, по краям ячейки - clean_text
+    tokens = orders.set_index('Row')['Articles'].str.split(r'\s*,\s*', regex=True).explode()
+    tokens = tokens.fillna('').str.strip('"')  # Очистка от кавычек
+    position = tokens.groupby(level=0).cumcount().to_numpy()
+    pairs = pd.DataFrame({'Row': tokens.index, 'Pair': position // 2, 'Token': tokens.to_numpy()})
+    is_article = position % 2 == 0
+    articles = pairs[is_article].rename(columns={'Token': 'ProductArticle'})
+    quantities = pairs[~is_article].rename(columns={'Token': 'QuantityText'})
+    lines = articles.merge(quantities, on=['Row', 'Pair'], how='left')
+    # Пустая ячейка состава - заказ без позиций, а не ошибка
+    lines = lines[(lines['ProductArticle'] != '') | lines['QuantityText'].notna()]
+    lines = lines.merge(orders[['Row', 'OrderID', 'OrderText']], on='Row')
+
+    quantity_text = lines['QuantityText'].fillna('')
+    valid_quantity = quantity_text.str.match(QUANTITY_PATTERN)
+    lines['Quantity'] = pd.to_numeric(quantity_text.where(valid_quantity), errors='coerce')
+    lines['PairText'] = lines['ProductArticle'] + ', ' + quantity_text
+
+    rejects = [
+        make_rejects(lines[lines['QuantityText'].isna()], 'артикул без количества', 'PairText'),
+        make_rejects(lines[lines['QuantityText'].notna() & ~valid_quantity], 'количество не целое число', 'PairText'),
+    ]
+    lines = lines[valid_quantity]
+    empty_article = lines['ProductArticle'] == ''
+    rejects.append(make_rejects(lines[empty_article], 'пустой артикул', 'PairText'))
+    lines = lines[~empty_article].sort_values(['Row', 'Pair'], kind='stable')
+    lines['Quantity'] = lines['Quantity'].astype('int64')
+    return lines, rejects
+
+def resolve_order_ids(db, orders):
+    """
+    Подставляет UserID (по ФИО), StatusID (недостающие статусы вставляются)
+    и проверяет PointID. Возвращает (заказы со ссылками, отбракованные строки).
+    """
+    statuses = orders.loc[orders['StatusName'] != '', ['StatusName']].drop_duplicates()
+    statuses = resolve_lookup_ids(db, statuses, 'OrderStatus', 'StatusName', 'StatusID')
+    # Одинаковые ФИО: как и раньше, берётся последний пользователь
+    users = pd.DataFrame([(row[0].strip(), row[1]) for row in db.execute("SELECT FullName, UserID FROM User")],
+                         columns=['FullName', 'UserID']).drop_duplicates('FullName', keep='last')
+    points = pd.DataFrame(db.execute("SELECT PointID FROM PickupPoint").fetchall(), columns=['PointID'])
+    points['PointFound'] = True
+    points['PointID'] = points['PointID'].astype('Int64')
+
+    orders = (orders.merge(users, on='FullName', how='left')
+                    .merge(statuses, on='StatusName', how='left')
+                    .merge(points, on='PointID', how='left'))
+    rejects = []
+    no_user = orders['UserID'].isna()
+    rejects.append(make_rejects(orders[no_user], 'клиент не найден', 'FullName'))
+    no_status = ~no_user & orders['StatusID'].isna()
+    rejects.append(make_rejects(orders[no_status], 'пустой статус', 'StatusName'))
+    no_point = ~no_user & ~no_status & orders['PointFound'].isna()
+    rejects.append(make_rejects(orders[no_point], 'пункт выдачи не найден', 'PointText'))
+    orders = orders[~(no_user | no_status | no_point)].sort_values('Row', kind='stable')
+    for column in ('UserID', 'StatusID'):
+        orders[column] = orders[column].astype('int64')
+    return orders, rejects
+
+def write_rejects(file_path, rejects):
+    """Пишет отбракованные строки в <файл>.rejects.csv (старый файл удаляется). Возвращает их число."""
+    rejects_path = file_path + REJECTS_SUFFIX
+    rejects = pd.concat([frame for frame in rejects if not frame.empty] or [pd.DataFrame(columns=REJECT_COLUMNS)])
+    if rejects.empty:
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+        return 0
+    rejects.sort_values('Строка файла', kind='stable').to_csv(rejects_path, index=False, encoding='utf-8-sig')
+    return len(rejects)
+
+def import_orders(db, file_path, incremental=False, df=None):
+    """
+    Импортирует заказы и детали заказов (векторно, два executemany).
+    incremental - записываются только новые и изменённые заказы (по хэшу строки)
+    вместе с составом; импортированные ранее заказы, которых нет в файле,
+    удаляются. Заказы, созданные в app.py (без хэша в ImportRow), не трогаются.
+    Ошибочные строки и пары "артикул, количество" пишутся в <файл>.rejects.csv.
+    df - уже прочитанный файл. Возвращает True при успехе.
+    """
+    if df is None:
+        df = read_file_safe(file_path)
     if df is None or df.empty:
         print(f"Не удалось загрузить данные из {file_path}")
-        return
-    
-    cursor = db.cursor()
-    inserted_count = 0
+        return False
+
+    orders, rejects, missing = prepare_orders(df)
+    if missing:
+        print(f"В файле {file_path} нет колонок: {missing}. Доступные колонки: {list(df.columns)}")
+        return False
+
+    conflict = ""
+    verb = "INSERT OR IGNORE"
+    if incremental:
+        updates = ', '.join(f"{column}=excluded.{column}" for column in ORDER_INSERT_COLUMNS[1:])
+        # Окно заказа app.py, открытое до синхронизации, не перезапишет новые данные
+        updates += ', RowVersion=RowVersion+1'
+        conflict = f"ON CONFLICT(OrderID) DO UPDATE SET {updates}"
+        verb = "INSERT"
+    removed = []
     
     try:
-        # Кэширование ID
-        user_map = {row[0].strip(): row[1] 
-                    for row in cursor.execute("SELECT FullName, UserID FROM User").fetchall()}
-        
-        # 1. Заполнение таблицы OrderStatus
-        COL_STATUS = 'Статус заказа'
-        if COL_STATUS not in df.columns:
-            raise KeyError(f"Колонка '{COL_STATUS}' не найдена в файле заказов. Доступные: {list(df.columns)}")
-
-        statuses = df[COL_STATUS].str.strip().unique()
-        for status in statuses:
-            if status:
-                cursor.execute("INSERT OR IGNORE INTO OrderStatus (StatusName) VALUES (?)", (status,))
-        db.commit()
-        status_map = {name: cursor.execute("SELECT StatusID FROM OrderStatus WHERE StatusName=?", (name,)).fetchone()[0]
-                      for name in statuses if name}
-
-        # 2. Заполнение таблицы Order и OrderProduct
-        for index, row in df.iterrows():
-            
-            user_fullname = str(row['ФИО авторизированного клиента']).strip()
-            # Адрес пункта выдачи - это PointID, которое уже импортировано. 
-            point_id = int(str(row['Адрес пункта выдачи']).strip()) 
-            status_name = str(row[COL_STATUS]).strip()
-            
-            user_id = user_map.get(user_fullname)
-            status_id = status_map.get(status_name)
-            
-            # Пропускаем, если не нашли связанных данных
-            if not user_id or not status_id: 
-                print(f"Не найден user_id или status_id для заказа {row['Номер заказа']}. Пропускаем.")
-                continue 
-            
-            # Вставка Заказа
-            order_data = (
-                int(row['Номер заказа']),
-                str(row['Дата заказа']).strip(),
-                str(row['Дата доставки']).strip(),
-                str(row['Код для получения']).strip(),
-                user_id,
-                point_id, 
-                status_id
-            )
-            cursor.execute("""
-                INSERT OR IGNORE INTO "Order" (OrderID, OrderDate, DeliveryDate, PickupCode, UserID, PointID, StatusID)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, order_data)
-            
-            inserted_count += cursor.rowcount
-            order_id = int(row['Номер заказа'])
-
-            # Парсинг Артикулов заказа
-            # Артикул заказа - это строка вида: "Артикул1, Количество1, Артикул2, Количество2, ..."
-            articles_quantities = str(row['Артикул заказа']).split(',')
-            
-            for i in range(0, len(articles_quantities), 2):
-                if i + 1 < len(articles_quantities):
-                    article = articles_quantities[i].strip().strip('"') # Очистка от кавычек
-                    quantity = articles_quantities[i+1].strip().strip('"')
-                    
-                    try:
-                        quantity_int = int(quantity)
-                        cursor.execute("""
-                            INSERT INTO OrderProduct (OrderID, ProductArticle, Quantity)
-                            VALUES (?, ?, ?)
-                        """, (order_id, article, quantity_int))
-                    except ValueError:
-                        pass # Игнорируем неверные пары Артикул/Количество
-
-        db.commit()
-        print(f"Импорт заказов из {file_path} успешен. Вставлено {inserted_count} заказов.")
+        with import_transaction(db):
+            file_order_ids = set(orders['OrderID'].astype(str))
+            orders['RowHash'] = row_hashes(orders[list(ORDER_COLUMNS)])
+            if incremental:
+                # Кандидаты на удаление - только импортированные заказы. Заказ без хэша
+                # с номером из файла считается изменённым и перезаписывается файлом
+                stored = load_row_hashes(db, ORDER_SOURCE)
+                changed = [stored.get(str(order_id)) != value
+                           for order_id, value in zip(orders['OrderID'], orders['RowHash'].tolist())]
+                orders = orders[changed]
+                removed = [key for key in stored if key not in file_order_ids]
+
+            orders, order_rejects = resolve_order_ids(db, orders)
+            rejects += order_rejects
+            lines, line_rejects = explode_order_lines(orders)
+            rejects += line_rejects
+
+            if incremental:
+                # Состав изменённых заказов записывается заново, удалённые заказы убираются
+                rewritten = [(int(order_id),) for order_id in orders['OrderID']]
+                rewritten += [(int(order_id),) for order_id in removed]
+                db.executemany("DELETE FROM OrderProduct WHERE OrderID=?", rewritten)
+                db.executemany('DELETE FROM "Order" WHERE OrderID=?', ((int(order_id),) for order_id in removed))
+                delete_row_hashes(db, ORDER_SOURCE, removed)
+
+            cursor = db.executemany(f"""
+                {verb} INTO "Order" ({', '.join(ORDER_INSERT_COLUMNS)})
+                VALUES ({', '.join('?' * len(ORDER_INSERT_COLUMNS))})
+                {conflict}
+            """, orders[list(ORDER_INSERT_COLUMNS)].astype(object).itertuples(index=False, name=None))
+            written_count = cursor.rowcount
+            db.executemany("INSERT INTO OrderProduct (OrderID, ProductArticle, Quantity) VALUES (?, ?, ?)",
+                           lines[['OrderID', 'ProductArticle', 'Quantity']].astype(object)
+                           .itertuples(index=False, name=None))
+            save_row_hashes(db, ORDER_SOURCE, orders['OrderID'].astype(str), orders['RowHash'])
+
+        rejected_count = write_rejects(file_path, rejects)
+        if rejected_count:
+            print(f"Отбраковано строк и позиций заказов: {rejected_count} (см. {file_path + REJECTS_SUFFIX})")
+        if incremental:
+            print(f"Синхронизация заказов из {file_path}: изменено {written_count}, удалено {len(removed)}, "
+                  f"позиций записано {len(lines)}.")
+        else:
+            print(f"Импорт заказов из {file_path} успешен. Вставлено {written_count} заказов, {len(lines)} позиций.")
+        return True
     except Exception as e:
         print(f"Ошибка при импорте заказов: {e}")
-        db.rollback()
+        return False
+
+# --- 4. ПАРАЛЛЕЛЬНЫЙ РАЗБОР ФАЙЛОВ ---
+# Разбор файлов (pandas/openpyxl) занимает больше времени, чем запись в SQLite,
+# и не зависит от базы: пользователи, пункты выдачи и заказы разбираются в
+# пуле процессов, пока основной процесс читает и записывает товары, а записи
+# применяются в одном соединении в порядке зависимостей:
+# пользователи и пункты выдачи -> товары -> заказы (им нужны пользователи и товары).
+# Товары в пул не передаются: результат процесса возвращается целиком, а файл
+# товаров (самый большой) читается блоками, чтобы память не росла с его размером.
+
+IMPORT_ORDER = ('users', 'points', 'products', 'orders')
+POOLED_SOURCES = ('users', 'points', 'orders')
+DEFAULT_PARSE_WORKERS = min(len(POOLED_SOURCES), os.cpu_count() or 1)
+# Запуск процессов пула (импорт pandas в каждом) стоит около секунды -
+# маленькие файлы быстрее разобрать в основном процессе
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+def parse_source(key, file_path):
+    """Разбор одного файла импорта (POOLED_SOURCES) в процессе пула. Результат передаётся в import_* как df."""
+    return read_file_safe(file_path, header=None if key == 'points' else 0)
+
+class ParsedSources:
+    """
+    Запускает разбор файлов POOLED_SOURCES из {ключ: путь} в пуле процессов;
+    get(ключ) ждёт результат. Для товаров, при workers <= 1 или файлах пула
+    меньше PARALLEL_MIN_BYTES в сумме get возвращает None - importer читает файл сам.
+    """
+
+    def __init__(self, sources, workers=DEFAULT_PARSE_WORKERS,
+                 min_bytes=PARALLEL_MIN_BYTES):
+        self._executor = None
+        self._futures = {}
+        pooled = [key for key in POOLED_SOURCES if key in sources]
+        total_bytes = sum(os.path.getsize(sources[key]) for key in pooled)
+        if workers > 1 and len(sources) > 1 and pooled and total_bytes >= min_bytes:
+            self._executor = ProcessPoolExecutor(max_workers=min(workers, len(pooled)))
+            for key in pooled:
+                self._futures[key] = self._executor.submit(parse_source, key, sources[key])
+
+    def get(self, key):
+        future = self._futures.pop(key, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            # Файл будет разобран ещё раз в основном процессе, ошибка выведется там
+            print(f"Разбор {key} в пуле процессов не удался ({e}), повтор без пула.")
+            return None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
 
-# --- 4. ОСНОВНАЯ ФУНКЦИЯ ЗАПУСКА ---
+    def __exit__(self, *exc_info):
+        self.close()
 
-def main():
+# --- 5. ОСНОВНАЯ ФУНКЦИЯ ЗАПУСКА ---
+
+def main(chunksize=CHUNK_SIZE, workers=DEFAULT_PARSE_WORKERS):
     """Главная функция для создания базы данных и импорта данных."""
     # Сначала проверим, какие файлы есть в папке
     print("=== Поиск файлов в текущей директории ===")
@@ -389,15 +696,14 @@ def main():
     print("Найдены файлы:", csv_files)
     
     # Удаляем старую базу, чтобы начать с чистого листа
-    if os.path.exists(DATABASE):
-        os.remove(DATABASE)
+    db_config.remove_database(DATABASE)
         
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.create_function("TRIM", 1, lambda s: s.strip() if isinstance(s, str) else s)
+        conn = db_config.configure(sqlite3.connect(DATABASE), 'bulk')
 
-        # 1. Создание таблиц
+        # 1. Создание таблиц. Миграции (индексы, триггеры, сводки) применяются
+        # после импорта: их заполнение одним запросом быстрее, чем триггеры на каждую строку
         print("\n=== Создание таблиц ===")
         create_tables(conn)
         
@@ -411,10 +717,21 @@ def main():
             else:
                 print(f"ВНИМАНИЕ: Файл {filename} не найден!")
         
-        import_roles_and_users(conn, IMPORT_FILES['users'][0])
-        import_pickup_points(conn, IMPORT_FILES['points'][0])
-        import_products(conn, IMPORT_FILES['products'][0])
-        import_orders(conn, IMPORT_FILES['orders'][0])
+        sources = {key: filename for key, (filename, _) in IMPORT_FILES.items() if os.path.exists(filename)}
+        with ParsedSources(sources, workers=workers) as parsed:
+            import_roles_and_users(conn, IMPORT_FILES['users'][0], df=parsed.get('users'))
+            import_pickup_points(conn, IMPORT_FILES['points'][0], df=parsed.get('points'))
+            import_products(conn, IMPORT_FILES['products'][0], chunksize=chunksize, blocks=parsed.get('products'))
+            import_orders(conn, IMPORT_FILES['orders'][0], df=parsed.get('orders'))
+        migrate(conn)
+        # WAL после импорта размером с базу: переносим в основной файл и обнуляем
+        db_config.checkpoint(conn, 'TRUNCATE')
+
+        # Отпечатки файлов: следующий sync пропустит неизменённые
+        with conn:
+            for filename, _ in IMPORT_FILES.values():
+                if os.path.exists(filename):
+                    record_fingerprint(conn, filename, file_fingerprint(filename))
         
         print(f"\nБаза данных {DATABASE} успешно создана и заполнена.")
         
@@ -426,5 +743,79 @@ def main():
         if conn:
             conn.close()
 
+# Шаги синхронизации по ключам IMPORT_ORDER: (db, путь, chunksize, результат разбора или None)
+SYNC_STEPS = {
+    'users': lambda db, path, chunksize, parsed: import_roles_and_users(db, path, incremental=True, df=parsed),
+    'points': lambda db, path, chunksize, parsed: import_pickup_points(db, path, df=parsed),
+    'products': lambda db, path, chunksize, parsed: import_products(db, path, chunksize=chunksize,
+                                                                    incremental=True, blocks=parsed),
+    'orders': lambda db, path, chunksize, parsed: import_orders(db, path, incremental=True, df=parsed),
+}
+
+def sync(chunksize=CHUNK_SIZE, database=DATABASE, workers=DEFAULT_PARSE_WORKERS):
+    """
+    Инкрементальное обновление существующей базы без её удаления.
+    Файлы с прежним отпечатком пропускаются; в изменённых записываются только
+    новые и изменённые строки, исчезнувшие строки удаляются. Всё выполняется
+    в одной транзакции: в режиме WAL main_web и app.py читают прежние данные
+    до COMMIT и сразу видят новые после. Возвращает True при успехе.
+    """
+    conn = None
+    try:
+        conn = db_config.configure(sqlite3.connect(database))
+        create_tables(conn)
+        migrate(conn)
+
+        # Отпечатки считаются до транзакции: разбираются только изменённые файлы
+        fingerprints = {}
+        for key in IMPORT_ORDER:
+            filename = IMPORT_FILES[key][0]
+            if not os.path.exists(filename):
+                print(f"ВНИМАНИЕ: Файл {filename} не найден - пропущен.")
+                continue
+            fingerprint = file_fingerprint(filename)
+            if fingerprint == stored_fingerprint(conn, filename):
+                print(f"Файл {filename} не изменился - пропущен.")
+                continue
+            fingerprints[key] = fingerprint
+
+        sources = {key: IMPORT_FILES[key][0] for key in fingerprints}
+        with ParsedSources(sources, workers=workers) as parsed:
+            conn.execute("BEGIN IMMEDIATE")
+            changed = []
+            for key in IMPORT_ORDER:
+                if key not in fingerprints:
+                    continue
+                filename = sources[key]
+                if not SYNC_STEPS[key](conn, filename, chunksize, parsed.get(key)):
+                    raise RuntimeError(f"не удалось синхронизировать {filename}")
+                record_fingerprint(conn, filename, fingerprints[key])
+                changed.append(filename)
+            conn.commit()
+        print(f"\nСинхронизация {database} завершена. Изменённых файлов: {len(changed)}.")
+        return True
+    except (sqlite3.Error, RuntimeError) as e:
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+        print(f"Синхронизация отменена, база не изменена: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Создание demodb.db и импорт данных из файлов.")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"строк в блоке потокового импорта товаров (0 - файл целиком), по умолчанию {CHUNK_SIZE}")
+    parser.add_argument('--sync', action='store_true',
+                        help="обновить существующую базу (только изменённые строки) вместо пересоздания")
+    parser.add_argument('--workers', type=int, default=DEFAULT_PARSE_WORKERS,
+                        help=f"процессов для разбора файлов (1 - без пула), по умолчанию {DEFAULT_PARSE_WORKERS}")
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.sync:
+        sync(chunksize=args.chunk_size or None, workers=args.workers)
+    else:
+        main(chunksize=args.chunk_size or None, workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,193 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Единые настройки SQLite для app.py, main_web.py и data_import.py и
+# снимок базы для отчётов.
+#
+# Режим WAL: читатели не блокируют писателя и друг друга. Контрольная
+# точка (перенос WAL в основной файл) выполняется автоматически каждые
+# WAL_AUTOCHECKPOINT_PAGES страниц, после неё файл WAL усекается до
+# JOURNAL_SIZE_LIMIT. mmap_size - чтение страниц через отображение файла
+# в память, без копирования в кэш соединения.
+#
+# Снимок (реплика): копия базы через backup API в отдельный файл
+# (demodb.replica.db), который открывается только для чтения. Тяжёлые
+# отчёты и check_db.py читают реплику и не конкурируют с витриной.
+#
+# Запуск (обновлять реплику каждые 5 минут): python db_config.py --interval 300
+
+DATABASE = 'demodb.db'
+
+WAL_AUTOCHECKPOINT_PAGES = 1000           # ~4 МБ при странице 4 КБ
+JOURNAL_SIZE_LIMIT = 64 * 1024 * 1024     # До скольких байт усекать WAL после контрольной точки
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 8 * 1024                 # На соединение (в пуле их несколько)
+BUSY_TIMEOUT_MS = 5000
+
+# PRAGMA по профилям: (имя, значение) в порядке применения
+PROFILES = {
+    # Рабочие соединения app.py, main_web.py, sync в data_import.py
+    'default': (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),  # В WAL: сбой приложения не теряет данных, сбой ОС - только последние транзакции
+        ('busy_timeout', BUSY_TIMEOUT_MS),
+        ('temp_store', 'MEMORY'),
+        ('cache_size', -CACHE_SIZE_KIB),  # Отрицательное значение - размер в КиБ
+        ('mmap_size', MMAP_SIZE),
+        ('wal_autocheckpoint', WAL_AUTOCHECKPOINT_PAGES),
+        ('journal_size_limit', JOURNAL_SIZE_LIMIT),
+    ),
+    # Полное пересоздание базы (data_import.main): при сбое база создаётся
+    # заново, поэтому fsync не нужен, а кэш страниц больше
+    'bulk': (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'OFF'),
+        ('busy_timeout', BUSY_TIMEOUT_MS),
+        ('temp_store', 'MEMORY'),
+        ('cache_size', -64 * 1024),
+        ('mmap_size', MMAP_SIZE),
+        ('journal_size_limit', JOURNAL_SIZE_LIMIT),
+    ),
+}
+
+REPLICA_SUFFIX = '.replica.db'
+REPLICA_MAX_AGE = 300  # Старше - снимок обновляется перед отчётом (сек.)
+
+# --- 1. НАСТРОЙКА СОЕДИНЕНИЙ ---
+
+def configure(conn, profile='default'):
+    """Применяет PRAGMA профиля к соединению. Возвращает соединение."""
+    for name, value in PROFILES[profile]:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def checkpoint(conn, mode='PASSIVE'):
+    """
+    Контрольная точка WAL. PASSIVE не ждёт читателей; TRUNCATE (после
+    импорта) дожидается их и обнуляет файл WAL. Возвращает (busy, страниц в WAL, перенесено).
+    """
+    return conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+def remove_database(database):
+    """
+    Удаляет файл базы вместе с -wal/-shm/-journal: старый WAL рядом с новой
+    базой SQLite применил бы к ней при открытии.
+    """
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+
+# --- 2. РЕПЛИКА ДЛЯ ОТЧЁТОВ ---
+
+def replica_path(database=DATABASE):
+    return os.path.splitext(database)[0] + REPLICA_SUFFIX
+
+def snapshot(database=DATABASE, replica=None):
+    """
+    Копирует базу в файл реплики через backup API. В режиме WAL копирование
+    идёт в одной транзакции чтения: писатели не ждут, снимок согласован.
+    Файл заменяется атомарно - открытые соединения дочитывают прежний снимок.
+    Возвращает путь к реплике.
+    """
+    replica = replica or replica_path(database)
+    tmp_replica = replica + '.tmp'
+    remove_database(tmp_replica)
+    source = sqlite3.connect(database)
+    try:
+        target = sqlite3.connect(tmp_replica)
+        try:
+            source.backup(target)
+            # Реплика - один файл без WAL: её можно копировать и открывать неизменяемой
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+    finally:
+        source.close()
+    os.replace(tmp_replica, replica)
+    return replica
+
+def replica_age(database=DATABASE):
+    """Возраст снимка в секундах или None, если его нет."""
+    try:
+        return time.time() - os.stat(replica_path(database)).st_mtime
+    except OSError:
+        return None
+
+def open_replica(database=DATABASE, max_age=REPLICA_MAX_AGE):
+    """
+    Соединение только для чтения со снимком базы. Снимок создаётся или
+    обновляется, если его нет или он старше max_age секунд (None - любой возраст).
+    """
+    age = replica_age(database)
+    if age is None or (max_age is not None and age > max_age):
+        snapshot(database)
+    # immutable=1: файл не меняется (обновление - замена файла), блокировки не нужны
+    uri = 'file:' + os.path.abspath(replica_path(database)) + '?mode=ro&immutable=1'
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+class ReplicaSnapshotter:
+    """Фоновый поток, обновляющий реплику каждые interval секунд."""
+
+    def __init__(self, database=DATABASE, interval=REPLICA_MAX_AGE):
+        self.database = database
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_error = None
+        self.snapshots = 0
+
+    def _run(self):
+        while True:
+            try:
+                snapshot(self.database)
+                self.snapshots += 1
+                self.last_error = None
+            except (sqlite3.Error, OSError) as e:
+                self.last_error = str(e)  # Попробуем в следующий раз, витрина не страдает
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='db-replica', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+# --- 3. ЗАПУСК ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимок базы для отчётов (реплика только для чтения).")
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--interval', type=float, default=None,
+                        help="обновлять снимок каждые N секунд (без ключа - один снимок)")
+    args = parser.parse_args()
+    if args.interval is None:
+        started = time.perf_counter()
+        replica = snapshot(args.database)
+        print(f"Снимок {replica} создан за {time.perf_counter() - started:.2f} с.")
+        return 0
+    snapshotter = ReplicaSnapshotter(args.database, args.interval).start()
+    print(f"Реплика {replica_path(args.database)} обновляется каждые {args.interval:g} с (Ctrl+C - выход).")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        snapshotter.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
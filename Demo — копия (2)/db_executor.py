@@ -0,0 +1,124 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import create_connection
+from write_coordinator import WriteCoordinator
+
+# Исполнитель запросов к SQLite для асинхронного режима (main_asgi.py).
+# Цикл событий не ждёт SQLite: работа с базой передаётся в потоки.
+#   - Читатели: readers потоков, у каждого своё соединение только для чтения
+#     (WAL: читатели не блокируют друг друга и писателя).
+#   - Писатель: очередь записи (write_coordinator.py) с одним потоком и
+#     единственным пишущим соединением - записи идут по очереди, ожидающие
+#     фиксируются вместе и не конкурируют за блокировку базы.
+# Число ожидающих задач ограничено: при перегрузке вызов сразу получает
+# ExecutorBusyError (ответ 503), а не копится в памяти.
+
+DEFAULT_READERS = 4
+DEFAULT_MAX_PENDING = 256  # Задач в работе и в очереди (читатели + писатель)
+
+
+class ExecutorBusyError(RuntimeError):
+    """Очередь исполнителя заполнена - запрос лучше отклонить сразу."""
+
+
+def create_read_connection(database):
+    """Настроенное соединение (db_pool.create_connection), запрещающее запись."""
+    conn = create_connection(database)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class DatabaseExecutor:
+    """
+    Ограниченный исполнитель: fn(conn, *args) выполняется в потоке-читателе
+    (read) или в очереди записи (write, в транзакции очереди). Соединение
+    потока создаётся при его запуске и живёт до close().
+    """
+
+    def __init__(self, database, readers=DEFAULT_READERS, max_pending=DEFAULT_MAX_PENDING,
+                 read_connection_factory=create_read_connection, write_connection_factory=create_connection):
+        self.database = database
+        self.readers = readers
+        self.max_pending = max_pending
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._closed = False
+        self._reader_pool = ThreadPoolExecutor(readers, thread_name_prefix='db-reader',
+                                               initializer=self._open_connection,
+                                               initargs=(read_connection_factory,))
+        self._writer = WriteCoordinator(database, connection_factory=write_connection_factory)
+        # Метрики
+        self._pending = 0
+        self._peak_pending = 0
+        self._reads = 0
+        self._writes = 0
+        self._rejected = 0
+
+    def _open_connection(self, factory):
+        conn = factory(self.database)
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+
+    def _run_read(self, fn, args):
+        return fn(self._local.conn, *args)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, submit, call, counter):
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Исполнитель запросов закрыт.")
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise ExecutorBusyError(f"Очередь запросов к базе заполнена ({self.max_pending}).")
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+            setattr(self, counter, getattr(self, counter) + 1)
+        future = submit(*call)
+        future.add_done_callback(self._done)
+        return future
+
+    def submit_read(self, fn, *args):
+        """fn(conn, *args) в потоке-читателе. Возвращает concurrent.futures.Future."""
+        return self._submit(self._reader_pool.submit, (self._run_read, fn, args), '_reads')
+
+    def submit_write(self, fn, *args):
+        """fn(conn, *args) в очереди записи (без commit внутри fn). Возвращает Future."""
+        return self._submit(self._writer.submit, (fn,) + args, '_writes')
+
+    async def read(self, fn, *args):
+        return await asyncio.wrap_future(self.submit_read(fn, *args))
+
+    async def write(self, fn, *args):
+        return await asyncio.wrap_future(self.submit_write(fn, *args))
+
+    def stats(self):
+        """Снимок метрик для подбора числа читателей и длины очереди."""
+        with self._lock:
+            return {
+                'readers': self.readers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'peak_pending': self._peak_pending,
+                'reads': self._reads,
+                'writes': self._writes,
+                'rejected': self._rejected,
+                'writer': self._writer.stats(),
+            }
+
+    def close(self):
+        """Дожидается начатых задач и закрывает соединения потоков."""
+        with self._lock:
+            self._closed = True
+        self._reader_pool.shutdown(wait=True)
+        self._writer.close()
+        with self._lock:
+            while self._connections:
+                self._connections.pop().close()
\ No newline at end of file
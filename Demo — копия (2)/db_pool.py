@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import db_config
+
+# --- 1. НАСТРОЙКИ ПУЛА ---
+DEFAULT_POOL_SIZE = 8          # Не меньше числа потоков воркера gunicorn
+DEFAULT_CHECKOUT_TIMEOUT = 5.0 # Сколько ждать свободное соединение (сек.)
+STATEMENT_CACHE_SIZE = 512     # Подготовленные запросы, которые соединение держит в кэше
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Все соединения пула заняты дольше допустимого времени ожидания."""
+
+
+# --- 2. СОЗДАНИЕ СОЕДИНЕНИЙ ---
+
+def create_connection(database, statement_cache_size=STATEMENT_CACHE_SIZE):
+    """Открывает соединение и полностью настраивает его (row_factory, PRAGMA из db_config)."""
+    conn = sqlite3.connect(database, check_same_thread=False, cached_statements=statement_cache_size)
+    conn.row_factory = sqlite3.Row
+    return db_config.configure(conn)
+
+
+# --- 3. ПУЛ СОЕДИНЕНИЙ ---
+
+class ConnectionPool:
+    """Ограниченный потокобезопасный пул заранее настроенных соединений SQLite."""
+
+    def __init__(self, database, max_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 connection_factory=create_connection):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self._connection_factory = connection_factory
+        self._cond = threading.Condition()
+        self._idle = []  # LIFO: чаще выдаём соединения с "тёплым" кэшем запросов
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        # Метрики
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._peak_in_use = 0
+
+    def acquire(self):
+        """Выдаёт соединение, при необходимости ожидая освобождения."""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        waited = False
+        conn = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Пул соединений закрыт.")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.max_size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Нет свободного соединения за {self.timeout} сек. (размер пула {self.max_size})."
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            wait_time = time.perf_counter() - started
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_total += wait_time
+            self._wait_max = max(self._wait_max, wait_time)
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        if conn is None:
+            try:
+                conn = self._connection_factory(self.database)
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """Возвращает соединение в пул (незавершённая транзакция откатывается)."""
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._created -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: соединение из пула на время блока with."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Снимок метрик пула для подбора его размера."""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._created,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'checkout_waits': self._waits,
+                'checkout_timeouts': self._timeouts,
+                'wait_time_avg_ms': (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                'wait_time_max_ms': self._wait_max * 1000,
+            }
+
+    def close(self):
+        """Закрывает свободные соединения; занятые закроются при возврате."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+            self._cond.notify_all()
\ No newline at end of file
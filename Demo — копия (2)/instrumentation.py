@@ -0,0 +1,375 @@
+import cProfile
+import functools
+import heapq
+import io
+import itertools
+import logging
+import pstats
+import random
+import re
+import threading
+import time
+
+from flask import Response, g, request, template_rendered, before_render_template
+
+# Инструментирование main_web (включается явно, см. main_web.enable_instrumentation):
+#   - время и число строк каждого SQL-запроса через обёртку над соединением
+#     из get_db(); запросы группируются по нормализованному тексту;
+#   - время отрисовки шаблонов и обработки запроса целиком;
+#   - метрики в текстовом формате Prometheus (/metrics);
+#   - журнал медленных запросов (порог в мс);
+#   - cProfile для выборки запросов, хранятся профили N самых медленных (/metrics/profiles).
+
+DEFAULT_SLOW_QUERY_MS = 50.0
+DEFAULT_SLOW_QUERY_LOG = 'slow_queries.log'
+DEFAULT_PROFILE_SAMPLE_RATE = 0.0  # Доля профилируемых запросов (0 - профилирование выключено)
+DEFAULT_PROFILE_KEEP = 10          # Сколько самых медленных профилей хранить
+PROFILE_PRINT_LINES = 40
+# Границы корзин гистограммы длительности запросов (сек.)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_QUERY_LABEL = 300
+
+# --- 1. НОРМАЛИЗАЦИЯ SQL ---
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Текст запроса без литералов и лишних пробелов: один ключ для запросов с разными значениями."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = ' '.join(sql.split())
+    return _PARAMETER_LIST.sub('(?)', sql)
+
+# --- 2. ОБЁРТКИ СОЕДИНЕНИЯ И КУРСОРА ---
+
+class _Statement:
+    """Один выполненный запрос: время выполнения и выборки строк, число строк."""
+    __slots__ = ('sql', 'seconds', 'rows')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.seconds = 0.0
+        self.rows = 0
+
+
+class TimedCursor:
+    """Курсор, который учитывает время execute и fetch* в записи текущего запроса."""
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+        self._current = None
+
+    def _timed(self, sql, method, *args):
+        statement = _Statement(sql)
+        self._statements.append(statement)
+        self._current = statement
+        started = time.perf_counter()
+        try:
+            method(sql, *args)
+        finally:
+            statement.seconds += time.perf_counter() - started
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sql, self._cursor.execute, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._timed(sql, self._cursor.executemany, seq_of_parameters)
+        self._current.rows = max(self._cursor.rowcount, 0)
+        return self
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        if self._current is not None:
+            self._current.seconds += time.perf_counter() - started
+            if isinstance(result, list):
+                self._current.rows += len(result)
+            elif result is not None:
+                self._current.rows += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(self._cursor.fetchmany, size if size is not None else self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Соединение из пула, у которого execute/cursor возвращают TimedCursor."""
+
+    def __init__(self, conn, statements):
+        self._conn = conn
+        self._statements = statements
+
+    def cursor(self):
+        return TimedCursor(self._conn.cursor(), self._statements)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+# --- 3. МЕТРИКИ ---
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+class Metrics:
+    """Потокобезопасные счётчики запросов, SQL и шаблонов; вывод в формате Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}   # (endpoint, method, status) -> [число, сумма сек.]
+        self.histograms = {}  # (endpoint, method) -> [счётчики по DURATION_BUCKETS + Inf, сумма, число]
+        self.queries = {}    # нормализованный SQL -> [число, сумма сек., строк, максимум сек.]
+        self.templates = {}  # шаблон -> [число, сумма сек.]
+        self.slow_queries = 0
+        self.profiles_captured = 0
+
+    def add_profile(self):
+        with self._lock:
+            self.profiles_captured += 1
+
+    def add_request(self, endpoint, method, status, seconds):
+        with self._lock:
+            entry = self.requests.setdefault((endpoint, method, status), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            histogram = self.histograms.setdefault((endpoint, method), [[0] * (len(DURATION_BUCKETS) + 1), 0.0, 0])
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+            histogram[0][-1] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def add_queries(self, statements, slow_seconds):
+        """Учитывает запросы одного HTTP-запроса. Возвращает медленные (_Statement)."""
+        slow = []
+        with self._lock:
+            for statement in statements:
+                key = normalize_sql(statement.sql)
+                entry = self.queries.setdefault(key, [0, 0.0, 0, 0.0])
+                entry[0] += 1
+                entry[1] += statement.seconds
+                entry[2] += statement.rows
+                entry[3] = max(entry[3], statement.seconds)
+                if statement.seconds >= slow_seconds:
+                    slow.append(statement)
+            self.slow_queries += len(slow)
+        return slow
+
+    def add_template(self, name, seconds):
+        with self._lock:
+            entry = self.templates.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def top_queries(self, limit=10):
+        """Запросы с наибольшим суммарным временем: [(sql, число, сумма сек., строк, максимум сек.)]."""
+        with self._lock:
+            rows = [(sql,) + tuple(entry) for sql, entry in self.queries.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)[:limit]
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            lines += ['# HELP main_web_requests_total HTTP-запросы по роуту, методу и коду ответа.',
+                      '# TYPE main_web_requests_total counter']
+            for (endpoint, method, status), (count, _) in sorted(self.requests.items()):
+                lines.append(f'main_web_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+            lines += ['# HELP main_web_request_duration_seconds Время обработки запроса.',
+                      '# TYPE main_web_request_duration_seconds histogram']
+            for (endpoint, method), (buckets, total, count) in sorted(self.histograms.items()):
+                for bound, value in zip(DURATION_BUCKETS + ('+Inf',), buckets):
+                    labels = _labels(endpoint=endpoint, method=method, le=bound)
+                    lines.append(f'main_web_request_duration_seconds_bucket{labels} {value}')
+                labels = _labels(endpoint=endpoint, method=method)
+                lines.append(f'main_web_request_duration_seconds_sum{labels} {total:.6f}')
+                lines.append(f'main_web_request_duration_seconds_count{labels} {count}')
+
+            for name, index, kind, help_text in (
+                    ('main_web_sql_statements_total', 0, 'counter', 'Выполнения SQL-запроса.'),
+                    ('main_web_sql_duration_seconds_total', 1, 'counter', 'Суммарное время SQL-запроса (с выборкой строк).'),
+                    ('main_web_sql_rows_total', 2, 'counter', 'Строк возвращено SQL-запросом.'),
+                    ('main_web_sql_duration_seconds_max', 3, 'gauge', 'Самое долгое выполнение SQL-запроса.')):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for sql, entry in sorted(self.queries.items()):
+                    value = entry[index]
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{_labels(query=sql[:MAX_QUERY_LABEL])} {value}')
+
+            lines += ['# HELP main_web_template_renders_total Отрисовки шаблона.',
+                      '# TYPE main_web_template_renders_total counter']
+            for name, (count, _) in sorted(self.templates.items()):
+                lines.append(f'main_web_template_renders_total{_labels(template=name)} {count}')
+            lines += ['# HELP main_web_template_render_seconds_total Суммарное время отрисовки шаблона.',
+                      '# TYPE main_web_template_render_seconds_total counter']
+            for name, (_, total) in sorted(self.templates.items()):
+                lines.append(f'main_web_template_render_seconds_total{_labels(template=name)} {total:.6f}')
+
+            lines += ['# HELP main_web_slow_queries_total SQL-запросы дольше порога журнала медленных запросов.',
+                      '# TYPE main_web_slow_queries_total counter',
+                      f'main_web_slow_queries_total {self.slow_queries}',
+                      '# HELP main_web_profiles_captured_total Запросы, выполненные под cProfile.',
+                      '# TYPE main_web_profiles_captured_total counter',
+                      f'main_web_profiles_captured_total {self.profiles_captured}']
+        return '\n'.join(lines) + '\n'
+
+# --- 4. ПРОФИЛИ САМЫХ МЕДЛЕННЫХ ЗАПРОСОВ ---
+
+class SlowestProfiles:
+    """Хранит отчёты cProfile для keep самых медленных профилированных запросов."""
+
+    def __init__(self, keep=DEFAULT_PROFILE_KEEP):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._heap = []  # (секунды, номер, описание, отчёт) - минимальный сверху
+        self._counter = itertools.count()
+
+    def offer(self, seconds, description, profile):
+        with self._lock:
+            if len(self._heap) >= self.keep and seconds <= self._heap[0][0]:
+                return  # Быстрее всех сохранённых - отчёт даже не формируется
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(PROFILE_PRINT_LINES)
+        item = (seconds, next(self._counter), description, stream.getvalue())
+        with self._lock:
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def report(self):
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        if not items:
+            return "Профилей пока нет (доля профилируемых запросов задаётся profile_sample_rate).\n"
+        return '\n'.join(f"=== {seconds * 1000:.1f} мс {description} ===\n{text}"
+                         for seconds, _, description, text in items)
+
+# --- 5. ПОДКЛЮЧЕНИЕ К ПРИЛОЖЕНИЮ ---
+
+class Instrumentation:
+    """Метрики, журнал медленных запросов и выборочное профилирование для Flask-приложения."""
+
+    def __init__(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS, slow_query_log=DEFAULT_SLOW_QUERY_LOG,
+                 profile_sample_rate=DEFAULT_PROFILE_SAMPLE_RATE, profile_keep=DEFAULT_PROFILE_KEEP):
+        self.metrics = Metrics()
+        self.profiles = SlowestProfiles(profile_keep)
+        self.slow_seconds = slow_query_ms / 1000
+        self.profile_sample_rate = profile_sample_rate
+        # cProfile нельзя включить в двух потоках сразу (Python 3.12+) - профилируется один запрос за раз
+        self._profile_lock = threading.Lock()
+        self.slow_log = logging.getLogger('main_web.slow_queries')
+        if slow_query_log and not self.slow_log.handlers:
+            handler = logging.FileHandler(slow_query_log, encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.slow_log.addHandler(handler)
+            self.slow_log.setLevel(logging.INFO)
+            self.slow_log.propagate = False
+
+    def wrap_connection(self, conn):
+        """Обёртка соединения для текущего запроса (get_db)."""
+        statements = g.setdefault('_sql_statements', [])
+        return TimedConnection(conn, statements)
+
+    def install(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_endpoint)
+        app.add_url_rule('/metrics/profiles', 'metrics_profiles', self.profiles_endpoint)
+
+    # Обработчики Flask
+
+    def _before_request(self):
+        g._request_started = time.perf_counter()
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            if self._profile_lock.acquire(blocking=False):
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError:  # Профилировщик уже включён другим инструментом
+                    self._profile_lock.release()
+                else:
+                    g._profile = profile
+
+    def _after_request(self, response):
+        g._response_status = response.status_code
+        return response
+
+    def _teardown_request(self, exception):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            profile.disable()
+            self._profile_lock.release()
+            self.metrics.add_profile()
+            self.profiles.offer(seconds, f"{request.method} {request.full_path}", profile)
+
+        endpoint = request.endpoint or 'unknown'
+        status = g.pop('_response_status', 500 if exception is not None else 200)
+        self.metrics.add_request(endpoint, request.method, status, seconds)
+        for statement in self.metrics.add_queries(g.pop('_sql_statements', []), self.slow_seconds):
+            # Только нормализованный текст: параметры могут содержать пароль (вход)
+            self.slow_log.info("%.1f мс, строк %d, %s: %s", statement.seconds * 1000, statement.rows,
+                               endpoint, normalize_sql(statement.sql))
+
+    def _before_render(self, sender, template, context, **extra):
+        g.setdefault('_render_started', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stack = g.get('_render_started')
+        if stack:
+            self.metrics.add_template(template.name or 'string', time.perf_counter() - stack.pop())
+
+    # Роуты
+
+    def metrics_endpoint(self):
+        return Response(self.metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    def profiles_endpoint(self):
+        return Response(self.profiles.report(), mimetype='text/plain; charset=utf-8')
\ No newline at end of file
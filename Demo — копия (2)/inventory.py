@@ -0,0 +1,189 @@
+import sqlite3
+from datetime import datetime
+
+from migrations import STOCK_LEDGER_TABLE
+
+# Резервирование остатков при сохранении заказа.
+# Product.Quantity - свободный остаток: строки заказа его уменьшают.
+#   - При сохранении сравнивается прежний и новый состав заказа, по каждому
+#     изменившемуся артикулу - одна запись в Product с изменением остатка:
+#     списание - "UPDATE ... WHERE Quantity >= ?" (не уходит в минус),
+#     возврат (строка удалена или уменьшена) - прибавление.
+#   - Если списать нельзя, вся операция (заказ и остатки) откатывается,
+#     вызывающий получает OversellError.
+#   - Каждое движение остатка записывается в журнал StockLedger: кто
+#     (заказ), сколько и какой остаток получился.
+#   - Вернуть на склад можно не больше, чем заказ зарезервировал по журналу.
+#     Импортированные заказы (и созданные до журнала) остаток не уменьшали:
+#     удаление или уменьшение их строк склад не пополняет.
+#   - Завершённый заказ (COMPLETED_STATUSES) выдан клиенту: при его
+#     удалении товар на склад не возвращается.
+#   - Правка остатка в карточке товара - тоже движение (adjust_stock):
+#     пишется разница, а не новое значение, и запись в журнал без заказа.
+# Функции вызываются внутри транзакции заказа (операции очереди записи
+# write_coordinator.py) и сами commit не делают.
+
+REASON_ORDER = 'order'              # Сохранение заказа (новый или изменённый состав)
+REASON_ORDER_DELETE = 'order_delete'  # Удаление заказа - остаток возвращается
+REASON_ADJUSTMENT = 'adjustment'    # Правка остатка в карточке товара
+COMPLETED_STATUSES = ('Завершен',)   # Товар выдан - резерв стал отгрузкой
+
+ORDER_LINES_QUERY = """
+SELECT ProductArticle, SUM(Quantity) FROM OrderProduct WHERE OrderID = ? GROUP BY ProductArticle
+"""
+RESERVE_SQL = """
+UPDATE Product SET Quantity = Quantity - ? WHERE ProductArticle = ? AND Quantity >= ? RETURNING Quantity
+"""
+RELEASE_SQL = """
+UPDATE Product SET Quantity = IFNULL(Quantity, 0) + ? WHERE ProductArticle = ? RETURNING Quantity
+"""
+STOCK_QUERY = "SELECT Quantity FROM Product WHERE ProductArticle = ?"
+RESERVED_QUERY = f"""
+SELECT ProductArticle, SUM(-Delta) FROM {STOCK_LEDGER_TABLE} WHERE OrderID = ? GROUP BY ProductArticle
+"""
+ORDER_STATUS_QUERY = """
+SELECT S.StatusName FROM "Order" AS O INNER JOIN OrderStatus AS S ON S.StatusID = O.StatusID WHERE O.OrderID = ?
+"""
+LEDGER_INSERT_SQL = f"""
+INSERT INTO {STOCK_LEDGER_TABLE} (ProductArticle, OrderID, Delta, QuantityAfter, Reason, CreatedAt)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+LEDGER_BY_ARTICLE_QUERY = f"""
+SELECT EntryID, OrderID, Delta, QuantityAfter, Reason, CreatedAt
+FROM {STOCK_LEDGER_TABLE} WHERE ProductArticle = ? ORDER BY EntryID DESC LIMIT ?
+"""
+LEDGER_BY_ORDER_QUERY = f"""
+SELECT EntryID, ProductArticle, Delta, QuantityAfter, Reason, CreatedAt
+FROM {STOCK_LEDGER_TABLE} WHERE OrderID = ? ORDER BY EntryID
+"""
+
+
+class OversellError(sqlite3.IntegrityError):
+    """На складе меньше, чем требуется заказу (или товара нет)."""
+
+    def __init__(self, article, requested, available):
+        if available is None:
+            message = f"Товар {article} не найден."
+        else:
+            message = f"Недостаточно товара {article}: нужно {requested}, на складе {available}."
+        super().__init__(message)
+        self.article = article
+        self.requested = requested
+        self.available = available
+
+
+# --- 1. РАЗНИЦА СОСТАВОВ ---
+
+def line_totals(lines):
+    """{артикул: количество} по строкам [(артикул, количество)]; повторы складываются."""
+    totals = {}
+    for article, quantity in lines:
+        totals[article] = totals.get(article, 0) + int(quantity)
+    return totals
+
+def line_diff(old_lines, new_lines):
+    """
+    Изменение заказанного количества по артикулам: {артикул: новое - прежнее},
+    только ненулевые. Положительное - списать со склада, отрицательное - вернуть.
+    """
+    old, new = line_totals(old_lines), line_totals(new_lines)
+    deltas = {}
+    for article in old.keys() | new.keys():
+        delta = new.get(article, 0) - old.get(article, 0)
+        if delta:
+            deltas[article] = delta
+    return deltas
+
+def order_lines(conn, order_id):
+    """Текущий состав заказа в базе: [(артикул, количество)]."""
+    if not order_id:
+        return []
+    return [tuple(row) for row in conn.execute(ORDER_LINES_QUERY, (order_id,))]
+
+def reserved_lines(conn, order_id):
+    """Сколько заказ держит в резерве по журналу: {артикул: количество > 0}."""
+    if not order_id:
+        return {}
+    return {article: quantity for article, quantity in conn.execute(RESERVED_QUERY, (order_id,)) if quantity > 0}
+
+def _cap_releases(conn, order_id, deltas):
+    """Ограничивает возвраты (отрицательные изменения) резервом заказа по журналу."""
+    if all(delta > 0 for delta in deltas.values()):
+        return deltas
+    reserved = reserved_lines(conn, order_id)
+    capped = {}
+    for article, delta in deltas.items():
+        if delta < 0:
+            delta = -min(-delta, reserved.get(article, 0))
+        if delta:
+            capped[article] = delta
+    return capped
+
+# --- 2. ДВИЖЕНИЕ ОСТАТКОВ ---
+
+def _returned_quantity(conn, sql, params):
+    """Остаток после UPDATE ... RETURNING или None, если строка не изменена."""
+    rows = conn.execute(sql, params).fetchall()  # Выбираем до конца: запрос завершён до COMMIT
+    return rows[0][0] if rows else None
+
+def apply_stock_deltas(conn, deltas, order_id, reason=REASON_ORDER):
+    """
+    Применяет изменения заказанного количества к остаткам и пишет журнал.
+    Артикулы обрабатываются в одном порядке (по артикулу). Возвращает
+    {артикул: остаток после}. Нехватка товара - OversellError.
+    """
+    created_at = datetime.now().isoformat(timespec='seconds')
+    remaining = {}
+    for article in sorted(deltas):
+        delta = deltas[article]
+        if delta > 0:
+            quantity = _returned_quantity(conn, RESERVE_SQL, (delta, article, delta))
+            if quantity is None:
+                available = conn.execute(STOCK_QUERY, (article,)).fetchone()
+                raise OversellError(article, delta, (available[0] or 0) if available else None)
+        else:
+            quantity = _returned_quantity(conn, RELEASE_SQL, (-delta, article))
+            if quantity is None:
+                continue  # Товар удалён из справочника - возвращать некуда
+        remaining[article] = quantity
+        conn.execute(LEDGER_INSERT_SQL, (article, order_id, -delta, quantity, reason, created_at))
+    return remaining
+
+def reserve_order(conn, order_id, old_lines, new_lines):
+    """
+    Резервирует разницу между прежним и новым составом заказа order_id.
+    Уменьшение строк возвращает на склад не больше резерва заказа по журналу.
+    """
+    deltas = _cap_releases(conn, order_id, line_diff(old_lines, new_lines))
+    return apply_stock_deltas(conn, deltas, order_id, REASON_ORDER)
+
+def release_order(conn, order_id):
+    """
+    Возвращает на склад резерв заказа по журналу (перед его удалением).
+    Завершённый заказ ничего не возвращает: товар уже выдан.
+    """
+    status = conn.execute(ORDER_STATUS_QUERY, (order_id,)).fetchone()
+    if status is not None and status[0] in COMPLETED_STATUSES:
+        return {}
+    deltas = {article: -quantity for article, quantity in reserved_lines(conn, order_id).items()}
+    return apply_stock_deltas(conn, deltas, order_id, REASON_ORDER_DELETE)
+
+def adjust_stock(conn, article, delta):
+    """
+    Изменяет остаток товара на delta (правка в карточке товара) с записью в
+    журнал без заказа. Уйти в минус нельзя - OversellError. Возвращает остаток после.
+    """
+    if not delta:
+        return None
+    # Для apply_stock_deltas положительное - списание, поэтому знак меняется
+    return apply_stock_deltas(conn, {article: -delta}, None, REASON_ADJUSTMENT).get(article)
+
+# --- 3. ЖУРНАЛ ---
+
+def ledger_for_article(conn, article, limit=100):
+    """Последние движения остатка товара (новые сверху)."""
+    return conn.execute(LEDGER_BY_ARTICLE_QUERY, (article, limit)).fetchall()
+
+def ledger_for_order(conn, order_id):
+    """Все движения остатков по заказу."""
+    return conn.execute(LEDGER_BY_ORDER_QUERY, (order_id,)).fetchall()
\ No newline at end of file
@@ -0,0 +1,346 @@
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+
+from werkzeug.serving import make_server
+
+import bench_import
+import main_web
+
+# Нагрузочный тест main_web без внешних сервисов.
+# 1. Готовит базу нужного масштаба (генератор и импорт из bench_import.py)
+#    или берёт готовую (--database).
+# 2. Поднимает приложение на локальном многопоточном WSGI-сервере (werkzeug).
+# 3. Несколько клиентов (потоков) с собственными сессиями выполняют смесь
+#    запросов: вход по логину, вход гостем, каталог с поиском, категорией,
+#    скидкой, сортировкой и переходом на следующую страницу.
+# 4. Для каждого вида запроса выводит пропускную способность, p50/p95/p99
+#    и долю ошибок; сравнивает с базовым файлом (--baseline).
+#
+# Запуск: python load_test.py --scale 10000 --duration 30 --concurrency 8
+#         python load_test.py --database demodb.db --save-baseline
+
+DEFAULT_BASELINE_FILE = 'load_baseline.json'
+DEFAULT_SCALE = 10000
+DEFAULT_DURATION = 20.0
+DEFAULT_CONCURRENCY = 8
+DEFAULT_WARMUP = 2.0
+REQUEST_TIMEOUT = 30.0
+# Регрессия: p95 хуже базового на столько долей или выросла доля ошибок
+REGRESSION_THRESHOLD = 0.20
+
+# Смесь запросов: (вид, вес)
+REQUEST_MIX = (
+    ('login', 10),
+    ('guest_login', 5),
+    ('catalog', 45),
+    ('catalog_search', 25),
+    ('catalog_next', 15),
+)
+DISCOUNT_FILTERS = ('all', 'all', 'present', 'high')
+CATALOG_SORT_OPTIONS = tuple(main_web.CATALOG_SORTS)
+SEARCH_SORT_OPTIONS = ('Relevance',) + CATALOG_SORT_OPTIONS
+# Роли, под которыми клиенты открывают каталог. Менеджер и администратор
+# не входят: их вариант страниц ссылается на роуты заказов и товаров,
+# которых в main_web нет (BuildError в шаблоне)
+CATALOG_ROLES = ('Авторизированный клиент',)
+NEXT_PAGE_PATTERN = re.compile(r'href="(/catalog\?[^"]*after=[^"]*)"')
+
+# --- 1. ПОДГОТОВКА ДАННЫХ ---
+
+def seed_database(directory, scale):
+    """Синтетические файлы масштаба scale и импорт в directory/demodb.db. Возвращает путь к базе."""
+    os.makedirs(directory, exist_ok=True)
+    database = os.path.join(directory, 'demodb.db')
+    if os.path.exists(database):
+        print(f"База {database} уже подготовлена.")
+        return database
+    print(f"Подготовка базы: масштаб {scale} ({directory})...")
+    bench_import.generate_dataset(directory, scale, 'csv-utf8')
+    result = bench_import.import_in_subprocess(directory)
+    if not result['succeeded']:
+        raise RuntimeError("импорт синтетических данных завершился с ошибкой")
+    return database
+
+def load_fixtures(database):
+    """Учётные записи, категории и слова для поиска из базы - параметры запросов."""
+    conn = sqlite3.connect(database)
+    try:
+        accounts = conn.execute("""
+            SELECT U.Login, U.Password FROM User U JOIN Role R ON U.RoleID = R.RoleID
+            WHERE R.RoleName IN ({})
+        """.format(', '.join('?' * len(CATALOG_ROLES))), CATALOG_ROLES).fetchall()
+        categories = [row[0] for row in conn.execute("SELECT CategoryName FROM Category")]
+        names = [row[0] for row in conn.execute("SELECT DISTINCT Name FROM Product LIMIT 200")]
+        manufacturers = [row[0] for row in conn.execute("SELECT ManufacturerName FROM Manufacturer LIMIT 50")]
+    finally:
+        conn.close()
+    if not accounts:
+        raise RuntimeError(f"в базе {database} нет пользователей с ролями {CATALOG_ROLES}")
+    words = sorted({word for text in names + manufacturers for word in text.split() if len(word) > 2})
+    # Начало слова тоже ищется (поиск по префиксу)
+    search_terms = words + [word[:4] for word in words if len(word) > 5]
+    return {'accounts': accounts, 'categories': categories, 'search_terms': search_terms or ['обувь']}
+
+# --- 2. СЕРВЕР ---
+
+class LocalServer:
+    """main_web на 127.0.0.1 (свободный порт) в фоновом потоке, threaded=True как у dev-сервера."""
+
+    def __init__(self, database, page_cache=True):
+        main_web.DATABASE = database
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # Без строки лога на каждый запрос
+        if not page_cache:
+            main_web.page_cache = main_web.ResponseCache(max_entries=0, max_bytes=0)
+        self._server = make_server('127.0.0.1', 0, main_web.app, threaded=True)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._thread.join()
+
+# --- 3. КЛИЕНТ ---
+
+class Client:
+    """Один виртуальный пользователь: своя cookie сессии, свой генератор случайных чисел."""
+
+    def __init__(self, port, fixtures, seed):
+        self.port = port
+        self.fixtures = fixtures
+        self.random = random.Random(seed)
+        self.cookie = None
+        self.next_page = None
+
+    def request(self, method, path, body=None):
+        """Выполняет запрос (без перехода по redirect). Возвращает (код, тело)."""
+        headers = {}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        if body is not None:
+            body = urllib.parse.urlencode(body)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=REQUEST_TIMEOUT)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            cookie = response.getheader('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            return response.status, data
+        finally:
+            conn.close()
+
+    def login(self):
+        login, password = self.random.choice(self.fixtures['accounts'])
+        status, _ = self.request('POST', '/', {'login': login, 'password': password})
+        return status == 302
+
+    def guest_login(self):
+        status, _ = self.request('POST', '/', {'guest_login': '1'})
+        return status == 302
+
+    def catalog(self, search=False):
+        if self.cookie is None:
+            self.login()
+        params = {
+            'category': self.random.choice(['all'] + self.fixtures['categories']),
+            'discount': self.random.choice(DISCOUNT_FILTERS),
+            'sort': self.random.choice(SEARCH_SORT_OPTIONS if search else CATALOG_SORT_OPTIONS),
+            'page_size': self.random.choice(main_web.PAGE_SIZE_OPTIONS),
+        }
+        if search:
+            params['search'] = self.random.choice(self.fixtures['search_terms'])
+        status, data = self.request('GET', '/catalog?' + urllib.parse.urlencode(params))
+        self._remember_next_page(data)
+        return status == 200
+
+    def catalog_next(self):
+        if self.next_page is None:
+            return self.catalog()
+        status, data = self.request('GET', self.next_page)
+        self._remember_next_page(data)
+        return status == 200
+
+    def _remember_next_page(self, data):
+        match = NEXT_PAGE_PATTERN.search(data.decode('utf-8', 'replace'))
+        self.next_page = match.group(1).replace('&amp;', '&') if match else None
+
+    def run_one(self, kind):
+        if kind == 'catalog_search':
+            return self.catalog(search=True)
+        return getattr(self, kind)()
+
+# --- 4. ПРОГОН И СТАТИСТИКА ---
+
+class Recorder:
+    """Задержки и ошибки по видам запросов (потокобезопасно)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, kind, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(seconds)
+            if not ok:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по ближайшему рангу."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(recorder, duration):
+    results = {}
+    for kind, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        errors = recorder.errors.get(kind, 0)
+        results[kind] = {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / duration, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'error_rate': round(errors / len(latencies), 4),
+        }
+    return results
+
+def run_load(port, fixtures, duration, concurrency, warmup=DEFAULT_WARMUP, seed=0):
+    """Нагрузка из concurrency клиентов в течение duration секунд (после прогрева). Возвращает сводку."""
+    kinds = [kind for kind, _ in REQUEST_MIX]
+    weights = [weight for _, weight in REQUEST_MIX]
+    recorder = Recorder()
+    warmup_until = time.perf_counter() + warmup
+    stop_at = warmup_until + duration
+
+    def worker(number):
+        client = Client(port, fixtures, seed + number)
+        while True:
+            kind = client.random.choices(kinds, weights)[0]
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            try:
+                ok = client.run_one(kind)
+            except (OSError, http.client.HTTPException):
+                ok = False
+            if started >= warmup_until:
+                recorder.add(kind, time.perf_counter() - started, ok)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder, duration)
+
+# --- 5. БАЗОВЫЙ ФАЙЛ ---
+
+def compare_with_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Список регрессий: p95 выросла больше чем на threshold или выросла доля ошибок."""
+    regressions = []
+    for kind, current in results.items():
+        previous = baseline.get('endpoints', {}).get(kind)
+        if previous is None:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f"{kind}: p95 {previous['p95_ms']} -> {current['p95_ms']} мс")
+        if current['error_rate'] > previous['error_rate']:
+            regressions.append(f"{kind}: ошибки {previous['error_rate']:.2%} -> {current['error_rate']:.2%}")
+    return regressions
+
+def print_results(results, baseline=None):
+    print(f"\n{'запрос':<15} {'запросов':>8} {'запр/с':>8} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} {'ошибки':>7}")
+    for kind, row in results.items():
+        line = (f"{kind:<15} {row['requests']:>8} {row['throughput_rps']:>8} {row['p50_ms']:>8} "
+                f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['error_rate']:>7.2%}")
+        previous = (baseline or {}).get('endpoints', {}).get(kind)
+        if previous and previous['p95_ms']:
+            line += f"   p95 {(row['p95_ms'] / previous['p95_ms'] - 1):+.0%} к базовому"
+        print(line)
+
+def print_top_queries(queries):
+    print("\nSQL с наибольшим суммарным временем:")
+    for sql, count, seconds, rows, longest in queries:
+        print(f"  {seconds * 1000:9.1f} мс  x{count:<6} строк {rows:<8} макс. {longest * 1000:.1f} мс  {sql[:120]}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест main_web (вход и каталог).")
+    parser.add_argument('--database', help="готовая база (иначе создаётся синтетическая, см. --scale)")
+    parser.add_argument('--scale', type=int, default=DEFAULT_SCALE,
+                        help=f"число товаров синтетической базы, по умолчанию {DEFAULT_SCALE}")
+    parser.add_argument('--data-dir', default=None,
+                        help="папка синтетической базы (по умолчанию load_data_<масштаб>, повторно используется)")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="секунд измерения")
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP, help="секунд прогрева (не учитываются)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="одновременных клиентов")
+    parser.add_argument('--no-page-cache', action='store_true', help="отключить кэш страниц каталога")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE, help="базовый файл для сравнения")
+    parser.add_argument('--save-baseline', action='store_true', help="записать результаты как базовые")
+    parser.add_argument('--seed', type=int, default=0, help="начальное значение генераторов клиентов")
+    parser.add_argument('--instrument', action='store_true',
+                        help="включить инструментирование main_web и показать самые дорогие SQL-запросы")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    database = args.database or seed_database(args.data_dir or f'load_data_{args.scale}', args.scale)
+    fixtures = load_fixtures(database)
+    instrumentation = main_web.enable_instrumentation() if args.instrument else None
+
+    with LocalServer(os.path.abspath(database), page_cache=not args.no_page_cache) as server:
+        print(f"Сервер: http://127.0.0.1:{server.port}, клиентов {args.concurrency}, "
+              f"{args.duration:g} с (+{args.warmup:g} с прогрев)")
+        results = run_load(server.port, fixtures, args.duration, args.concurrency, args.warmup, args.seed)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if instrumentation is not None:
+        print_top_queries(instrumentation.metrics.top_queries())
+
+    run = {
+        'database': database,
+        'scale': None if args.database else args.scale,
+        'duration': args.duration,
+        'concurrency': args.concurrency,
+        'page_cache': not args.no_page_cache,
+        'endpoints': results,
+    }
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(run, f, ensure_ascii=False, indent=1)
+        print(f"\nБазовые результаты записаны в {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\nБазового файла {args.baseline} нет - сохраните его ключом --save-baseline")
+        return 0
+    regressions = compare_with_baseline(results, baseline)
+    for regression in regressions:
+        print(f"РЕГРЕССИЯ: {regression}")
+    if not regressions:
+        print("\nРегрессий относительно базового файла нет.")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
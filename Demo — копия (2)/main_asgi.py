@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import render_template, request
+from werkzeug.exceptions import InternalServerError, RequestEntityTooLarge, ServiceUnavailable
+from werkzeug.utils import redirect
+from werkzeug.wrappers import Request, Response
+
+import main_web
+from db_executor import DEFAULT_MAX_PENDING, DEFAULT_READERS, DatabaseExecutor, ExecutorBusyError
+
+try:
+    import uvicorn
+except ImportError:  # ASGI-сервер не установлен - приложение можно запустить другим сервером
+    uvicorn = None
+
+# Асинхронный режим main_web (ASGI). Вход (index) и каталог (catalog)
+# обрабатываются в цикле событий: соединение клиента, ожидающее запроса
+# (keep-alive) или ответа базы, не занимает поток. Работа с SQLite и
+# отрисовка каталога идут в ограниченном исполнителе db_executor.
+# Остальные роуты (выход, статика, миниатюры, /health, /metrics)
+# выполняет то же Flask-приложение в небольшом пуле потоков.
+#
+# Запуск: python main_asgi.py [--host 127.0.0.1] [--port 8000]
+#     или: uvicorn main_asgi:application
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+DEFAULT_KEEPALIVE = 75        # Сколько держать простаивающее соединение (сек.)
+BRIDGE_THREADS = 8            # Потоки для синхронных роутов Flask
+BRIDGE_MAX_PENDING = 256      # Синхронных запросов в работе и в очереди
+MAX_BODY_SIZE = 1024 * 1024   # Формы входа маленькие; больше - ответ 413
+
+# --- 1. ASGI <-> WSGI ---
+
+def build_environ(scope, body):
+    """WSGI environ для HTTP-запроса ASGI (для werkzeug.Request и Flask)."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # PEP 3333: пути и строка запроса - байты, прочитанные как latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', ()):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue  # Тело уже прочитано целиком
+        key = 'HTTP_' + name
+        if key in environ:
+            value = environ[key] + ('; ' if name == 'COOKIE' else ', ') + value
+        environ[key] = value
+    return environ
+
+def call_wsgi(wsgi_app, environ):
+    """Вызывает WSGI-приложение и собирает ответ: (код, заголовки, тело)."""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    status, headers = started
+    return int(status.split(' ', 1)[0]), headers, body
+
+async def read_body(receive):
+    """Тело запроса целиком; None - больше MAX_BODY_SIZE."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+async def send_response(send, status, headers, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+# --- 2. ПРИЛОЖЕНИЕ ---
+
+def _render_auth_page(conn, error):
+    """Страница входа для пустой сессии (от запроса не зависит, поэтому кэшируется)."""
+    with main_web.app.test_request_context('/'):
+        return render_template('auth.html', error=error).encode('utf-8')
+
+def _render_catalog(conn, environ, role):
+    """Страница каталога в потоке-читателе: контекст запроса Flask из environ."""
+    with main_web.app.request_context(environ):
+        return main_web.catalog_page(role, *main_web.catalog_params(request.args), db=conn)
+
+
+class AsgiApplication:
+    """ASGI-приложение: асинхронные index и catalog, остальное - Flask-приложение в потоках."""
+
+    def __init__(self, flask_app, readers=DEFAULT_READERS, max_pending=DEFAULT_MAX_PENDING,
+                 bridge_threads=BRIDGE_THREADS, bridge_max_pending=BRIDGE_MAX_PENDING):
+        self.flask_app = flask_app
+        self.readers = readers
+        self.max_pending = max_pending
+        self.bridge_threads = bridge_threads
+        self.bridge_max_pending = bridge_max_pending
+        self.executor = None
+        self._bridge = None
+        self._bridge_pending = 0
+        self._auth_pages = {}
+        self._started = None
+        self.routes = {
+            '/': self.index,
+            '/catalog': self.catalog,
+        }
+
+    async def startup(self):
+        """Миграции (через пул main_web), затем потоки исполнителя. Повторный вызов ничего не делает."""
+        if self._started is None:
+            self._started = asyncio.get_running_loop().create_task(self._startup())
+        await self._started
+
+    async def _startup(self):
+        await asyncio.to_thread(main_web.get_pool)
+        self.executor = DatabaseExecutor(main_web.DATABASE, self.readers, self.max_pending)
+        self._bridge = ThreadPoolExecutor(self.bridge_threads, thread_name_prefix='flask')
+
+    async def shutdown(self):
+        if self.executor is not None:
+            await asyncio.to_thread(self.executor.close)
+        if self._bridge is not None:
+            self._bridge.shutdown(wait=True)
+        self.executor = self._bridge = self._started = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return  # WebSocket не поддерживается
+        await self.startup()
+
+        body = await read_body(receive)
+        if body is None:
+            await self._send_error(send, scope, RequestEntityTooLarge())
+            return
+        environ = build_environ(scope, body)
+        handler = self.routes.get(scope['path'])
+        try:
+            if handler is not None and scope['method'] in ('GET', 'HEAD', 'POST'):
+                response = await handler(Request(environ))
+                status, headers, payload = call_wsgi(response, environ)
+            else:
+                status, headers, payload = await self._call_flask(environ)
+        except ExecutorBusyError:
+            await self._send_error(send, scope, ServiceUnavailable(), retry_after=1)
+            return
+        except Exception:
+            # Как Flask без режима отладки: ошибка в журнал, клиенту - 500
+            self.flask_app.logger.exception("Ошибка при обработке %s %s", scope['method'], scope['path'])
+            await self._send_error(send, scope, InternalServerError())
+            return
+        await send_response(send, status, headers, payload)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _call_flask(self, environ):
+        """Синхронный роут Flask в пуле потоков (очередь ограничена)."""
+        if self._bridge_pending >= self.bridge_max_pending:
+            raise ExecutorBusyError("Очередь синхронных запросов заполнена.")
+        self._bridge_pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._bridge, call_wsgi, self.flask_app.wsgi_app, environ)
+        finally:
+            self._bridge_pending -= 1
+
+    async def _send_error(self, send, scope, error, retry_after=None):
+        response = error.get_response()
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(retry_after)
+        status, headers, body = call_wsgi(response, build_environ(scope, b''))
+        await send_response(send, status, headers, body)
+
+    # --- Сессия: тот же подписанный cookie, что и у Flask ---
+
+    def open_session(self, req):
+        return self.flask_app.session_interface.open_session(self.flask_app, req)
+
+    def save_session(self, session, response):
+        self.flask_app.session_interface.save_session(self.flask_app, session, response)
+        return response
+
+    async def auth_page(self, error=None):
+        page = self._auth_pages.get(error)
+        if page is None:
+            page = self._auth_pages[error] = await self.executor.read(_render_auth_page, error)
+        return page
+
+    # --- Роуты ---
+
+    async def index(self, req):
+        """Асинхронная версия main_web.index: страница входа, вход гостем или по логину."""
+        session = self.open_session(req)
+        session.clear()
+        error = None
+
+        if req.method == 'POST':
+            if 'guest_login' in req.form:
+                session['role'] = 'Гость'
+                session['login'] = 'Гость'
+                return self.save_session(session, redirect('/catalog'))
+
+            login = req.form.get('login', '').strip()
+            password = req.form.get('password', '').strip()
+            user = await self.executor.read(main_web.authenticate, login, password)
+            if user:
+                session['user_id'] = user['UserID']
+                session['login'] = user['Login']
+                session['role'] = user['RoleName']
+                return self.save_session(session, redirect('/catalog'))
+            error = main_web.LOGIN_ERROR
+
+        response = Response(await self.auth_page(error), mimetype='text/html')
+        return self.save_session(session, response)
+
+    async def catalog(self, req):
+        """Асинхронная версия main_web.catalog: страница из кэша или из потока-читателя."""
+        session = self.open_session(req)
+        if 'role' not in session:
+            return redirect('/')
+        body, etag = await self.executor.read(_render_catalog, req.environ, session['role'])
+
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response.make_conditional(req)
+
+
+application = AsgiApplication(main_web.app)
+
+# --- 3. ЗАПУСК ---
+
+def main():
+    parser = argparse.ArgumentParser(description="main_web в асинхронном режиме (ASGI).")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--readers', type=int, default=DEFAULT_READERS, help="потоков-читателей SQLite")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help="запросов к базе в очереди, сверх - ответ 503")
+    args = parser.parse_args()
+    if uvicorn is None:
+        print("uvicorn не установлен (pip install uvicorn) - запустите main_asgi:application другим ASGI-сервером.")
+        return 1
+    application.readers = args.readers
+    application.max_pending = args.max_pending
+    uvicorn.run(application, host=args.host, port=args.port, lifespan='on',
+                timeout_keep_alive=DEFAULT_KEEPALIVE)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
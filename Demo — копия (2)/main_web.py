@@ -1,39 +1,240 @@
+import os
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, session, g, flash
+import threading
+from flask import (Flask, render_template, request, redirect, url_for, session, g, flash, jsonify, make_response,
+                   send_from_directory)
+
+import db_config
+from db_pool import ConnectionPool
+from instrumentation import DEFAULT_SLOW_QUERY_MS, Instrumentation
+from migrations import migrate
+from page_cache import ResponseCache, make_etag
+from pagination import (DEFAULT_PAGE_SIZE, decode_cursor, keyset_condition, order_by_clause,
+                        parse_page_size, split_page)
+from product_search import build_match_query
+from reference_data import ReferenceCache
+from thumbnails import THUMB_DIR, ThumbnailManifest, srcset
 
 # --- 1. НАСТРОЙКА ПРИЛОЖЕНИЯ ---
 app = Flask(__name__)
 # Установите безопасный секретный ключ для работы сессий
 app.secret_key = 'your_super_secret_key_12345' 
 DATABASE = 'demodb.db'
+DB_POOL_SIZE = 8  # Подбирается под число потоков gunicorn (см. /health/pool)
+PAGE_SIZE_OPTIONS = (12, 24, 48, 96)  # Варианты "товаров на странице" в каталоге
+PAGE_CACHE_MAX_ENTRIES = 512            # Готовые страницы каталога в памяти процесса
+PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Таблицы, от которых зависит страница каталога (их версии входят в ключ кэша)
+CATALOG_TABLES = ('Product', 'Category')
+# Миниатюры с хэшем содержимого в имени никогда не меняются - кэшируются на год
+THUMB_MAX_AGE = 365 * 24 * 3600
+# Инструментирование (instrumentation.py): метрики /metrics, журнал медленных
+# запросов, выборочный cProfile. Включается переменной MAIN_WEB_INSTRUMENT=1
+INSTRUMENT = os.environ.get('MAIN_WEB_INSTRUMENT') == '1'
+SLOW_QUERY_MS = float(os.environ.get('MAIN_WEB_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS))
+SLOW_QUERY_LOG = os.environ.get('MAIN_WEB_SLOW_QUERY_LOG', 'slow_queries.log')
+PROFILE_SAMPLE_RATE = float(os.environ.get('MAIN_WEB_PROFILE_SAMPLE_RATE', '0'))  # Например, 0.01
+# Снимок базы для отчётов (db_config.py): обновлять каждые N секунд, 0 - выключено.
+# При нескольких процессах удобнее отдельный python db_config.py --interval N
+REPLICA_INTERVAL = float(os.environ.get('MAIN_WEB_REPLICA_INTERVAL', '0'))
 
 # --- 2. УТИЛИТЫ ДЛЯ БАЗЫ ДАННЫХ ---
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Создаёт пул соединений (и применяет миграции) при первом обращении."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(DATABASE, max_size=DB_POOL_SIZE)
+                with pool.connection() as conn:
+                    migrate(conn)
+                _pool = pool
+                if REPLICA_INTERVAL > 0:
+                    start_replica_snapshotter(REPLICA_INTERVAL)
+    return _pool
+
+_replica_snapshotter = None
+
+def start_replica_snapshotter(interval=db_config.REPLICA_MAX_AGE):
+    """Фоновое обновление реплики для отчётов (после миграций, один поток на процесс)."""
+    global _replica_snapshotter
+    if _replica_snapshotter is None:
+        _replica_snapshotter = db_config.ReplicaSnapshotter(DATABASE, interval).start()
+    return _replica_snapshotter
+
+_reference_cache = None
+instrumentation = None
+page_cache = ResponseCache(PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_MAX_BYTES)
+thumbnail_manifest = ThumbnailManifest()
+
+def get_reference_cache():
+    """Кэш справочников процесса (создаётся после миграций, см. reference_data.py)."""
+    global _reference_cache
+    if _reference_cache is None:
+        get_pool()
+        with _pool_lock:
+            if _reference_cache is None:
+                _reference_cache = ReferenceCache(DATABASE, REFERENCE_QUERIES)
+    return _reference_cache
+
 def get_db():
-    """Открывает новое соединение с базой данных и регистрирует TRIM."""
+    """Выдаёт настроенное соединение из пула на время запроса."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ #1: Регистрируем функцию TRIM() для SQL
-        # Это помогает игнорировать невидимые пробелы в полях,
-        # возникшие при импорте cp1251.
-        db.create_function("TRIM", 1, lambda s: s.strip() if isinstance(s, str) else s)
-        db.row_factory = sqlite3.Row  
-    return db
+        # Соединения пула уже настроены: row_factory = sqlite3.Row,
+        # WAL и PRAGMA применены.
+        db = g._database = get_pool().acquire()
+        if instrumentation is not None:
+            # В пул возвращается само соединение (g._database), запросы идут через обёртку
+            g._timed_database = instrumentation.wrap_connection(db)
+    return getattr(g, '_timed_database', db)
 
 @app.teardown_appcontext
 def close_connection(exception):
-    """Закрывает соединение с базой данных в конце запроса."""
-    db = getattr(g, '_database', None)
+    """Возвращает соединение в пул в конце запроса."""
+    g.pop('_timed_database', None)
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        get_pool().release(db)
+
+# --- 3. ЗАПРОСЫ ---
+# Запросы вынесены из роутов, чтобы check_query_plans.py проверял
+# их планы выполнения (EXPLAIN QUERY PLAN) без запуска сервера.
+
+LOGIN_QUERY = """
+    SELECT T1.UserID, T1.Login, T2.RoleName 
+    FROM User AS T1
+    JOIN Role AS T2 ON T1.RoleID = T2.RoleID 
+    WHERE T1.Login = ? AND T1.Password = ?
+"""
+
+CATEGORIES_QUERY = "SELECT CategoryName FROM Category ORDER BY CategoryName"
+
+LOGIN_ERROR = "Неверный логин или пароль."
+
+def authenticate(db, login, password):
+    """
+    Пользователь (UserID, Login, RoleName) или None. Логин и пароль хранятся
+    уже очищенными (migrations.normalize_text), поиск идёт по UNIQUE-индексу на Login.
+    """
+    return db.execute(LOGIN_QUERY, (login, password)).fetchone()
+
+# Справочники, которые читаются через get_reference_cache(): {имя: (таблица, sql)}
+REFERENCE_QUERIES = {
+    'categories': ('Category', CATEGORIES_QUERY),
+}
+
+# Сортировки каталога: ключ -> (выражение, по убыванию).
+# Второй ключ всегда P.ProductArticle (в том же направлении) - он делает
+# порядок однозначным, и по паре (ключ, артикул) строится курсор страницы.
+CATALOG_SORTS = {
+    'Name': ('P.Name COLLATE NOCASE', False),
+    'Price_asc': ('P.Price', False),
+    'Price_desc': ('P.Price', True),
+    'Discount': ('P.Discount', True),
+}
+CATALOG_TIEBREAKER = 'P.ProductArticle'
+
+def build_catalog_query(role, search_text='', filter_category='all', filter_discount='all', sort_by='Name',
+                        after=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Собирает запрос одной страницы каталога с фильтрами и сортировкой.
+    after - (ключ сортировки, артикул) последней строки предыдущей страницы.
+    Выбирается page_size + 1 строк (см. pagination.split_page). Возвращает (sql, params).
+    """
+    # Поиск идёт по полнотекстовому индексу ProductSearch (FTS5)
+    match_query = build_match_query(search_text)
+
+    sorts = dict(CATALOG_SORTS)
+    if match_query:
+        sorts['Relevance'] = ('S.rank', False)  # bm25: лучшие совпадения первыми
+    sort_expression, descending = sorts.get(sort_by, CATALOG_SORTS['Name'])
+
+    # 1. Базовый запрос
+    query = f"""
+        SELECT 
+            P.ProductArticle, P.Name, P.Unit, P.Price, P.Discount, P.Quantity, 
+            P.Description, P.Photo,
+            C.CategoryName,
+            {sort_expression} AS SortKey
+        FROM Product P
+        LEFT JOIN Category C ON P.CategoryID = C.CategoryID
+    """
+    if match_query:
+        query += " JOIN ProductSearch S ON S.ProductArticle = P.ProductArticle"
+    
+    # 2. Формирование WHERE-условия (Фильтры)
+    where_clauses = []
+    query_params = []
+    
+    # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ #3: Фильтр по остатку для Гостя и Клиента
+    if role in ('Гость', 'Авторизированный клиент'):
+        where_clauses.append("P.Quantity > 0")
+
+    # Фильтр по поисковому запросу (название, описание, артикул,
+    # производитель, категория; слова ищутся по префиксу)
+    if match_query:
+        where_clauses.append("S.ProductSearch MATCH ?")
+        query_params.append(match_query)
+
+    # Фильтр по Категории
+    if filter_category and filter_category != 'all':
+        # Названия категорий очищены при записи - сравнение идёт по UNIQUE-индексу
+        where_clauses.append("C.CategoryName = ?")
+        query_params.append(filter_category)
 
-# --- 3. КОНТЕКСТНЫЙ ПРОЦЕССОР ---
+    # Фильтр по Скидке
+    if filter_discount == 'high':
+        where_clauses.append("P.Discount > 15")
+    elif filter_discount == 'present':
+        where_clauses.append("P.Discount > 0")
+
+    # Начало страницы: строки строго после курсора (поиск по индексу, без OFFSET)
+    if after is not None:
+        condition, condition_params = keyset_condition(sort_expression, CATALOG_TIEBREAKER, descending, after)
+        where_clauses.append(f"({condition})")
+        query_params.extend(condition_params)
+
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+        
+    # 3. Формирование ORDER BY-условия (Сортировка) и размера страницы
+    query += " " + order_by_clause(sort_expression, CATALOG_TIEBREAKER, descending)
+    query += " LIMIT ?"
+    query_params.append(page_size + 1)
+
+    return query, query_params
+
+# --- 4. КОНТЕКСТНЫЙ ПРОЦЕССОР ---
 @app.context_processor
 def inject_global_vars():
     """Передает роль пользователя во все шаблоны."""
     return dict(role=session.get('role', 'Гость'))
 
-# --- 4. РОУТЫ ПРИЛОЖЕНИЯ ---
+@app.template_global()
+def product_image(photo):
+    """
+    Картинка товара для шаблона: src (запасной вариант) и srcset миниатюр
+    WebP/JPEG (thumbnails.py). Без миниатюр - оригинал из static/.
+    """
+    entry = thumbnail_manifest.get(photo)
+    if entry is None:
+        has_photo = photo and str(photo).strip().lower() not in ('nan', 'none')
+        return {'src': url_for('static', filename=photo if has_photo else 'picture.png'),
+                'webp_srcset': None, 'jpg_srcset': None}
+    thumb_url = lambda name: url_for('thumbnail', name=name)
+    jpg_files = entry['jpg']
+    middle_width = sorted(jpg_files, key=int)[len(jpg_files) // 2]
+    return {
+        'src': thumb_url(jpg_files[middle_width]),
+        'webp_srcset': srcset(entry, 'webp', thumb_url),
+        'jpg_srcset': srcset(entry, 'jpg', thumb_url),
+    }
+
+# --- 5. РОУТЫ ПРИЛОЖЕНИЯ ---
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -42,8 +243,6 @@ def index():
     """
     # Сбрасываем сессию при входе на страницу аутентификации
     session.clear() 
-    db = get_db()
-    cursor = db.cursor()
     error = None
 
     if request.method == 'POST':
@@ -58,15 +257,7 @@ def index():
         login = request.form.get('login', '').strip()
         password = request.form.get('password', '').strip()
 
-        # Используем TRIM() в SQL для игнорирования пробелов в БД
-        cursor.execute("""
-            SELECT T1.UserID, T1.Login, T2.RoleName 
-            FROM User AS T1
-            JOIN Role AS T2 ON T1.RoleID = T2.RoleID 
-            WHERE TRIM(T1.Login) = ? AND TRIM(T1.Password) = ?
-        """, (login, password))
-        
-        user = cursor.fetchone()
+        user = authenticate(get_db(), login, password)
 
         if user:
             session['user_id'] = user['UserID']
@@ -74,7 +265,7 @@ def index():
             session['role'] = user['RoleName']
             return redirect(url_for('catalog'))
         else:
-            error = "Неверный логин или пароль."
+            error = LOGIN_ERROR
             
     return render_template('auth.html', error=error)
 
@@ -94,70 +285,73 @@ def catalog():
     if 'role' not in session:
         return redirect(url_for('index'))
 
-    db = get_db()
-    cursor = db.cursor()
-    role = session['role']
+    body, etag = catalog_page(session['role'], *catalog_params(request.args))
 
-    # Получение параметров фильтрации и сортировки из URL
-    search_text = request.args.get('search', '').strip()
-    filter_category = request.args.get('category', 'all').strip()
-    filter_discount = request.args.get('discount', 'all').strip()
-    sort_by = request.args.get('sort', 'Name').strip()
-    
-    # 1. Базовый запрос
-    query = """
-        SELECT 
-            P.ProductArticle, P.Name, P.Unit, P.Price, P.Discount, P.Quantity, 
-            P.Description, P.Photo,
-            TRIM(C.CategoryName) AS CategoryName  -- КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ #2: TRIM для чистоты категории
-        FROM Product P
-        LEFT JOIN Category C ON P.CategoryID = C.CategoryID
-    """
-    
-    # 2. Формирование WHERE-условия (Фильтры)
-    where_clauses = []
-    query_params = []
-    
-    # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ #3: Фильтр по остатку для Гостя и Клиента
-    if role in ('Гость', 'Авторизированный клиент'):
-        where_clauses.append("P.Quantity > 0")
+    # Условный GET: If-None-Match с тем же ETag -> 304 без тела
+    response = make_response(body)
+    response.set_etag(etag)
+    # Страница зависит от роли в сессии: кэшировать только в браузере и всегда сверять ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
 
-    # Фильтр по поисковому запросу (по Названию или Описанию)
-    if search_text:
-        where_clauses.append("(P.Name LIKE ? OR P.Description LIKE ?)")
-        query_params.extend([f'%{search_text}%', f'%{search_text}%'])
+def catalog_params(args):
+    """
+    Параметры каталога из URL: (поиск, категория, скидка, сортировка, курсор,
+    размер страницы). Общие для main_web и асинхронного режима (main_asgi.py).
+    """
+    search_text = args.get('search', '').strip()
+    filter_category = args.get('category', 'all').strip()
+    filter_discount = args.get('discount', 'all').strip()
+    # При поиске по умолчанию сортируем по релевантности
+    sort_by = args.get('sort', 'Relevance' if search_text else 'Name').strip()
+    # Постраничный вывод: курсор (после какой строки начинать) и размер страницы
+    after = decode_cursor(args.get('after', ''))
+    page_size = parse_page_size(args.get('page_size'))
+    return search_text, filter_category, filter_discount, sort_by, after, page_size
 
-    # Фильтр по Категории
-    if filter_category and filter_category != 'all':
-        # Используем TRIM() для сравнения, если в базе есть пробелы
-        where_clauses.append("TRIM(C.CategoryName) = ?") 
-        query_params.append(filter_category)
+def catalog_page(role, search_text, filter_category, filter_discount, sort_by, after, page_size, db=None):
+    """
+    Готовая страница каталога: (тело в UTF-8, ETag). Нужен контекст запроса
+    Flask; db - соединение (по умолчанию get_db()).
+    """
+    # Страница зависит только от этих параметров и версий таблиц каталога,
+    # поэтому готовый HTML берётся из кэша, пока товары не изменились
+    versions = get_reference_cache().versions(*CATALOG_TABLES)
+    cache_key = (role, search_text, filter_category, filter_discount, sort_by,
+                 tuple(after) if after is not None else None, page_size, versions,
+                 thumbnail_manifest.version())
+    page = page_cache.get(cache_key) if versions is not None else None
+    if page is not None:
+        return page.body, page.etag
+    body = render_catalog_page(role, search_text, filter_category, filter_discount, sort_by,
+                               after, page_size, db).encode('utf-8')
+    if versions is not None:
+        page = page_cache.put(cache_key, body)
+    return body, page.etag if page is not None else make_etag(body)
 
-    # Фильтр по Скидке
-    if filter_discount == 'high':
-        where_clauses.append("P.Discount > 15")
-    elif filter_discount == 'present':
-        where_clauses.append("P.Discount > 0")
+def render_catalog_page(role, search_text, filter_category, filter_discount, sort_by, after, page_size, db=None):
+    """Выбирает страницу товаров и отрисовывает catalog.html."""
+    cursor = (db if db is not None else get_db()).cursor()
+    
+    # 1. Формирование запроса (фильтры, сортировка, страница)
+    query, query_params = build_catalog_query(role, search_text, filter_category, filter_discount, sort_by,
+                                              after, page_size)
 
-    if where_clauses:
-        query += " WHERE " + " AND ".join(where_clauses)
-        
-    # 3. Формирование ORDER BY-условия (Сортировка)
-    sort_map = {
-        'Name': 'P.Name COLLATE NOCASE ASC',
-        'Price_asc': 'P.Price ASC',
-        'Price_desc': 'P.Price DESC',
-        'Discount': 'P.Discount DESC'
-    }
-    order_by = sort_map.get(sort_by, 'P.Name COLLATE NOCASE ASC')
-    query += f" ORDER BY {order_by}"
+    # 2. Выполнение запроса (page_size + 1 строк: лишняя - признак следующей страницы)
+    rows = cursor.execute(query, query_params).fetchall()
+    products, next_cursor = split_page(rows, page_size)
 
-    # 4. Выполнение запроса
-    products = cursor.execute(query, query_params).fetchall()
+    # Ссылки на страницы сохраняют текущие фильтры (только из параметров,
+    # входящих в ключ кэша, - иначе закэшированные ссылки зависели бы от URL)
+    page_args = {'category': filter_category, 'discount': filter_discount, 'sort': sort_by, 'page_size': page_size}
+    if search_text:
+        page_args['search'] = search_text
+    next_page_url = url_for('catalog', **page_args, after=next_cursor) if next_cursor else None
+    first_page_url = url_for('catalog', **page_args) if after is not None else None
     
-    # 5. Получение всех категорий для выпадающего списка
-    # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ #4: TRIM для категорий из БД
-    categories_db = cursor.execute("SELECT DISTINCT TRIM(CategoryName) AS CategoryName FROM Category ORDER BY CategoryName").fetchall()
+    # 3. Получение всех категорий для выпадающего списка (из кэша справочников)
+    categories_db = get_reference_cache().get('categories')
     category_list = [c['CategoryName'] for c in categories_db]
 
     return render_template(
@@ -167,10 +361,62 @@ def catalog():
         current_category=filter_category,
         current_discount=filter_discount,
         current_sort=sort_by,
+        page_size=page_size,
+        page_size_options=PAGE_SIZE_OPTIONS,
+        next_page_url=next_page_url,
+        first_page_url=first_page_url,
         categories=["all"] + category_list # Добавляем 'all' для опции "Все категории"
     )
 
-# --- 5. ЗАПУСК ПРИЛОЖЕНИЯ ---
+@app.route('/thumbs/<path:name>')
+def thumbnail(name):
+    """Миниатюры фото: имя содержит хэш содержимого, поэтому кэш браузера - на год."""
+    response = send_from_directory(THUMB_DIR, name, max_age=THUMB_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={THUMB_MAX_AGE}, immutable'
+    return response
+
+@app.route('/health/pool')
+def pool_health():
+    """Метрики пула соединений: размер, ожидания выдачи, таймауты."""
+    return jsonify(get_pool().stats())
+
+@app.route('/health/reference-cache')
+def reference_cache_health():
+    """Метрики кэша справочников: попадания, промахи, версии таблиц."""
+    return jsonify(get_reference_cache().stats())
+
+@app.route('/health/page-cache')
+def page_cache_health():
+    """Метрики кэша страниц каталога: попадания, вытеснения, объём."""
+    return jsonify(page_cache.stats())
+
+@app.route('/health/replica')
+def replica_health():
+    """Состояние снимка для отчётов: возраст, число обновлений, последняя ошибка."""
+    snapshotter = _replica_snapshotter
+    return jsonify({
+        'interval': snapshotter.interval if snapshotter else None,
+        'age': db_config.replica_age(DATABASE),
+        'snapshots': snapshotter.snapshots if snapshotter else 0,
+        'last_error': snapshotter.last_error if snapshotter else None,
+    })
+
+def enable_instrumentation(slow_query_ms=SLOW_QUERY_MS, slow_query_log=SLOW_QUERY_LOG,
+                           profile_sample_rate=PROFILE_SAMPLE_RATE):
+    """
+    Включает метрики (/metrics, /metrics/profiles), журнал медленных запросов
+    и выборочное профилирование. Вызывается до первого запроса.
+    """
+    global instrumentation
+    if instrumentation is None:
+        instrumentation = Instrumentation(slow_query_ms, slow_query_log, profile_sample_rate)
+        instrumentation.install(app)
+    return instrumentation
+
+if INSTRUMENT:
+    enable_instrumentation()
+
+# --- 6. ЗАПУСК ПРИЛОЖЕНИЯ ---
 if __name__ == '__main__':
     # Проверка базы данных
     try:
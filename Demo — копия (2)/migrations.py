@@ -0,0 +1,399 @@
+import sqlite3
+
+from product_search import (SEARCH_COLUMNS, SEARCH_PREFIX_LENGTHS, SEARCH_RANK_WEIGHTS,
+                            SEARCH_TABLE, SEARCH_TOKENIZER)
+from reference_data import VERSION_TABLE, VERSIONED_DATA_TABLES, VERSIONED_TABLES
+
+# --- 1. НОРМАЛИЗАЦИЯ ДАННЫХ ---
+
+def normalize_text(value):
+    """
+    Единое правило очистки текста при записи в БД: убирает пробельные
+    символы по краям (в т.ч. неразрывные, появляющиеся при импорте cp1251).
+    """
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def _table_exists(conn, table):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    return row is not None
+
+def _column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f'PRAGMA table_info("{table}")'))
+
+def _normalize_column(conn, table, column, key_column=None, references=()):
+    """
+    Очищает значения столбца. Если очищенное значение уже существует
+    (UNIQUE), ссылки переводятся на существующую запись, а дубликат удаляется.
+    """
+    if not _table_exists(conn, table) or not _column_exists(conn, table, column):
+        return
+    rows = conn.execute(f'SELECT rowid, "{column}" FROM "{table}"').fetchall()
+    for rowid, value in rows:
+        cleaned = normalize_text(value)
+        if cleaned == value:
+            continue
+        try:
+            conn.execute(f'UPDATE "{table}" SET "{column}" = ? WHERE rowid = ?', (cleaned, rowid))
+        except sqlite3.IntegrityError:
+            if key_column is None:
+                continue  # Объединять такие записи (например, логины) нельзя
+            old_id = conn.execute(f'SELECT "{key_column}" FROM "{table}" WHERE rowid = ?', (rowid,)).fetchone()[0]
+            new_id = conn.execute(f'SELECT "{key_column}" FROM "{table}" WHERE "{column}" = ?', (cleaned,)).fetchone()[0]
+            for ref_table, ref_column in references:
+                if _table_exists(conn, ref_table) and _column_exists(conn, ref_table, ref_column):
+                    conn.execute(f'UPDATE "{ref_table}" SET "{ref_column}" = ? WHERE "{ref_column}" = ?', (new_id, old_id))
+            conn.execute(f'DELETE FROM "{table}" WHERE rowid = ?', (rowid,))
+
+
+# --- 2. МИГРАЦИИ ---
+# Каждая миграция - функция от соединения. Номер последней применённой
+# миграции хранится в PRAGMA user_version. Новые миграции добавляются
+# только в конец списка MIGRATIONS.
+
+# Столбцы, по которым идёт поиск: (таблица, столбец, ключ, ссылки на ключ)
+NORMALIZED_COLUMNS = (
+    ('Role', 'RoleName', 'RoleID', (('User', 'RoleID'),)),
+    ('User', 'Login', None, ()),
+    ('User', 'Password', None, ()),
+    ('Category', 'CategoryName', 'CategoryID', (('Product', 'CategoryID'),)),
+    ('Supplier', 'SupplierName', 'SupplierID', (('Product', 'SupplierID'),)),
+    ('Provider', 'ProviderName', 'ProviderID', (('Product', 'ProviderID'),)),
+    ('Manufacturer', 'ManufacturerName', 'ManufacturerID', (('Product', 'ManufacturerID'),)),
+    ('OrderStatus', 'StatusName', 'StatusID', (('Order', 'StatusID'),)),
+    ('PickupPoint', 'Address', 'PointID', (('Order', 'PointID'),)),
+)
+
+def _normalize_lookup_columns(conn):
+    """Миграция 1: очищает от пробелов столбцы, по которым идёт поиск."""
+    for table, column, key_column, references in NORMALIZED_COLUMNS:
+        _normalize_column(conn, table, column, key_column, references)
+
+# Вторичные индексы под фильтры/сортировки каталога и выборки заказов.
+# Те же индексы объявлены в schema.sql.
+PRODUCTION_INDEXES = (
+    # Каталог: фильтр по категории + сортировка по названию без TEMP B-TREE
+    'CREATE INDEX IF NOT EXISTS idx_product_category_name ON Product(CategoryID, Name COLLATE NOCASE)',
+    # Каталог: сортировки и фильтр по скидке
+    'CREATE INDEX IF NOT EXISTS idx_product_name ON Product(Name COLLATE NOCASE)',
+    'CREATE INDEX IF NOT EXISTS idx_product_price ON Product(Price)',
+    'CREATE INDEX IF NOT EXISTS idx_product_discount ON Product(Discount)',
+    # Заказы: соединения со справочниками
+    'CREATE INDEX IF NOT EXISTS idx_order_status ON "Order"(StatusID)',
+    'CREATE INDEX IF NOT EXISTS idx_order_point ON "Order"(PointID)',
+    # Состав заказа: покрывающий индекс для get_order_details и списка заказов
+    'CREATE INDEX IF NOT EXISTS idx_orderproduct_order ON OrderProduct(OrderID, ProductArticle, Quantity)',
+    # Поиск заказов по товару (удаление товара, пересчёты)
+    'CREATE INDEX IF NOT EXISTS idx_orderproduct_article ON OrderProduct(ProductArticle)',
+)
+
+def _create_production_indexes(conn):
+    """Миграция 2: вторичные индексы для рабочих запросов."""
+    for statement in PRODUCTION_INDEXES:
+        conn.execute(statement)
+
+def _fold_sql(expression):
+    """SQL-аналог product_search.fold_search_text (ё -> е)."""
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+# Строка индекса для товара NEW: артикул, название, описание, производитель, категория
+_SEARCH_ROW_SQL = f"""
+    SELECT NEW.rowid, NEW.ProductArticle, {_fold_sql('NEW.Name')}, {_fold_sql('NEW.Description')},
+           (SELECT {_fold_sql('ManufacturerName')} FROM Manufacturer WHERE ManufacturerID = NEW.ManufacturerID),
+           (SELECT {_fold_sql('CategoryName')} FROM Category WHERE CategoryID = NEW.CategoryID)
+"""
+
+def _create_product_search(conn):
+    """Миграция 3: полнотекстовый индекс FTS5 по каталогу и триггеры синхронизации."""
+    columns = ', '.join(SEARCH_COLUMNS)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            {columns}, tokenize="{SEARCH_TOKENIZER}", prefix='{SEARCH_PREFIX_LENGTHS}'
+        )
+    """)
+    weights = ', '.join(str(weight) for weight in SEARCH_RANK_WEIGHTS)
+    conn.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25({weights})')")
+
+    # Заполнение индекса существующими товарами
+    conn.execute(f"DELETE FROM {SEARCH_TABLE}")
+    conn.execute(f"""
+        INSERT INTO {SEARCH_TABLE}(rowid, {columns})
+        SELECT P.rowid, P.ProductArticle, {_fold_sql('P.Name')}, {_fold_sql('P.Description')},
+               {_fold_sql('M.ManufacturerName')}, {_fold_sql('C.CategoryName')}
+        FROM Product P
+        LEFT JOIN Manufacturer M ON P.ManufacturerID = M.ManufacturerID
+        LEFT JOIN Category C ON P.CategoryID = C.CategoryID
+    """)
+
+    # Триггеры: индекс обновляется при любой записи в Product и при
+    # переименовании производителя или категории
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_product_manufacturer ON Product(ManufacturerID)")
+    triggers = (
+        f"""CREATE TRIGGER IF NOT EXISTS trg_product_search_insert AFTER INSERT ON Product BEGIN
+            INSERT INTO {SEARCH_TABLE}(rowid, {columns}) {_SEARCH_ROW_SQL};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_product_search_delete AFTER DELETE ON Product BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.rowid;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_product_search_update
+        AFTER UPDATE OF ProductArticle, Name, Description, ManufacturerID, CategoryID ON Product BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.rowid;
+            INSERT INTO {SEARCH_TABLE}(rowid, {columns}) {_SEARCH_ROW_SQL};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_category_search_update AFTER UPDATE OF CategoryName ON Category BEGIN
+            UPDATE {SEARCH_TABLE} SET CategoryName = {_fold_sql('NEW.CategoryName')}
+            WHERE rowid IN (SELECT rowid FROM Product WHERE CategoryID = NEW.CategoryID);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_manufacturer_search_update AFTER UPDATE OF ManufacturerName ON Manufacturer BEGIN
+            UPDATE {SEARCH_TABLE} SET ManufacturerName = {_fold_sql('NEW.ManufacturerName')}
+            WHERE rowid IN (SELECT rowid FROM Product WHERE ManufacturerID = NEW.ManufacturerID);
+        END""",
+    )
+    # executescript() здесь нельзя: он фиксирует транзакцию миграции
+    for trigger in triggers:
+        conn.execute(trigger)
+
+# Индексы постраничного вывода каталога (pagination.py): ключ сортировки +
+# ProductArticle, чтобы и первая страница, и переход по курсору читали
+# только page_size строк индекса. Заменяют одноимённые индексы миграции 2.
+KEYSET_INDEXES = (
+    ('idx_product_category_name', 'Product(CategoryID, Name COLLATE NOCASE, ProductArticle)'),
+    ('idx_product_name', 'Product(Name COLLATE NOCASE, ProductArticle)'),
+    ('idx_product_price', 'Product(Price, ProductArticle)'),
+    ('idx_product_discount', 'Product(Discount, ProductArticle)'),
+)
+
+def _create_keyset_indexes(conn):
+    """Миграция 4: составные индексы (ключ сортировки, артикул) для постраничного вывода."""
+    for name, definition in KEYSET_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute(f"CREATE INDEX {name} ON {definition}")
+
+def _create_version_triggers(conn, tables):
+    """Триггеры, увеличивающие счётчик таблицы в VERSION_TABLE при любой записи в неё."""
+    for table in tables:
+        if not _table_exists(conn, table):
+            continue
+        conn.execute(f"INSERT OR IGNORE INTO {VERSION_TABLE}(TableName, Version) VALUES (?, 0)", (table,))
+        bump = f"UPDATE {VERSION_TABLE} SET Version = Version + 1 WHERE TableName = '{table}';"
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_version_{event.lower()}
+                AFTER {event} ON "{table}" BEGIN {bump} END""")
+
+def _create_table_versions(conn):
+    """Миграция 5: счётчики изменений справочников для reference_data.ReferenceCache."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            TableName TEXT PRIMARY KEY,
+            Version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    _create_version_triggers(conn, VERSIONED_TABLES)
+
+def _create_catalog_versions(conn):
+    """Миграция 6: счётчик изменений товаров (ключ кэша страниц каталога main_web)."""
+    _create_version_triggers(conn, VERSIONED_DATA_TABLES)
+
+# Сводка заказов для окна заказов app.py: одна строка на заказ со всем,
+# что показывает список (статус, адрес, даты, состав, итоги). Ведётся
+# триггерами: при записи в заказ или его строки пересчитывается только
+# этот заказ, поэтому открытие списка не зависит от объёма истории заказов.
+ORDER_SUMMARY_TABLE = 'OrderSummary'
+
+def _order_summary_refresh_statements(match):
+    """
+    Пересчёт сводки заказов, у которых OrderID {match} (например, '= NEW.OrderID'):
+    (удаление старых строк, вставка новых). Заказ без строк из сводки исчезает.
+    """
+    delete = f"DELETE FROM {ORDER_SUMMARY_TABLE} WHERE OrderID {match}"
+    insert = f"""
+        INSERT INTO {ORDER_SUMMARY_TABLE} (OrderID, StatusID, StatusName, PointID, Address, OrderDate,
+                                           DeliveryDate, ArticlesList, ItemCount, TotalQuantity, TotalAmount)
+        SELECT O.OrderID, O.StatusID, S.StatusName, O.PointID, P.Address, O.OrderDate, O.DeliveryDate,
+               GROUP_CONCAT(L.ProductArticle || ' (' || L.Quantity || ' шт.)', ' / '),
+               COUNT(*), SUM(L.Quantity),
+               ROUND(SUM(L.Quantity * IFNULL(G.Price, 0) * (100 - IFNULL(G.Discount, 0)) / 100.0), 2)
+        FROM "Order" AS O
+        INNER JOIN OrderProduct AS L ON L.OrderID = O.OrderID
+        INNER JOIN PickupPoint AS P ON P.PointID = O.PointID
+        INNER JOIN OrderStatus AS S ON S.StatusID = O.StatusID
+        LEFT JOIN Product AS G ON G.ProductArticle = L.ProductArticle
+        WHERE O.OrderID {match}
+        GROUP BY O.OrderID
+    """
+    return delete, insert
+
+def _order_summary_refresh_sql(match):
+    """Тело триггера: пересчёт сводки заказов, у которых OrderID {match}."""
+    return ';\n'.join(_order_summary_refresh_statements(match)) + ';'
+
+def _create_order_summary(conn):
+    """Миграция 7: сводка заказов OrderSummary и триггеры её пересчёта."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ORDER_SUMMARY_TABLE} (
+            OrderID INTEGER PRIMARY KEY,
+            StatusID INTEGER,
+            StatusName TEXT,
+            PointID INTEGER,
+            Address TEXT,
+            OrderDate TEXT,
+            DeliveryDate TEXT,
+            ArticlesList TEXT,
+            ItemCount INTEGER NOT NULL,
+            TotalQuantity INTEGER NOT NULL,
+            TotalAmount REAL NOT NULL
+        )
+    """)
+    # Заполнение по существующим заказам: тот же пересчёт для всех заказов сразу
+    for statement in _order_summary_refresh_statements('IS NOT NULL'):
+        conn.execute(statement)
+
+    triggers = (
+        # Новый заказ без строк в сводку не попадает (как и в списке заказов),
+        # но строки могли быть записаны раньше заказа (импорт без внешних ключей)
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_insert AFTER INSERT ON "Order" BEGIN
+            {_order_summary_refresh_sql('= NEW.OrderID')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_update AFTER UPDATE ON "Order" BEGIN
+            {_order_summary_refresh_sql('IN (OLD.OrderID, NEW.OrderID)')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_delete AFTER DELETE ON "Order" BEGIN
+            DELETE FROM {ORDER_SUMMARY_TABLE} WHERE OrderID = OLD.OrderID;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_line_insert AFTER INSERT ON OrderProduct BEGIN
+            {_order_summary_refresh_sql('= NEW.OrderID')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_line_update AFTER UPDATE ON OrderProduct BEGIN
+            {_order_summary_refresh_sql('IN (OLD.OrderID, NEW.OrderID)')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_line_delete AFTER DELETE ON OrderProduct BEGIN
+            {_order_summary_refresh_sql('= OLD.OrderID')}
+        END""",
+        # Переименование статуса или пункта выдачи - редкая операция, обновляет сводку целиком
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_status_update AFTER UPDATE OF StatusName ON OrderStatus BEGIN
+            UPDATE {ORDER_SUMMARY_TABLE} SET StatusName = NEW.StatusName WHERE StatusID = NEW.StatusID;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_point_update AFTER UPDATE OF Address ON PickupPoint BEGIN
+            UPDATE {ORDER_SUMMARY_TABLE} SET Address = NEW.Address WHERE PointID = NEW.PointID;
+        END""",
+        # Сумма заказа считается по текущей цене и скидке товара
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_summary_price_update AFTER UPDATE OF Price, Discount ON Product
+        WHEN OLD.Price IS NOT NEW.Price OR OLD.Discount IS NOT NEW.Discount BEGIN
+            {_order_summary_refresh_sql('IN (SELECT OrderID FROM OrderProduct WHERE ProductArticle = NEW.ProductArticle)')}
+        END""",
+    )
+    for trigger in triggers:
+        conn.execute(trigger)
+
+# Журнал движения остатков (inventory.py): одна строка на изменение
+# Product.Quantity заказом. Delta - изменение остатка (списание отрицательное)
+STOCK_LEDGER_TABLE = 'StockLedger'
+
+def _create_stock_ledger(conn):
+    """Миграция 8: журнал остатков StockLedger для резервирования товара заказами."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STOCK_LEDGER_TABLE} (
+            EntryID INTEGER PRIMARY KEY,
+            ProductArticle TEXT NOT NULL,
+            OrderID INTEGER,
+            Delta INTEGER NOT NULL,
+            QuantityAfter INTEGER NOT NULL,
+            Reason TEXT NOT NULL,
+            CreatedAt TEXT NOT NULL
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_stockledger_article ON {STOCK_LEDGER_TABLE}(ProductArticle, EntryID)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_stockledger_order ON {STOCK_LEDGER_TABLE}(OrderID, EntryID)")
+
+def _add_order_row_version(conn):
+    """Миграция 9: версия заказа "Order".RowVersion для оптимистической блокировки (app.save_order)."""
+    if not _column_exists(conn, 'Order', 'RowVersion'):
+        conn.execute('ALTER TABLE "Order" ADD COLUMN RowVersion INTEGER NOT NULL DEFAULT 0')
+
+# Строка индекса для товара NEW без rowid: ключ связи с Product - ProductArticle
+_SEARCH_ROW_BY_ARTICLE_SQL = f"""
+    SELECT NEW.ProductArticle, {_fold_sql('NEW.Name')}, {_fold_sql('NEW.Description')},
+           (SELECT {_fold_sql('ManufacturerName')} FROM Manufacturer WHERE ManufacturerID = NEW.ManufacturerID),
+           (SELECT {_fold_sql('CategoryName')} FROM Category WHERE CategoryID = NEW.CategoryID)
+"""
+
+def _search_rowids_sql(article):
+    """
+    rowid строк индекса с артикулом article (SQL-выражение). Строка ищется
+    через MATCH по столбцу ProductArticle и проверяется точным сравнением.
+    Артикул без букв и цифр в индексе слов не даёт - для него полный просмотр
+    (условие на article вычисляется один раз, до чтения таблицы).
+    """
+    phrase = f"'ProductArticle : \"' || replace({article}, '\"', '\"\"') || '\"'"
+    return f"""
+        SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH {phrase} AND ProductArticle = {article}
+        UNION ALL
+        SELECT rowid FROM {SEARCH_TABLE}
+        WHERE ProductArticle = {article} AND {article} NOT GLOB '*[0-9A-Za-zА-Яа-яЁё_]*'
+    """
+
+def _key_product_search_by_article(conn):
+    """
+    Миграция 10: индекс ProductSearch связан с Product по ProductArticle, а не
+    по rowid. В schema.sql ключ Product - текстовый, rowid неявный, и VACUUM
+    может его перенумеровать. Содержимое индекса не меняется, заменяются триггеры.
+    """
+    columns = ', '.join(SEARCH_COLUMNS)
+    for name in ('trg_product_search_insert', 'trg_product_search_delete', 'trg_product_search_update',
+                 'trg_category_search_update', 'trg_manufacturer_search_update'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    triggers = (
+        f"""CREATE TRIGGER trg_product_search_insert AFTER INSERT ON Product BEGIN
+            INSERT INTO {SEARCH_TABLE}({columns}) {_SEARCH_ROW_BY_ARTICLE_SQL};
+        END""",
+        f"""CREATE TRIGGER trg_product_search_delete AFTER DELETE ON Product BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({_search_rowids_sql('OLD.ProductArticle')});
+        END""",
+        f"""CREATE TRIGGER trg_product_search_update
+        AFTER UPDATE OF ProductArticle, Name, Description, ManufacturerID, CategoryID ON Product BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({_search_rowids_sql('OLD.ProductArticle')});
+            INSERT INTO {SEARCH_TABLE}({columns}) {_SEARCH_ROW_BY_ARTICLE_SQL};
+        END""",
+        # Переименование категории или производителя - редкая операция, индекс просматривается целиком
+        f"""CREATE TRIGGER trg_category_search_update AFTER UPDATE OF CategoryName ON Category BEGIN
+            UPDATE {SEARCH_TABLE} SET CategoryName = {_fold_sql('NEW.CategoryName')}
+            WHERE ProductArticle IN (SELECT ProductArticle FROM Product WHERE CategoryID = NEW.CategoryID);
+        END""",
+        f"""CREATE TRIGGER trg_manufacturer_search_update AFTER UPDATE OF ManufacturerName ON Manufacturer BEGIN
+            UPDATE {SEARCH_TABLE} SET ManufacturerName = {_fold_sql('NEW.ManufacturerName')}
+            WHERE ProductArticle IN (SELECT ProductArticle FROM Product WHERE ManufacturerID = NEW.ManufacturerID);
+        END""",
+    )
+    for trigger in triggers:
+        conn.execute(trigger)
+
+MIGRATIONS = [
+    _normalize_lookup_columns,
+    _create_production_indexes,
+    _create_product_search,
+    _create_keyset_indexes,
+    _create_table_versions,
+    _create_catalog_versions,
+    _create_order_summary,
+    _create_stock_ledger,
+    _add_order_row_version,
+    _key_product_search_by_article,
+]
+
+def migrate(conn):
+    """Применяет недостающие миграции. Возвращает текущую версию схемы."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if not _table_exists(conn, 'Product'):
+        # База ещё не создана - миграции применятся после импорта (data_import.py)
+        return version
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            # BEGIN IMMEDIATE: параллельно запущенные процессы не применят миграцию дважды
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    return conn.execute("PRAGMA user_version").fetchone()[0]
\ No newline at end of file
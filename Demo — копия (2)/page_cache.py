@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+# Кэш готовых HTML-страниц (main_web: /catalog) в памяти процесса.
+# Ключ включает версии таблиц, от которых зависит страница, поэтому
+# после правки товара старые записи просто перестают запрашиваться
+# и вытесняются по LRU.
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+CachedPage = namedtuple('CachedPage', 'body etag')
+
+def make_etag(body):
+    """Сильный ETag: хэш содержимого ответа."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Потокобезопасный LRU-кэш ответов с ограничением по числу записей и по объёму."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # ключ -> CachedPage, от старых к новым
+        self._bytes = 0
+        # Метрики
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """CachedPage по ключу или None."""
+        with self._lock:
+            page = self._entries.get(key)
+            if page is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return page
+
+    def put(self, key, body):
+        """Сохраняет тело ответа (bytes) и возвращает CachedPage."""
+        page = CachedPage(body, make_etag(body))
+        if len(body) > self.max_bytes:
+            return page  # Не помещается в кэш целиком - отдаём без сохранения
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = page
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self._evictions += 1
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
\ No newline at end of file
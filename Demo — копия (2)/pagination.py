@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+
+# Постраничный вывод по ключу (keyset/seek): следующая страница начинается
+# сразу после последней строки предыдущей по (ключ сортировки, артикул).
+# В отличие от OFFSET, стоимость любой страницы не зависит от её номера.
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Размер страницы из параметра запроса, ограниченный 1..MAX_PAGE_SIZE."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def encode_cursor(values):
+    """Кодирует ключ последней строки страницы в строку для URL."""
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Обратное к encode_cursor. Пустой или повреждённый курсор даёт None (первая страница)."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    return values
+
+def keyset_condition(sort_expression, tiebreaker, descending, after):
+    """
+    Условие WHERE "строка идёт после after = (ключ, артикул)" в порядке
+    ORDER BY sort_expression, tiebreaker (оба ASC или оба DESC).
+    Записано через >= / OR, а не через (a, b) > (?, ?), чтобы SQLite
+    использовал индекс и для ключей с COLLATE NOCASE. Возвращает (sql, params).
+    """
+    key_value, tiebreaker_value = after
+    strict, inclusive = ('<', '<=') if descending else ('>', '>=')
+    sql = (f"{sort_expression} {inclusive} ? AND "
+           f"({sort_expression} {strict} ? OR {tiebreaker} {strict} ?)")
+    return sql, [key_value, key_value, tiebreaker_value]
+
+def order_by_clause(sort_expression, tiebreaker, descending):
+    """ORDER BY для постраничного вывода: артикул в том же направлении, что и ключ."""
+    direction = 'DESC' if descending else 'ASC'
+    return f"ORDER BY {sort_expression} {direction}, {tiebreaker} {direction}"
+
+def split_page(rows, page_size, key_column='SortKey', tiebreaker_column='ProductArticle'):
+    """
+    Запрос выбирает page_size + 1 строк: лишняя строка означает, что есть
+    следующая страница. Возвращает (строки страницы, курсор следующей или None).
+    """
+    page = rows[:page_size]
+    if len(rows) <= page_size or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor((last[key_column], last[tiebreaker_column]))
\ No newline at end of file
@@ -0,0 +1,31 @@
+import re
+
+# Полнотекстовый поиск по каталогу (FTS5).
+# Индекс ProductSearch и триггеры синхронизации создаёт migrations.py
+# (миграция 3); здесь - преобразование пользовательского ввода в запрос MATCH.
+
+SEARCH_TABLE = 'ProductSearch'
+SEARCH_COLUMNS = ('ProductArticle', 'Name', 'Description', 'ManufacturerName', 'CategoryName')
+# Веса столбцов для bm25: совпадение в названии и артикуле важнее описания
+SEARCH_RANK_WEIGHTS = (5.0, 10.0, 1.0, 2.0, 2.0)
+# unicode61 сам приводит кириллицу к нижнему регистру и делит текст
+# на слова по пробелам и пунктуации (в т.ч. артикулы вида "MYZ21AW-450A")
+SEARCH_TOKENIZER = "unicode61 remove_diacritics 2"
+SEARCH_PREFIX_LENGTHS = '2 3'
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def fold_search_text(text):
+    """Приводит текст к форме, в которой он хранится в индексе (ё -> е)."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+def build_match_query(search_text):
+    """
+    Превращает строку поиска в запрос FTS5: каждое слово ищется по префиксу,
+    все слова должны встретиться. Возвращает None, если слов нет.
+    """
+    tokens = _TOKEN_RE.findall(fold_search_text(search_text or ''))
+    if not tokens:
+        return None
+    # Кавычки экранируют слова от синтаксиса FTS5 (AND, OR, NEAR и т.д.)
+    return ' AND '.join(f'"{token}"*' for token in tokens)
\ No newline at end of file
@@ -0,0 +1,105 @@
+import sqlite3
+import threading
+
+from db_pool import create_connection
+
+# Кэш справочников (категории, статусы, пункты выдачи, поставщики,
+# производители) в памяти процесса.
+#
+# Актуальность проверяется в два шага:
+#   1. PRAGMA data_version собственного соединения кэша меняется, только
+#      если кто-то другой зафиксировал изменения в базе (любой таблицы);
+#   2. тогда перечитывается таблица VERSION_TABLE - счётчики изменений по
+#      таблицам, которые ведут триггеры (migrations.py, миграция 5).
+# Сброшены только справочники, чья таблица действительно изменилась.
+
+VERSION_TABLE = 'TableVersion'
+# Таблицы справочников, для которых триггеры ведут счётчик изменений
+VERSIONED_TABLES = ('Role', 'Category', 'Supplier', 'Provider', 'Manufacturer', 'OrderStatus', 'PickupPoint')
+# Другие таблицы со счётчиками: от них зависят кэши уровнем выше (страницы каталога)
+VERSIONED_DATA_TABLES = ('Product',)
+
+
+class ReferenceCache:
+    """
+    Потокобезопасный кэш справочников: queries = {имя: (таблица, sql)}.
+    Попадание в кэш - словарь в памяти и PRAGMA data_version, без чтения таблиц.
+    """
+
+    def __init__(self, database, queries, connection_factory=create_connection):
+        self.queries = dict(queries)
+        self._conn = connection_factory(database)
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._table_versions = {}
+        self._versions_tracked = True
+        self._entries = {}  # имя -> (версия таблицы, строки)
+        # Метрики
+        self._hits = 0
+        self._misses = 0
+
+    def _refresh_versions(self):
+        """Перечитывает счётчики таблиц, если базу изменило другое соединение."""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        try:
+            rows = self._conn.execute(f"SELECT TableName, Version FROM {VERSION_TABLE}").fetchall()
+        except sqlite3.OperationalError:
+            # Миграции ещё не применены - без счётчиков кэш не используется
+            self._versions_tracked = False
+            rows = []
+        else:
+            self._versions_tracked = True
+        self._table_versions = {row[0]: row[1] for row in rows}
+        self._data_version = data_version
+
+    def get(self, name):
+        """Строки справочника name (список sqlite3.Row)."""
+        table, sql = self.queries[name]
+        with self._lock:
+            self._refresh_versions()
+            version = self._table_versions.get(table, 0)
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version and self._versions_tracked:
+                self._hits += 1
+                return list(entry[1])
+
+            self._misses += 1
+            rows = self._conn.execute(sql).fetchall()
+            if self._versions_tracked:
+                self._entries[name] = (version, tuple(rows))
+            return rows
+
+    def versions(self, *tables):
+        """
+        Текущие счётчики изменений таблиц - для ключей других кэшей.
+        None, если счётчики не ведутся (миграции не применены).
+        """
+        with self._lock:
+            self._refresh_versions()
+            if not self._versions_tracked:
+                return None
+            return tuple(self._table_versions.get(table, 0) for table in tables)
+
+    def invalidate(self, name=None):
+        """Сбрасывает один справочник или весь кэш."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'table_versions': dict(self._table_versions),
+            }
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            self._conn.close()
\ No newline at end of file
@@ -74,6 +74,16 @@ CREATE TABLE OrderProduct (
     FOREIGN KEY (ProductArticle) REFERENCES Product(ProductArticle)
 );
 
+-- Вторичные индексы (см. migrations.PRODUCTION_INDEXES и KEYSET_INDEXES)
+CREATE INDEX IF NOT EXISTS idx_product_category_name ON Product(CategoryID, Name COLLATE NOCASE, ProductArticle);
+CREATE INDEX IF NOT EXISTS idx_product_name ON Product(Name COLLATE NOCASE, ProductArticle);
+CREATE INDEX IF NOT EXISTS idx_product_price ON Product(Price, ProductArticle);
+CREATE INDEX IF NOT EXISTS idx_product_discount ON Product(Discount, ProductArticle);
+CREATE INDEX IF NOT EXISTS idx_order_status ON "Order"(StatusID);
+CREATE INDEX IF NOT EXISTS idx_order_point ON "Order"(PointID);
+CREATE INDEX IF NOT EXISTS idx_orderproduct_order ON OrderProduct(OrderID, ProductArticle, Quantity);
+CREATE INDEX IF NOT EXISTS idx_orderproduct_article ON OrderProduct(ProductArticle);
+
 -- Инициализация базовых данных
 INSERT OR IGNORE INTO Role (RoleID, RoleName) VALUES 
 (1, 'Администратор'), 
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен - каталог показывает оригиналы
+    Image = None
+
+# Миниатюры фотографий товаров.
+# Для каждого фото (Product.Photo - путь относительно static/) создаются
+# уменьшенные копии нескольких ширин в WebP и JPEG. Имя файла содержит
+# хэш содержимого оригинала, поэтому файлы можно кэшировать "навсегда":
+# новое фото с тем же именем получит новые имена миниатюр.
+# Соответствие "фото -> файлы миниатюр" хранится в MANIFEST_FILE.
+#
+# Запуск (создать миниатюры для всех товаров базы): python thumbnails.py [база]
+
+STATIC_DIR = 'static'
+THUMB_DIR = os.path.join(STATIC_DIR, 'thumbs')
+MANIFEST_FILE = os.path.join(THUMB_DIR, 'manifest.json')
+PLACEHOLDER_PHOTO = 'picture.png'  # Показывается, если у товара нет фото
+
+THUMB_WIDTHS = (160, 320, 640)
+# Форматы: (расширение, формат Pillow, параметры сохранения)
+THUMB_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+# Меняется при изменении настроек выше - все миниатюры получат новые имена
+PIPELINE_VERSION = 1
+
+_manifest_lock = threading.Lock()
+
+# --- 1. СОЗДАНИЕ МИНИАТЮР ---
+
+def _source_path(photo):
+    """Путь к оригиналу или None, если фото не задано или файла нет."""
+    if not photo or str(photo).strip().lower() in ('', 'nan', 'none'):
+        return None
+    photo = str(photo).strip()
+    path = os.path.normpath(os.path.join(STATIC_DIR, photo))
+    # Фото должно лежать внутри static/
+    if os.path.commonpath([os.path.abspath(path), os.path.abspath(STATIC_DIR)]) != os.path.abspath(STATIC_DIR):
+        return None
+    return path if os.path.isfile(path) else None
+
+def _content_hash(data):
+    digest = hashlib.blake2b(data, digest_size=8)
+    digest.update(f'v{PIPELINE_VERSION}'.encode())
+    return digest.hexdigest()
+
+def _prepare_image(image, file_format):
+    """Поворот по EXIF и приведение цветового режима к поддерживаемому форматом."""
+    image = ImageOps.exif_transpose(image)
+    if file_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG без прозрачности: прозрачный фон заменяется белым
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA')
+    return image
+
+def generate_thumbnails(photo):
+    """
+    Создаёт недостающие миниатюры для фото и записывает их в манифест.
+    Возвращает запись манифеста {'hash', 'webp': {ширина: файл}, 'jpg': {ширина: файл}}
+    или None (нет Pillow, нет файла, файл не является изображением).
+    """
+    path = _source_path(photo)
+    if Image is None or path is None:
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    content_hash = _content_hash(data)
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    entry = {'hash': content_hash}
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    try:
+        with Image.open(path) as original:
+            original.load()
+            for extension, file_format, save_options in THUMB_FORMATS:
+                files = {}
+                image = _prepare_image(original, file_format)
+                for width in THUMB_WIDTHS:
+                    # Не увеличиваем: маленький оригинал даёт одну миниатюру своей ширины
+                    target_width = min(width, image.width)
+                    name = f'{stem}-{content_hash}-{target_width}.{extension}'
+                    files[target_width] = name
+                    target = os.path.join(THUMB_DIR, name)
+                    if os.path.exists(target):
+                        continue
+                    height = max(1, round(image.height * target_width / image.width))
+                    resized = image.resize((target_width, height), Image.LANCZOS)
+                    tmp_target = target + '.tmp'
+                    resized.save(tmp_target, file_format, **save_options)
+                    os.replace(tmp_target, target)  # Читатели не увидят недописанный файл
+                entry[extension] = {str(width): name for width, name in sorted(files.items())}
+    except (OSError, ValueError):
+        return None  # Не изображение или повреждённый файл
+
+    with _manifest_lock:
+        manifest = _read_manifest()
+        manifest[str(photo).strip()] = entry
+        _write_manifest(manifest)
+    return entry
+
+def generate_for_photos(photos):
+    """Миниатюры для набора фото (импорт, окно товара). Возвращает число обработанных."""
+    return sum(1 for photo in set(photos) | {PLACEHOLDER_PHOTO} if generate_thumbnails(photo) is not None)
+
+# --- 2. МАНИФЕСТ ---
+
+def _read_manifest(manifest_file=MANIFEST_FILE):
+    try:
+        with open(manifest_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_manifest(manifest):
+    tmp_file = MANIFEST_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+
+class ThumbnailManifest:
+    """
+    Манифест миниатюр для веб-приложения: перечитывается, только когда файл
+    изменился (по mtime), поэтому обращение к нему почти ничего не стоит.
+    """
+
+    def __init__(self, manifest_file=MANIFEST_FILE):
+        self.manifest_file = manifest_file
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._entries = {}
+
+    def version(self):
+        """Отметка времени изменения манифеста (входит в ключи кэшей страниц)."""
+        try:
+            return os.stat(self.manifest_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh(self):
+        mtime = self.version()
+        if mtime != self._mtime:
+            self._entries = _read_manifest(self.manifest_file) if mtime is not None else {}
+            self._mtime = mtime
+
+    def get(self, photo):
+        """
+        Запись манифеста для фото. Товар без фото получает миниатюры заглушки;
+        None - миниатюр ещё нет, показывается оригинал.
+        """
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(str(photo).strip() if photo else '')
+            if entry is None and _source_path(photo) is None:
+                entry = self._entries.get(PLACEHOLDER_PHOTO)
+            return entry
+
+def srcset(entry, extension, url_builder):
+    """Атрибут srcset: '<url> 160w, <url> 320w, ...'; url_builder(имя файла) -> URL."""
+    files = sorted(entry[extension].items(), key=lambda item: int(item[0]))
+    return ', '.join(f'{url_builder(name)} {width}w' for width, name in files)
+
+# --- 3. ЗАПУСК ---
+
+def main():
+    database = sys.argv[1] if len(sys.argv) > 1 else 'demodb.db'
+    if Image is None:
+        print("Pillow не установлен (pip install Pillow) - миниатюры не созданы.")
+        return 1
+    conn = sqlite3.connect(database)
+    try:
+        photos = [row[0] for row in conn.execute("SELECT DISTINCT Photo FROM Product")]
+    finally:
+        conn.close()
+    count = generate_for_photos(photos)
+    print(f"Миниатюры созданы для {count} изображений ({THUMB_DIR}).")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,204 @@
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from db_pool import create_connection
+
+# Очередь записи: все изменения базы процесса выполняет один поток-писатель.
+#   - Операция записи - функция fn(conn, *args): одна логическая операция
+#     (например, заказ и его состав) целиком применяется или целиком откатывается.
+#   - Групповая фиксация: операции, накопившиеся в очереди, пока шла предыдущая
+#     фиксация, выполняются в одной транзакции (каждая в своей точке сохранения)
+#     и фиксируются одним COMMIT.
+#   - Транзакция начинается с BEGIN IMMEDIATE: блокировка записи берётся сразу,
+#     поэтому "database is locked" возможен только на входе. Тогда пачка
+#     повторяется с паузой, растущей вдвое (со случайной добавкой).
+
+DEFAULT_MAX_BATCH = 64        # Операций в одной транзакции
+DEFAULT_BATCH_WINDOW = 0.0    # Сколько ждать попутные операции (сек.); 0 - только уже ожидающие
+DEFAULT_MAX_RETRIES = 8       # Повторов пачки при занятой базе
+DEFAULT_BACKOFF = 0.01        # Первая пауза перед повтором (сек.)
+DEFAULT_BACKOFF_MAX = 1.0
+WRITER_BUSY_TIMEOUT_MS = 250  # Короткое ожидание внутри SQLite, дальше - повторы очереди
+
+_STOP = object()
+
+def is_busy_error(error):
+    """База занята другим писателем (SQLITE_BUSY / SQLITE_LOCKED)."""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class _Write:
+    __slots__ = ('fn', 'args', 'future')
+
+    def __init__(self, fn, args, future):
+        self.fn = fn
+        self.args = args
+        self.future = future
+
+
+class WriteCoordinator:
+    """
+    Поток-писатель с очередью операций. fn(conn, *args) выполняется внутри
+    транзакции очереди: сама функция не вызывает commit() и не использует
+    "with conn". Результат fn (или её исключение) возвращается через Future.
+    """
+
+    def __init__(self, database, max_batch=DEFAULT_MAX_BATCH, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF, backoff_max=DEFAULT_BACKOFF_MAX,
+                 connection_factory=create_connection):
+        self.database = database
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._connection_factory = connection_factory
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # Метрики
+        self._operations = 0
+        self._failed_operations = 0
+        self._commits = 0
+        self._largest_batch = 0
+        self._retries = 0
+        self._busy_failures = 0
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        """Ставит операцию в очередь. Возвращает concurrent.futures.Future с результатом fn."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Очередь записи закрыта.")
+            self._queue.put(_Write(fn, args, future))
+        return future
+
+    def execute(self, fn, *args, timeout=None):
+        """Выполняет операцию и ждёт фиксации. Ошибка операции выбрасывается здесь."""
+        return self.submit(fn, *args).result(timeout)
+
+    # --- Поток-писатель ---
+
+    def _run(self):
+        conn = self._connection_factory(self.database)
+        conn.execute(f"PRAGMA busy_timeout = {WRITER_BUSY_TIMEOUT_MS}")
+        conn.isolation_level = None  # Транзакциями управляет очередь (BEGIN IMMEDIATE / COMMIT)
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._apply_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _next_batch(self):
+        """Первая операция очереди и накопившиеся за ней (до max_batch). None - остановка."""
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # Остановка - после этой пачки
+                break
+            batch.append(item)
+        return batch
+
+    def _apply_batch(self, conn, batch):
+        writes = [write for write in batch if write.future.set_running_or_notify_cancel()]
+        attempt = 0
+        while writes:
+            try:
+                results = self._run_transaction(conn, writes)
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if is_busy_error(e) and attempt < self.max_retries:
+                    attempt += 1
+                    with self._lock:
+                        self._retries += 1
+                    time.sleep(self._backoff_delay(attempt))
+                    continue
+                with self._lock:
+                    self._busy_failures += is_busy_error(e)
+                    self._failed_operations += len(writes)
+                for write in writes:
+                    write.future.set_exception(e)
+                return
+
+            with self._lock:
+                self._commits += 1
+                self._operations += len(writes)
+                self._largest_batch = max(self._largest_batch, len(writes))
+            for write, (ok, value) in zip(writes, results):
+                if ok:
+                    write.future.set_result(value)
+                else:
+                    with self._lock:
+                        self._failed_operations += 1
+                    write.future.set_exception(value)
+            return
+
+    def _run_transaction(self, conn, writes):
+        """Одна транзакция на пачку; ошибка операции откатывает только её точку сохранения."""
+        conn.execute("BEGIN IMMEDIATE")
+        results = []
+        for write in writes:
+            conn.execute("SAVEPOINT write_operation")
+            try:
+                value = write.fn(conn, *write.args)
+            except Exception as e:
+                if isinstance(e, sqlite3.OperationalError) and is_busy_error(e):
+                    raise  # Повторяется вся пачка
+                conn.execute("ROLLBACK TO write_operation")
+                conn.execute("RELEASE write_operation")
+                results.append((False, e))
+                continue
+            conn.execute("RELEASE write_operation")
+            results.append((True, value))
+        conn.execute("COMMIT")
+        return results
+
+    def _backoff_delay(self, attempt):
+        delay = min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)  # Разные процессы не повторяют попытку одновременно
+
+    def stats(self):
+        """Снимок метрик: операции, фиксации (средний размер пачки), повторы."""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'operations': self._operations,
+                'failed_operations': self._failed_operations,
+                'commits': self._commits,
+                'avg_batch': (self._operations / self._commits) if self._commits else 0.0,
+                'largest_batch': self._largest_batch,
+                'retries': self._retries,
+                'busy_failures': self._busy_failures,
+            }
+
+    def close(self):
+        """Выполняет уже поставленные операции и останавливает поток-писатель."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
\ No newline at end of file